@@ -5,6 +5,10 @@ export AWS_ACCESS_KEY_ID=test
 export AWS_SECRET_ACCESS_KEY=test
 export AWS_DEFAULT_REGION=us-east-1
 
+# Batch size and batching window for the SQS -> sqs-handler trigger
+SQS_BATCH_SIZE=${SQS_BATCH_SIZE:-10}
+SQS_BATCHING_WINDOW_SECONDS=${SQS_BATCHING_WINDOW_SECONDS:-1}
+
 echo "Configuring SQS to trigger Lambda function..."
 
 # Get SQS queue URL
@@ -20,6 +24,8 @@ echo "Creating event source mapping..."
 aws --endpoint-url=http://localhost:4566 lambda create-event-source-mapping \
     --function-name sqs-handler \
     --event-source-arn "$QUEUE_ARN" \
-    --batch-size 1
+    --batch-size "$SQS_BATCH_SIZE" \
+    --maximum-batching-window-in-seconds "$SQS_BATCHING_WINDOW_SECONDS" \
+    --function-response-types ReportBatchItemFailures
 
 echo "SQS Lambda configuration complete!"
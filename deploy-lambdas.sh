@@ -20,10 +20,10 @@ rm -rf requests* urllib3* certifi* charset_normalizer* idna* python_dateutil* si
 # Install only what we need to a temp directory
 pip install -r requirements.txt -t temp_packages --quiet
 
-# Copy handler.py, w2_extractor.py, and external_api_client.py to temp directory
+# Copy handler.py, plus the core processor sources used by SQS_DISPATCH_MODE=inprocess
 cp handler.py temp_packages/
-cp w2_extractor.py temp_packages/
-cp external_api_client.py temp_packages/
+mkdir -p temp_packages/core_processor
+cp ../core_processor/*.py temp_packages/core_processor/
 
 # Create clean zip with only essential files (excluding all junk)
 cd temp_packages
@@ -53,7 +53,7 @@ find . -name "contrib" -type d -exec rm -rf {} + 2>/dev/null || true
 # Keep http2 directory as urllib3 needs it
 # find . -name "http2" -type d -exec rm -rf {} + 2>/dev/null || true
 find . -name "emscripten" -type d -exec rm -rf {} + 2>/dev/null || true
-zip -r ../sqs-handler.zip handler.py requests/ urllib3/ certifi/ charset_normalizer/ idna/ six.py
+zip -r ../sqs-handler.zip handler.py core_processor/ PyPDF2/ requests/ urllib3/ certifi/ charset_normalizer/ idna/ six.py
 cd ..
 
 # Clean up temp directory
@@ -74,6 +74,11 @@ pip install -r requirements.txt -t temp_packages --quiet
 cp handler.py temp_packages/
 cp w2_extractor.py temp_packages/
 cp external_api_client.py temp_packages/
+cp http_session.py temp_packages/
+cp event_publisher.py temp_packages/
+cp extraction_cache.py temp_packages/
+cp stage_metrics.py temp_packages/
+cp aws_clients.py temp_packages/
 
 # Create clean zip with only essential files (excluding all junk)
 cd temp_packages
@@ -103,7 +108,7 @@ find . -name "contrib" -type d -exec rm -rf {} + 2>/dev/null || true
 # Keep http2 directory as urllib3 needs it
 # find . -name "http2" -type d -exec rm -rf {} + 2>/dev/null || true
 find . -name "emscripten" -type d -exec rm -rf {} + 2>/dev/null || true
-zip -r ../core-processor.zip handler.py w2_extractor.py external_api_client.py requests/ urllib3/ certifi/ charset_normalizer/ idna/ six.py PyPDF2/
+zip -r ../core-processor.zip handler.py w2_extractor.py external_api_client.py http_session.py event_publisher.py extraction_cache.py stage_metrics.py aws_clients.py requests/ urllib3/ certifi/ charset_normalizer/ idna/ six.py PyPDF2/
 cd ..
 
 # Clean up temp directory
@@ -2,6 +2,7 @@
 Django settings for doc_processor_backend project.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -58,12 +59,52 @@ TEMPLATES = [
 WSGI_APPLICATION = 'doc_processor_backend.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (default) keeps the local single-file database. Writers are
+# still serialized, so WAL mode lets reads proceed alongside the writer, and
+# write transactions take the lock up front (BEGIN IMMEDIATE) and wait up to
+# SQLITE_TIMEOUT seconds for it instead of failing with "database is locked".
+# DB_ENGINE=postgres is the production profile for many concurrent writers.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'doc_processor'),
+            'USER': os.environ.get('POSTGRES_USER', 'doc_processor'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'doc_processor'),
+            'HOST': os.environ.get('POSTGRES_HOST', 'postgres'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DB_POOL', 'true').lower() == 'true':
+        # psycopg connection pool shared by the threads of each process. Django
+        # returns connections to it after every request, so it replaces CONN_MAX_AGE.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        }
+    else:
+        # A connection per request. Persistent connections (CONN_MAX_AGE > 0) are
+        # unsafe under ASGI: sync code runs on executor threads, which keep
+        # connections open outside the request cycle that would close them.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': f"PRAGMA journal_mode={os.environ.get('SQLITE_JOURNAL_MODE', 'wal')}; PRAGMA synchronous=NORMAL",
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': float(os.environ.get('SQLITE_TIMEOUT', 20)),
+            },
+        }
     }
-}
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
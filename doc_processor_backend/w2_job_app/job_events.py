@@ -0,0 +1,91 @@
+"""
+Job state change notifications for clients waiting on a job
+
+partial_update and bulk_update publish a job's new state when its status
+changes; the SSE and long-poll endpoints subscribe per job_id and are woken by
+those messages, so waiting clients cost no database queries.
+
+The default broker is in-process: it only reaches clients connected to the same
+backend process as the writer, which holds when the backend runs as a single
+ASGI process. Set JOB_EVENTS_BROKER to the dotted path of a class with the same
+subscribe/publish interface (e.g. one backed by Redis pub/sub) to fan out
+across processes.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Messages a slow subscriber may fall behind by before older ones are dropped.
+# Subscribers only need the latest state, so dropping the oldest is harmless.
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class InProcessJobEvents:
+    """
+    Pub/sub keyed by job_id for subscribers running on asyncio event loops
+    publish() may be called from any thread (sync views run in worker threads
+    under ASGI); each message is handed to the subscriber's own loop.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, job_id):
+        """Yield an asyncio.Queue receiving the job's state messages until the block exits"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(subscriber)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(job_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+
+    def publish(self, job_id, message):
+        """Deliver message to the job's current subscribers; returns how many there were"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has closed; it unsubscribes on its way out
+                pass
+        return len(subscribers)
+
+    def subscriber_count(self, job_id=None):
+        with self._lock:
+            if job_id is not None:
+                return len(self._subscribers.get(job_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def _offer(queue, message):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(message)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_job_events():
+    """The process-wide broker, built from settings.JOB_EVENTS_BROKER on first use"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(settings, 'JOB_EVENTS_BROKER', 'w2_job_app.job_events.InProcessJobEvents')
+                _broker = import_string(broker_path)()
+    return _broker
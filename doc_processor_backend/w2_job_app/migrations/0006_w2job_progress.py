@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('w2_job_app', '0005_remove_w2data_status_remove_w2data_status_msg'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='w2job',
+            name='progress',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('w2_job_app', '0006_w2job_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='w2job',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='w2job',
+            name='data_update_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='w2job',
+            name='external_upload_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='w2job',
+            name='extraction_finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='w2job',
+            name='extraction_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='w2job',
+            name='upload_received_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('w2_job_app', '0007_w2job_stage_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='w2job',
+            index=models.Index(fields=['-created_at', '-id'], name='w2_jobs_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='w2job',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='w2_jobs_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='w2job',
+            index=models.Index(fields=['w2_data_status', '-created_at', '-id'], name='w2_jobs_data_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='w2job',
+            index=models.Index(fields=['external_upload', '-created_at', '-id'], name='w2_jobs_ext_upload_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='w2job',
+            index=models.Index(fields=['external_data_update', '-created_at', '-id'], name='w2_jobs_ext_data_idx'),
+        ),
+    ]
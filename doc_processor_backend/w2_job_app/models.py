@@ -21,12 +21,31 @@ class W2Job(models.Model):
     ])
     w2_data_status_msg = models.TextField(null=True, blank=True)
     
+    # Optional lightweight progress marker (e.g. extracting, completed, failed)
+    progress = models.CharField(max_length=50, null=True, blank=True)
+    
+    # Pipeline stage timestamps, recorded by the core processor (see GET /jobs/stats/)
+    upload_received_at = models.DateTimeField(null=True, blank=True)
+    extraction_started_at = models.DateTimeField(null=True, blank=True)
+    extraction_finished_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    external_upload_at = models.DateTimeField(null=True, blank=True)
+    data_update_at = models.DateTimeField(null=True, blank=True)
+    
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'w2_jobs'
         ordering = ['-created_at']
+        # GET /jobs/ pages by (created_at, id), optionally filtered on one of these fields
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='w2_jobs_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='w2_jobs_status_created_idx'),
+            models.Index(fields=['w2_data_status', '-created_at', '-id'], name='w2_jobs_data_status_idx'),
+            models.Index(fields=['external_upload', '-created_at', '-id'], name='w2_jobs_ext_upload_idx'),
+            models.Index(fields=['external_data_update', '-created_at', '-id'], name='w2_jobs_ext_data_idx'),
+        ]
     
     def __str__(self):
         return f"{self.filename} - {self.job_id}"
@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import W2Job, W2Data
 
@@ -15,28 +16,37 @@ class W2JobSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'job_id', 'filename', 'file_uploaded', 'status', 'signed_url', 
             'external_upload', 'external_data_update', 'w2_data_status', 'w2_data_status_msg',
-            'w2_data', 'created_at', 'updated_at'
+            'progress', 'upload_received_at', 'extraction_started_at', 'extraction_finished_at',
+            'completed_at', 'external_upload_at', 'data_update_at', 'w2_data', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'job_id', 'created_at', 'updated_at']
     
+    @transaction.atomic
     def update(self, instance, validated_data):
+        """
+        Job fields and W2 data from one PATCH are committed together
+        Only the fields sent are written. When the job was loaded with
+        select_related('w2_data'), an existing W2Data row is updated in place;
+        otherwise update_or_create finds or creates it. Either way a PATCH costs
+        a fixed number of queries and the response reuses the saved W2Data.
+        """
         w2_data = validated_data.pop('w2_data', None)
         
         # Update W2Job fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        instance.save(update_fields=[*validated_data, 'updated_at'])
         
         # Handle W2Data
         if w2_data:
-            w2_data_obj, created = W2Data.objects.get_or_create(
-                w2_job=instance,
-                defaults=w2_data
-            )
-            if not created:
+            w2_data_obj = getattr(instance, 'w2_data', None) if W2Job.w2_data.is_cached(instance) else None
+            if w2_data_obj is not None:
                 for attr, value in w2_data.items():
                     setattr(w2_data_obj, attr, value)
-                w2_data_obj.save()
+                w2_data_obj.save(update_fields=[*w2_data, 'updated_at'])
+            else:
+                w2_data_obj, _ = W2Data.objects.update_or_create(w2_job=instance, defaults=w2_data)
+                instance.w2_data = w2_data_obj
         
         return instance
 
@@ -1,3 +1,438 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .job_events import get_job_events
+from .models import W2Job, W2Data
+from .views import MAX_BULK_UPDATE_ITEMS
+
+W2_DATA = {
+    'ein': '12-3456789',
+    'ssn': '123-45-6789',
+    'wages_box1': '54000.00',
+    'federal_tax_withheld_box2': '6480.00',
+}
+
+
+class JobQueryCountTests(TestCase):
+    """
+    Every job endpoint costs a fixed number of queries, whatever the number of
+    jobs, fields or W2 data rows involved.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def create_jobs(self, count, with_w2_data=True):
+        jobs = W2Job.objects.bulk_create(
+            W2Job(job_id=f'job-{W2Job.objects.count()}-{index}', filename='w2.pdf') for index in range(count)
+        )
+        if with_w2_data:
+            W2Data.objects.bulk_create(W2Data(w2_job=job, **W2_DATA) for job in jobs)
+        return jobs
+
+    def count_queries(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        return response, len(queries)
+
+    def test_list_queries_do_not_grow_with_jobs(self):
+        self.create_jobs(3)
+        response, few = self.count_queries(lambda: self.client.get('/jobs/'))
+        self.assertEqual(response.status_code, 200)
+
+        self.create_jobs(30)
+        response, many = self.count_queries(lambda: self.client.get('/jobs/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 33)
+        self.assertEqual(response.data['results'][0]['w2_data']['ein'], W2_DATA['ein'])
+        self.assertEqual(few, many)
+        self.assertEqual(many, 1)
+
+    def test_retrieve_is_one_query(self):
+        job = self.create_jobs(1)[0]
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/jobs/{job.job_id}/')
+        self.assertEqual(response.data['w2_data']['wages_box1'], W2_DATA['wages_box1'])
+
+    def test_patch_job_fields(self):
+        job = self.create_jobs(1, with_w2_data=False)[0]
+        # SELECT, SAVEPOINT, UPDATE, RELEASE
+        with self.assertNumQueries(4):
+            response = self.client.patch(
+                f'/jobs/{job.job_id}/', {'status': 'Success', 'progress': 'completed'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['w2_data'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('Success', 'completed'))
+
+    def test_patch_updates_existing_w2_data(self):
+        job = self.create_jobs(1)[0]
+        # SELECT with join, SAVEPOINT, UPDATE job, UPDATE W2 data, RELEASE
+        with self.assertNumQueries(5):
+            response = self.client.patch(
+                f'/jobs/{job.job_id}/',
+                {'status': 'Success', 'w2_data': {'wages_box1': '60000.00'}},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['w2_data']['wages_box1'], '60000.00')
+        self.assertEqual(response.data['w2_data']['ein'], W2_DATA['ein'])
+        self.assertEqual(W2Data.objects.get(w2_job=job).wages_box1, 60000)
+
+    def test_patch_creates_w2_data(self):
+        job = self.create_jobs(1, with_w2_data=False)[0]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/jobs/{job.job_id}/', {'status': 'Success', 'w2_data': W2_DATA}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['w2_data']['ssn'], W2_DATA['ssn'])
+        self.assertEqual(W2Data.objects.filter(w2_job=job).count(), 1)
+        # The response reuses the created row instead of reading it back
+        self.assertEqual(sum('FROM "w2_data"' in query['sql'] for query in queries), 1)
+
+    def test_patch_queries_do_not_grow_with_fields(self):
+        job = self.create_jobs(1)[0]
+        _, one_field = self.count_queries(lambda: self.client.patch(
+            f'/jobs/{job.job_id}/', {'status': 'Success', 'w2_data': {'ein': '98-7654321'}}, format='json'
+        ))
+        _, all_fields = self.count_queries(lambda: self.client.patch(
+            f'/jobs/{job.job_id}/',
+            {'status': 'Success', 'progress': 'completed', 'external_upload': True,
+             'w2_data_status': 'success', 'w2_data_status_msg': 'done', 'w2_data': W2_DATA},
+            format='json'
+        ))
+        self.assertEqual(one_field, all_fields)
+
+    def test_patch_only_writes_sent_fields(self):
+        job = self.create_jobs(1, with_w2_data=False)[0]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(f'/jobs/{job.job_id}/', {'progress': 'extracting'}, format='json')
+        update = next(query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        self.assertIn('"progress"', update)
+        self.assertNotIn('"status"', update)
+
+    def test_bulk_update_queries_do_not_grow_with_items(self):
+        def bulk_update(jobs):
+            return self.client.post('/jobs/bulk_update/', [
+                {'job_id': job.job_id, 'external_data_update': True, 'w2_data': {'ein': '98-7654321'}}
+                for job in jobs
+            ], format='json')
+
+        few_jobs, many_jobs = self.create_jobs(2), self.create_jobs(40)
+        _, few = self.count_queries(lambda: bulk_update(few_jobs))
+        response, many = self.count_queries(lambda: bulk_update(many_jobs))
+        self.assertEqual(response.data['updated'], 40)
+        self.assertEqual(few, many)
+
+    @mock.patch('w2_job_app.views.S3Service')
+    def test_create_is_one_query(self, s3_service):
+        s3_service.return_value.generate_presigned_url.return_value = 'http://localstack:4566/w2-bucket/w2.pdf'
+        with self.assertNumQueries(1):
+            response = self.client.post('/jobs/')
+        self.assertEqual(response.status_code, 201)
+
+
+class BulkUpdateTests(TestCase):
+    """POST /jobs/bulk_update/ applies each item on its own terms"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.jobs = W2Job.objects.bulk_create(
+            W2Job(job_id=f'job-bulk-{index}', filename='w2.pdf') for index in range(2)
+        )
+        W2Data.objects.bulk_create(W2Data(w2_job=job, **W2_DATA) for job in self.jobs)
+
+    def bulk_update(self, items):
+        return self.client.post('/jobs/bulk_update/', items, format='json')
+
+    def test_items_only_write_the_fields_they_send(self):
+        W2Job.objects.filter(job_id='job-bulk-1').update(status='Success')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk_update([
+                {'job_id': 'job-bulk-0', 'status': 'Failed', 'w2_data': {'ein': '98-7654321'}},
+                {'job_id': 'job-bulk-1', 'external_upload': True, 'w2_data': {'wages_box1': '60000.00'}},
+            ])
+        self.assertEqual(response.data['updated'], 2)
+        # Writing a column an item did not send would overwrite concurrent changes to it
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        for sql in updates:
+            self.assertFalse('"status" =' in sql and '"external_upload" =' in sql, sql)
+            self.assertFalse('"ein" =' in sql and '"wages_box1" =' in sql, sql)
+        self.assertEqual(len(updates), 4)
+        first, second = W2Job.objects.select_related('w2_data').order_by('job_id')
+        self.assertEqual((first.status, first.external_upload), ('Failed', False))
+        self.assertEqual((second.status, second.external_upload), ('Success', True))
+        self.assertEqual((first.w2_data.ein, first.w2_data.wages_box1), ('98-7654321', 54000))
+        self.assertEqual((second.w2_data.ein, second.w2_data.wages_box1), (W2_DATA['ein'], 60000))
+
+    def test_failed_items_do_not_stop_the_rest(self):
+        response = self.bulk_update([
+            {'job_id': 'missing', 'status': 'Success'},
+            {'job_id': 'job-bulk-0', 'status': 'Success', 'w2_data_status': 'not-a-status'},
+            'not-an-object',
+            {'job_id': 'job-bulk-1', 'status': 'Success'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['failed']), (1, 3))
+        results = response.data['results']
+        self.assertEqual(results[0], {'job_id': 'missing', 'success': False, 'error': 'Job not found'})
+        self.assertIn('w2_data_status', results[1]['errors'])
+        self.assertEqual(results[2]['error'], 'Job not found')
+        self.assertTrue(results[3]['success'])
+        self.assertEqual(W2Job.objects.get(job_id='job-bulk-0').status, 'started')
+        self.assertEqual(W2Job.objects.get(job_id='job-bulk-1').status, 'Success')
+
+    def test_rejects_more_than_max_items(self):
+        items = [{'job_id': 'job-bulk-0', 'progress': 'extracting'}] * (MAX_BULK_UPDATE_ITEMS + 1)
+        with self.assertNumQueries(0):
+            response = self.bulk_update(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(MAX_BULK_UPDATE_ITEMS), response.data['error'])
+        self.assertEqual(self.bulk_update(items[:MAX_BULK_UPDATE_ITEMS]).data['updated'], MAX_BULK_UPDATE_ITEMS)
+
+    def test_rejects_non_list_body(self):
+        self.assertEqual(self.bulk_update({'job_id': 'job-bulk-0'}).status_code, 400)
+
+
+class JobListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.now = timezone.now()
+
+    def create_job(self, job_id, minutes_ago=0, **fields):
+        return W2Job.objects.create(
+            job_id=job_id, filename='w2.pdf', created_at=self.now - timedelta(minutes=minutes_ago), **fields
+        )
+
+    def listed_job_ids(self, query=''):
+        response = self.client.get(f'/jobs/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [job['job_id'] for job in response.data['results']]
+
+    def test_exact_and_boolean_filters(self):
+        self.create_job('done-uploaded', status='Success', external_upload=True)
+        self.create_job('done', minutes_ago=1, status='Success')
+        self.create_job('pending', minutes_ago=2)
+
+        self.assertEqual(self.listed_job_ids('?status=Success'), ['done-uploaded', 'done'])
+        self.assertEqual(self.listed_job_ids('?status=Success&external_upload=false'), ['done'])
+        self.assertEqual(self.listed_job_ids('?external_upload=1'), ['done-uploaded'])
+
+    def test_invalid_boolean_filter_is_rejected(self):
+        response = self.client.get('/jobs/?external_upload=yes')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('external_upload', response.data)
+
+    def test_created_at_range_filters(self):
+        for minutes_ago in (0, 10, 20, 30):
+            self.create_job(f'job-{minutes_ago}', minutes_ago=minutes_ago)
+        created_after = (self.now - timedelta(minutes=20)).isoformat()
+        created_before = (self.now - timedelta(minutes=5)).isoformat()
+
+        query = urlencode({'created_after': created_after, 'created_before': created_before})
+        self.assertEqual(self.listed_job_ids(f'?{query}'), ['job-10', 'job-20'])
+        response = self.client.get('/jobs/?created_before=yesterday')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('created_before', response.data)
+
+    def test_cursor_pages_cover_every_job_once(self):
+        # Two groups of jobs sharing a created_at, split across page boundaries
+        for index in range(5):
+            self.create_job(f'tied-{index}')
+        for index in range(3):
+            self.create_job(f'older-{index}', minutes_ago=1)
+
+        seen, url = [], '/jobs/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(job['job_id'] for job in response.data['results'])
+            url = response.data['next']
+
+        expected = list(W2Job.objects.order_by('-created_at', '-id').values_list('job_id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 8)
+
+
+class JobStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.now = timezone.now()
+
+    def create_job(self, index, extraction_ms=None, **fields):
+        started = self.now - timedelta(minutes=5)
+        if extraction_ms is not None:
+            fields.update(
+                extraction_started_at=started,
+                extraction_finished_at=started + timedelta(milliseconds=extraction_ms),
+                completed_at=started + timedelta(milliseconds=extraction_ms + 10),
+                status='Success',
+            )
+        return W2Job.objects.create(
+            job_id=f'job-{index}', filename='w2.pdf', created_at=started - timedelta(seconds=1), **fields
+        )
+
+    def test_latency_percentiles_use_nearest_rank(self):
+        # Extraction takes 1..100 ms; two jobs have not been extracted yet
+        for index in range(1, 101):
+            self.create_job(index, extraction_ms=index)
+        self.create_job('pending-1')
+        self.create_job('pending-2')
+
+        response = self.client.get('/jobs/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['jobs']['total'], 102)
+        self.assertEqual(response.data['jobs']['completed'], 100)
+        self.assertEqual(response.data['jobs']['by_status'], {'Success': 100, 'started': 2})
+        self.assertEqual(response.data['latency']['extraction'], {
+            'count': 100, 'avg_ms': 50.5, 'max_ms': 100.0, 'p50_ms': 50.0, 'p95_ms': 95.0, 'p99_ms': 99.0,
+        })
+        self.assertEqual(response.data['latency']['completion']['p99_ms'], 10.0)
+        self.assertEqual(response.data['latency']['external_upload'], {
+            'count': 0, 'avg_ms': None, 'max_ms': None, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None,
+        })
+        self.assertEqual(sum(row['completed'] for row in response.data['throughput']), 100)
+
+    def test_single_job_is_every_percentile(self):
+        self.create_job(1, extraction_ms=42)
+        extraction = self.client.get('/jobs/stats/').data['latency']['extraction']
+        self.assertEqual([extraction[f'p{pct}_ms'] for pct in (50, 95, 99)], [42.0, 42.0, 42.0])
+
+    def test_queries_do_not_grow_with_stages_or_jobs(self):
+        for index in range(20):
+            self.create_job(index, extraction_ms=index)
+        with self.assertNumQueries(2):
+            self.client.get('/jobs/stats/')
+
+    def test_since_bounds_the_jobs(self):
+        self.create_job(1, extraction_ms=5)
+        since = urlencode({'since': (self.now - timedelta(minutes=1)).isoformat()})
+        self.assertEqual(self.client.get(f'/jobs/stats/?{since}').data['jobs']['total'], 0)
+        # A naive datetime is taken as UTC
+        since = urlencode({'since': (self.now - timedelta(hours=1)).replace(tzinfo=None).isoformat()})
+        self.assertEqual(self.client.get(f'/jobs/stats/?{since}').data['jobs']['total'], 1)
+
+    def test_invalid_since_and_window_are_rejected(self):
+        response = self.client.get('/jobs/stats/?since=last-week')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('since', response.data['error'])
+        self.assertEqual(self.client.get('/jobs/stats/?window=week').status_code, 400)
+
+
+class JobStatusTests(TestCase):
+    """GET /jobs/{job_id}/status/ and conditional GETs for job polling"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.job = W2Job.objects.create(job_id='job-status', filename='w2.pdf')
+
+    def test_status_returns_state_fields_and_etag(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/jobs/job-status/status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'started')
+        self.assertNotIn('signed_url', response.data)
+        self.assertNotIn('w2_data', response.data)
+        self.assertTrue(response['ETag'])
+
+    def test_unchanged_job_returns_304(self):
+        etag = self.client.get('/jobs/job-status/status/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get('/jobs/job-status/status/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_update_changes_etag(self):
+        etag = self.client.get('/jobs/job-status/status/')['ETag']
+        self.client.patch('/jobs/job-status/', {'w2_data': W2_DATA}, format='json')
+        response = self.client.get('/jobs/job-status/status/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_retrieve_supports_if_none_match(self):
+        etag = self.client.get('/jobs/job-status/')['ETag']
+        self.assertEqual(self.client.get('/jobs/job-status/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/jobs/missing/status/').status_code, 404)
+
+
+class JobEventsTests(TestCase):
+    """Clients waiting on a job through the long-poll and SSE endpoints"""
+
+    def setUp(self):
+        self.job = W2Job.objects.create(job_id='job-events', filename='w2.pdf')
+
+    async def wait_for_subscriber(self):
+        while get_job_events().subscriber_count('job-events') == 0:
+            await asyncio.sleep(0.01)
+
+    async def complete_job(self):
+        def patch():
+            with self.captureOnCommitCallbacks(execute=True):
+                return APIClient().patch('/jobs/job-events/', {'status': 'Success'}, format='json')
+        response = await sync_to_async(patch)()
+        self.assertEqual(response.status_code, 200)
+
+    async def test_wait_returns_current_state_without_etag(self):
+        response = await self.async_client.get('/jobs/job-events/wait/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'started')
+        self.assertTrue(response['ETag'])
+
+    async def test_wait_times_out_with_304(self):
+        etag = (await self.async_client.get('/jobs/job-events/wait/'))['ETag']
+        response = await self.async_client.get('/jobs/job-events/wait/?timeout=0.05', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    async def test_wait_returns_when_status_changes(self):
+        etag = (await self.async_client.get('/jobs/job-events/wait/'))['ETag']
+        waiting = asyncio.create_task(
+            self.async_client.get('/jobs/job-events/wait/?timeout=5', headers={'If-None-Match': etag})
+        )
+        await self.wait_for_subscriber()
+        await self.complete_job()
+        response = await waiting
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'Success')
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(get_job_events().subscriber_count('job-events'), 0)
+
+    async def test_event_stream_ends_when_job_succeeds(self):
+        response = await self.async_client.get('/jobs/job-events/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertIn('"status": "started"', (await anext(events)).decode())
+
+        await self.wait_for_subscriber()
+        await self.complete_job()
+        self.assertIn('"status": "Success"', (await anext(events)).decode())
+        with self.assertRaises(StopAsyncIteration):
+            await anext(events)
+
+    async def test_unknown_job(self):
+        self.assertEqual((await self.async_client.get('/jobs/missing/events/')).status_code, 404)
+        self.assertEqual((await self.async_client.get('/jobs/missing/wait/')).status_code, 404)
 
-# Create your tests here.
+    def test_only_state_changes_are_published(self):
+        with mock.patch.object(get_job_events(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                APIClient().patch('/jobs/job-events/', {'w2_data_status_msg': 'note'}, format='json')
+            publish.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                APIClient().patch('/jobs/job-events/', {'progress': 'extracting'}, format='json')
+            publish.assert_called_once()
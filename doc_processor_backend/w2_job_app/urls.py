@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import W2JobViewSet
+from .views import W2JobViewSet, job_events, wait_for_job
 
 router = DefaultRouter()
 router.register(r'jobs', W2JobViewSet, basename='w2job')
 
 urlpatterns = [
+    # Async views for clients waiting on a job; best served by an ASGI server
+    path('jobs/<str:job_id>/events/', job_events, name='w2job-events'),
+    path('jobs/<str:job_id>/wait/', wait_for_job, name='w2job-wait'),
     path('', include(router.urls)),
 ]
@@ -1,18 +1,191 @@
+import asyncio
+import json
+import math
 import uuid
 import time
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.utils.encoders import JSONEncoder
+from .job_events import get_job_events
 from .models import W2Job, W2Data
 from .serializers import W2JobSerializer, CreateJobResponseSerializer, W2DataSerializer
 from shared_services.services.s3_service import S3Service
 
+# Upper bound on patches accepted by a single POST /jobs/bulk_update/
+MAX_BULK_UPDATE_ITEMS = 500
+
+# Stage latencies reported by GET /jobs/stats/: name -> (start timestamp, end timestamp)
+STATS_STAGES = {
+    'queue_wait': ('upload_received_at', 'extraction_started_at'),
+    'extraction': ('extraction_started_at', 'extraction_finished_at'),
+    'completion': ('extraction_finished_at', 'completed_at'),
+    'end_to_end': ('created_at', 'completed_at'),
+    'external_upload': ('extraction_finished_at', 'external_upload_at'),
+    'data_update': ('extraction_finished_at', 'data_update_at'),
+}
+# Every timestamp a stage starts or ends at, fetched in one query by GET /jobs/stats/
+STATS_FIELDS = tuple(dict.fromkeys(field for fields in STATS_STAGES.values() for field in fields))
+STATS_WINDOWS = {'minute': TruncMinute, 'hour': TruncHour, 'day': TruncDay}
+WINDOW_MINUTES = {'minute': 1, 'hour': 60, 'day': 1440}
+STATS_PERCENTILES = (50, 95, 99)
+
+# Fields returned by GET /jobs/{job_id}/status/
+JOB_STATUS_FIELDS = (
+    'job_id', 'status', 'progress', 'file_uploaded', 'w2_data_status', 'w2_data_status_msg',
+    'external_upload', 'external_data_update', 'completed_at', 'updated_at',
+)
+
+def job_etag(updated_at):
+    """
+    ETag for a job's representations
+    Every write to a job or its W2 data bumps W2Job.updated_at, so it changes
+    exactly when GET /jobs/{job_id}/ or /status/ would return something new.
+    """
+    return quote_etag(str(int(updated_at.timestamp() * 1_000_000)))
+
+# Changes to these fields are pushed to clients waiting on the job
+JOB_EVENT_FIELDS = ('status', 'progress', 'w2_data_status')
+
+# Waiting clients: SSE keep-alive comment interval and longest long-poll wait
+SSE_KEEPALIVE_SECONDS = 15
+LONG_POLL_DEFAULT_SECONDS = 25
+LONG_POLL_MAX_SECONDS = 60
+
+def job_event_state(job):
+    return tuple(getattr(job, field) for field in JOB_EVENT_FIELDS)
+
+def publish_job_state(job):
+    """Push the job's state to waiting clients once the current transaction commits"""
+    state = {field: getattr(job, field) for field in JOB_STATUS_FIELDS}
+    transaction.on_commit(lambda: get_job_events().publish(job.job_id, state))
+
+def is_final_state(state):
+    return state['status'] == 'Success' or state['progress'] == 'failed'
+
+def not_modified(request, etag):
+    """304 response if the request's If-None-Match matches etag, otherwise None"""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        # RFC 9110 requires a 304 to carry the ETag a 200 would have sent
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+# Filters accepted by GET /jobs/; each is served by an index in W2Job.Meta.indexes
+JOB_LIST_FILTERS = ('status', 'w2_data_status')
+JOB_LIST_BOOLEAN_FILTERS = ('external_upload', 'external_data_update')
+# ISO 8601 bounds on created_at: created_after is inclusive, created_before exclusive
+JOB_LIST_DATE_FILTERS = {'created_after': 'created_at__gte', 'created_before': 'created_at__lt'}
+BOOLEAN_QUERY_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+def bulk_update_by_fields(model, objects, fields):
+    """
+    bulk_update objects grouped by the fields each one sent, one query per group
+    A single bulk_update writes the same columns for every object, so items that
+    sent different fields would overwrite each other's untouched columns.
+    """
+    groups = defaultdict(list)
+    for key, obj in objects.items():
+        groups[frozenset(fields[key])].append(obj)
+    for group_fields, group in groups.items():
+        model.objects.bulk_update(group, sorted(group_fields | {'updated_at'}))
+
+def parse_query_datetime(value):
+    """Parse an ISO 8601 query parameter, as UTC if it has no offset; None if invalid"""
+    parsed = parse_datetime(value)
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+class JobCursorPagination(CursorPagination):
+    """
+    Newest first, paged by an opaque created_at cursor
+    Each page is an index range scan, so its cost does not grow with the number
+    of jobs or with how deep the client has paged (unlike OFFSET pagination).
+    id breaks created_at ties, so jobs created in the same instant are neither
+    skipped nor repeated across pages.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+class JobFilterBackend(BaseFilterBackend):
+    """Exact-match and created_at range filters for GET /jobs/ taken from the query string"""
+
+    def filter_queryset(self, request, queryset, view):
+        filters = {}
+        for name in JOB_LIST_FILTERS:
+            if name in request.query_params:
+                filters[name] = request.query_params[name]
+        for name in JOB_LIST_BOOLEAN_FILTERS:
+            if name in request.query_params:
+                value = request.query_params[name].lower()
+                if value not in BOOLEAN_QUERY_VALUES:
+                    raise ValidationError({name: "Must be true or false"})
+                filters[name] = BOOLEAN_QUERY_VALUES[value]
+        for name, lookup in JOB_LIST_DATE_FILTERS.items():
+            if name in request.query_params:
+                value = parse_query_datetime(request.query_params[name])
+                if value is None:
+                    raise ValidationError({name: "Must be an ISO 8601 datetime"})
+                filters[lookup] = value
+        return queryset.filter(**filters)
+
+def _milliseconds(duration):
+    return round(duration.total_seconds() * 1000, 1) if duration is not None else None
+
+def latency_stats(durations):
+    """Count, average, max and nearest-rank percentiles of a list of timedeltas"""
+    durations = sorted(durations)
+    count = len(durations)
+    stats = {
+        'count': count,
+        'avg_ms': _milliseconds(sum(durations, timedelta()) / count) if count else None,
+        'max_ms': _milliseconds(durations[-1]) if count else None,
+    }
+    for pct in STATS_PERCENTILES:
+        rank = max(math.ceil(pct / 100 * count) - 1, 0)
+        stats[f'p{pct}_ms'] = _milliseconds(durations[rank]) if count else None
+    return stats
+
+def stage_latency_stats(rows):
+    """
+    Latency stats of every STATS_STAGES stage over rows of STATS_FIELDS values
+    The rows come from a single query; stages missing either timestamp are skipped.
+    """
+    durations = {stage: [] for stage in STATS_STAGES}
+    for row in rows:
+        values = dict(zip(STATS_FIELDS, row))
+        for stage, (start_field, end_field) in STATS_STAGES.items():
+            if values[start_field] is not None and values[end_field] is not None:
+                durations[stage].append(values[end_field] - values[start_field])
+    return {stage: latency_stats(stage_durations) for stage, stage_durations in durations.items()}
+
 class W2JobViewSet(viewsets.ModelViewSet):
-    queryset = W2Job.objects.all()
+    # W2 data is joined in rather than fetched per job when serializing a page
+    queryset = W2Job.objects.select_related('w2_data')
     serializer_class = W2JobSerializer
     permission_classes = [AllowAny]
     lookup_field = 'job_id'
+    pagination_class = JobCursorPagination
+    filter_backends = [JobFilterBackend]
 
     def create(self, request):
         """Create a new job - POST /jobs/"""
@@ -55,14 +228,39 @@ class W2JobViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, job_id=None):
         """Get job details - GET /jobs/{job_id}/"""
         try:
-            job_obj = W2Job.objects.get(job_id=job_id)
-            serializer = self.get_serializer(job_obj)
-            return Response(serializer.data)
+            job_obj = self.get_queryset().get(job_id=job_id)
         except W2Job.DoesNotExist:
             return Response(
                 {"error": "Job not found"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        etag = job_etag(job_obj.updated_at)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+        serializer = self.get_serializer(job_obj)
+        return Response(serializer.data, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    @action(detail=True, methods=['get'], url_path='status')
+    def job_status(self, request, job_id=None):
+        """
+        Job state for polling - GET /jobs/{job_id}/status/
+        Reads only the state columns and skips the serializer. Send the returned
+        ETag as If-None-Match: while the job is unchanged the answer is an empty 304.
+        """
+        job_state = W2Job.objects.filter(job_id=job_id).values(*JOB_STATUS_FIELDS).first()
+        if job_state is None:
+            return Response(
+                {"error": "Job not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        etag = job_etag(job_state['updated_at'])
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+        return Response(job_state, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
 
     @action(detail=False, methods=['get'])
     def bucket_info(self, request):
@@ -74,11 +272,14 @@ class W2JobViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, job_id=None):
         """Update job - PATCH /jobs/{job_id}/"""
         try:
-            job = W2Job.objects.get(job_id=job_id)
+            job = self.get_queryset().get(job_id=job_id)
+            previous_state = job_event_state(job)
             serializer = self.get_serializer(job, data=request.data, partial=True)
             
             if serializer.is_valid():
                 serializer.save()
+                if job_event_state(job) != previous_state:
+                    publish_job_state(job)
                 return Response(serializer.data)
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -92,3 +293,231 @@ class W2JobViewSet(viewsets.ModelViewSet):
                 {"error": f"Failed to update job: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Pipeline latency and throughput - GET /jobs/stats/
+        Query params: since / until (ISO 8601 bounds on created_at, default the
+        last 24 hours) and window (minute, hour or day, default hour) for the
+        throughput buckets, which count jobs by completed_at.
+        Two queries: the stage timestamps of the jobs in range, from which counts
+        and latencies are computed, and the throughput aggregate.
+        """
+        window = request.query_params.get('window', 'hour')
+        if window not in STATS_WINDOWS:
+            return Response(
+                {"error": f"window must be one of: {', '.join(STATS_WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        bounds = {}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            bounds[name] = parse_query_datetime(value) if value else None
+            if value and bounds[name] is None:
+                return Response(
+                    {"error": f"{name} must be an ISO 8601 datetime"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        until = bounds['until'] or timezone.now()
+        since = bounds['since'] or until - timedelta(hours=24)
+
+        jobs = W2Job.objects.filter(created_at__gte=since, created_at__lt=until).order_by()
+        rows = list(jobs.values_list('status', *STATS_FIELDS))
+        by_status = defaultdict(int)
+        for row in rows:
+            by_status[row[0]] += 1
+        completed_index = 1 + STATS_FIELDS.index('completed_at')
+        throughput = [
+            {
+                "window_start": row['window_start'],
+                "completed": row['completed'],
+                "per_minute": round(row['completed'] / WINDOW_MINUTES[window], 2)
+            }
+            for row in jobs.filter(completed_at__isnull=False)
+            .annotate(window_start=STATS_WINDOWS[window]('completed_at'))
+            .values('window_start')
+            .annotate(completed=Count('id'))
+            .order_by('window_start')
+        ]
+
+        return Response({
+            "since": since,
+            "until": until,
+            "window": window,
+            "jobs": {
+                "total": len(rows),
+                "completed": sum(1 for row in rows if row[completed_index] is not None),
+                "by_status": dict(by_status)
+            },
+            "latency": stage_latency_stats(row[1:] for row in rows),
+            "throughput": throughput
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        """
+        Update many jobs in one transaction - POST /jobs/bulk_update/
+        Body: a list of job patches (or {"jobs": [...]}), each with a job_id and the
+        same fields accepted by PATCH /jobs/{job_id}/. Returns one result per item.
+        Each item only writes the fields it sent: jobs are saved with one UPDATE
+        per distinct set of fields.
+        """
+        items = request.data.get('jobs') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return Response(
+                {"error": "Expected a list of job updates"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > MAX_BULK_UPDATE_ITEMS:
+            return Response(
+                {"error": f"At most {MAX_BULK_UPDATE_ITEMS} job updates per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        job_ids = [item.get('job_id') for item in items if isinstance(item, dict)]
+        jobs = {
+            job.job_id: job
+            for job in W2Job.objects.filter(job_id__in=job_ids).select_related('w2_data')
+        }
+
+        results = []
+        now = timezone.now()
+        updated_jobs, job_fields = {}, defaultdict(set)
+        updated_w2_data, w2_data_fields = {}, defaultdict(set)
+        new_w2_data = {}
+        previous_states = {job_id: job_event_state(job) for job_id, job in jobs.items()}
+
+        for item in items:
+            job_id = item.get('job_id') if isinstance(item, dict) else None
+            job = jobs.get(job_id)
+            if job is None:
+                results.append({"job_id": job_id, "success": False, "error": "Job not found"})
+                continue
+
+            serializer = self.get_serializer(job, data=item, partial=True)
+            if not serializer.is_valid():
+                results.append({"job_id": job_id, "success": False, "errors": serializer.errors})
+                continue
+
+            validated_data = dict(serializer.validated_data)
+            w2_data = validated_data.pop('w2_data', None)
+
+            for attr, value in validated_data.items():
+                setattr(job, attr, value)
+            job.updated_at = now
+            job_fields[job_id].update(validated_data)
+            updated_jobs[job_id] = job
+
+            if w2_data:
+                w2_data_obj = new_w2_data.get(job_id) or getattr(job, 'w2_data', None)
+                if w2_data_obj is None:
+                    new_w2_data[job_id] = W2Data(w2_job=job, **w2_data)
+                else:
+                    for attr, value in w2_data.items():
+                        setattr(w2_data_obj, attr, value)
+                    if job_id not in new_w2_data:
+                        w2_data_obj.updated_at = now
+                        w2_data_fields[job_id].update(w2_data)
+                        updated_w2_data[job_id] = w2_data_obj
+
+            results.append({"job_id": job_id, "success": True})
+
+        try:
+            with transaction.atomic():
+                bulk_update_by_fields(W2Job, updated_jobs, job_fields)
+                bulk_update_by_fields(W2Data, updated_w2_data, w2_data_fields)
+                if new_w2_data:
+                    W2Data.objects.bulk_create(new_w2_data.values())
+                for job_id, job in updated_jobs.items():
+                    if job_event_state(job) != previous_states[job_id]:
+                        publish_job_state(job)
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to update jobs: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        updated = sum(1 for result in results if result["success"])
+        return Response({
+            "updated": updated,
+            "failed": len(results) - updated,
+            "results": results
+        })
+
+async def read_job_state(job_id):
+    return await W2Job.objects.filter(job_id=job_id).values(*JOB_STATUS_FIELDS).afirst()
+
+def job_not_found():
+    return JsonResponse({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+def sse_message(state):
+    return f"event: status\ndata: {json.dumps(state, cls=JSONEncoder)}\n\n"
+
+@require_GET
+async def job_events(request, job_id):
+    """
+    Server-Sent Events stream of a job's state - GET /jobs/{job_id}/events/
+    Sends the current state, then each state change, and ends once the job has
+    succeeded or failed. The stream waits on the job events broker, not the database.
+    """
+    if not await W2Job.objects.filter(job_id=job_id).aexists():
+        return job_not_found()
+
+    async def stream():
+        async with get_job_events().subscribe(job_id) as queue:
+            # Read after subscribing so no change can fall between the two
+            state = await read_job_state(job_id)
+            if state is None:
+                return
+            yield "retry: 3000\n" + sse_message(state)
+            while not is_final_state(state):
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Messages published before the read above are already reflected in it
+                if message['updated_at'] > state['updated_at']:
+                    state = message
+                    yield sse_message(state)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_GET
+async def wait_for_job(request, job_id):
+    """
+    Long-poll for a job's state - GET /jobs/{job_id}/wait/?timeout=25
+    Without a matching If-None-Match the current state is returned at once, like
+    GET /jobs/{job_id}/status/. Otherwise the request is held until the job
+    changes (200 with the new state and ETag) or timeout seconds pass (304).
+    """
+    try:
+        timeout = min(max(float(request.GET.get('timeout', LONG_POLL_DEFAULT_SECONDS)), 0), LONG_POLL_MAX_SECONDS)
+    except ValueError:
+        return JsonResponse({"error": "timeout must be a number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
+
+    async with get_job_events().subscribe(job_id) as queue:
+        state = await read_job_state(job_id)
+        if state is None:
+            return job_not_found()
+        etag = job_etag(state['updated_at'])
+        unchanged = not_modified(request, etag)
+        if unchanged is None:
+            return JsonResponse(state, encoder=JSONEncoder, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if message['updated_at'] > state['updated_at']:
+                return JsonResponse(message, encoder=JSONEncoder,
+                                    headers={'ETag': job_etag(message['updated_at']), 'Cache-Control': 'no-cache'})
+        return unchanged
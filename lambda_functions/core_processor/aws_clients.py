@@ -0,0 +1,23 @@
+import threading
+
+# boto3 takes longer to import and to build a client than the rest of the
+# processor takes to load, and not every event needs every client (external
+# events never touch S3). Clients are therefore built on first use and shared
+# by all modules for the life of the container.
+AWS_ENDPOINT_URL = 'http://localstack:4566'
+AWS_REGION = 'us-east-1'
+
+_clients = {}
+_lock = threading.Lock()
+
+def get_client(service_name):
+    """Return the shared boto3 client for a service, importing boto3 and creating it on first use"""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3
+                client = boto3.client(service_name, endpoint_url=AWS_ENDPOINT_URL, region_name=AWS_REGION)
+                _clients[service_name] = client
+    return client
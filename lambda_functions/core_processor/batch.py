@@ -0,0 +1,185 @@
+"""
+Local batch extraction of W-2 data for backfills
+
+Extracts W-2 fields from local PDFs in parallel across cores and streams the
+results to a JSONL or CSV file. Progress is recorded in a checkpoint file so an
+interrupted run picks up where it stopped.
+
+Inputs:
+    a directory    every *.pdf below it
+    a glob         e.g. "backfill/2023/**/*.pdf"
+    a manifest     *.jsonl, one {"path": ..., "id": ...} object (or bare path string)
+                   per line; relative paths are resolved against the manifest
+
+Usage (from lambda_functions/):
+    python -m core_processor.batch INPUT --output results.jsonl [--format csv]
+        [--workers N] [--checkpoint results.jsonl.checkpoint] [--no-resume]
+
+Results are written at least once: a crash between writing a result and
+checkpointing it can repeat that document on resume.
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# The core processor modules use flat imports (Lambda layout)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from w2_extractor import available_cpus, convert_monetary_fields, extract_w2_data_from_pdf, validate_w2_data  # noqa: E402
+
+logger = logging.getLogger()
+
+W2_FIELDS = ["ein", "ssn", "wages_box1", "federal_tax_withheld_box2"]
+OUTPUT_FIELDS = ["id", "path"] + W2_FIELDS + ["valid", "error", "elapsed_ms"]
+
+def iter_documents(source):
+    """Yield (document_id, path) for a directory, glob pattern or JSONL manifest"""
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith('.pdf'):
+                    path = os.path.join(root, name)
+                    yield path, path
+    elif source.endswith('.jsonl') and os.path.isfile(source):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as manifest:
+            for line_number, line in enumerate(manifest, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry, str):
+                    entry = {"path": entry}
+                if not entry.get('path'):
+                    logger.warning(f"Skipping manifest line {line_number}: no path")
+                    continue
+                path = os.path.join(base_dir, entry['path'])
+                yield str(entry.get('id') or entry['path']), path
+    else:
+        for path in sorted(glob.iglob(source, recursive=True)):
+            if os.path.isfile(path):
+                yield path, path
+
+def extract_document(document_id, path):
+    """Extract and validate one PDF; runs in a worker process and returns an output row"""
+    started = time.perf_counter()
+    row = {"id": document_id, "path": path, "valid": False, "error": None}
+    try:
+        w2_data = extract_w2_data_from_pdf(path)
+        row.update(w2_data)
+        validate_w2_data(convert_monetary_fields(dict(w2_data)))
+        row["valid"] = True
+    except Exception as e:
+        row["error"] = str(e)
+    row["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return row
+
+def load_checkpoint(checkpoint_path):
+    """Return the ids of documents already completed by a previous run"""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as checkpoint:
+        return {line.rstrip('\n') for line in checkpoint if line.strip()}
+
+class ResultWriter:
+    """Appends result rows to a JSONL or CSV file, flushing after every row"""
+
+    def __init__(self, path, output_format):
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='')
+        self._format = output_format
+        if output_format == 'csv':
+            self._csv = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS)
+            if is_new:
+                self._csv.writeheader()
+
+    def write(self, row):
+        if self._format == 'csv':
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def run_batch(source, output_path, output_format='jsonl', workers=None, checkpoint_path=None, resume=True):
+    """
+    Extract every document from source into output_path
+    At most workers * 4 documents are in flight, so memory stays flat for very
+    large inputs. Returns a summary dict with processed/valid/failed/skipped counts.
+    """
+    workers = workers or available_cpus()
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    if not resume:
+        for path in (output_path, checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+    completed = load_checkpoint(checkpoint_path)
+
+    summary = {"processed": 0, "valid": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+    writer = ResultWriter(output_path, output_format)
+
+    try:
+        with open(checkpoint_path, 'a') as checkpoint, ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+
+            def drain(return_when):
+                nonlocal in_flight
+                done, in_flight = wait(in_flight, return_when=return_when)
+                for future in done:
+                    row = future.result()
+                    writer.write(row)
+                    checkpoint.write(row["id"] + '\n')
+                    checkpoint.flush()
+                    summary["processed"] += 1
+                    summary["valid" if row["valid"] else "failed"] += 1
+
+            for document_id, path in iter_documents(source):
+                if document_id in completed:
+                    summary["skipped"] += 1
+                    continue
+                in_flight.add(pool.submit(extract_document, document_id, path))
+                if len(in_flight) >= workers * 4:
+                    drain(FIRST_COMPLETED)
+
+            while in_flight:
+                drain(FIRST_COMPLETED)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 2)
+    summary["docs_per_sec"] = round(summary["processed"] / elapsed, 1) if elapsed else 0.0
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='Directory, glob pattern or JSONL manifest of PDFs')
+    parser.add_argument('--output', required=True, help='Result file (appended to when resuming)')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: available vCPUs)')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: <output>.checkpoint)')
+    parser.add_argument('--no-resume', action='store_true', help='Ignore and overwrite previous output and checkpoint')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    summary = run_batch(
+        args.input,
+        args.output,
+        output_format=args.format,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        resume=not args.no_resume
+    )
+    print(json.dumps(summary))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import threading
+from aws_clients import get_client
+
+logger = logging.getLogger()
+
+QUEUE_NAME = 'w2-file-events-queue'
+SQS_MAX_BATCH_SIZE = 10  # SendMessageBatch limit
+
+# Buffer events of jobs processed concurrently in one container (in-process SQS
+# dispatch) and send them in shared batches of 10. Off by default: each job then
+# sends its own events with one SendMessageBatch call.
+EVENT_PUBLISH_BUFFERED = os.environ.get('EVENT_PUBLISH_BUFFERED', 'false').lower() == 'true'
+EVENT_PUBLISH_MAX_DELAY_SECONDS = float(os.environ.get('EVENT_PUBLISH_MAX_DELAY_SECONDS', 1.0))
+# How long a buffered publish waits for its batch to be sent before reporting failure
+EVENT_PUBLISH_WAIT_SECONDS = 30
+
+# SQS client, created on first send. Assign a stand-in here to replace it.
+sqs = None
+
+def sqs_client():
+    return sqs if sqs is not None else get_client('sqs')
+
+_queue_url = None
+
+def get_queue_url():
+    """Resolve the events queue URL once per container"""
+    global _queue_url
+    if _queue_url is None:
+        _queue_url = sqs_client().get_queue_url(QueueName=QUEUE_NAME)['QueueUrl']
+    return _queue_url
+
+def send_events(events):
+    """
+    Send events to the SQS queue with SendMessageBatch, 10 per call
+    Returns the events SQS reported as failed.
+    """
+    failed = []
+    for start in range(0, len(events), SQS_MAX_BATCH_SIZE):
+        chunk = events[start:start + SQS_MAX_BATCH_SIZE]
+        response = sqs_client().send_message_batch(
+            QueueUrl=get_queue_url(),
+            Entries=[
+                {'Id': str(index), 'MessageBody': json.dumps(event)}
+                for index, event in enumerate(chunk)
+            ]
+        )
+        for failure in response.get('Failed', []):
+            event = chunk[int(failure['Id'])]
+            logger.error(f"❌ Failed to send {event.get('event_type')} event for job {event.get('job_id')}: {failure.get('Message')}")
+            failed.append(event)
+    return failed
+
+class _PendingPublish:
+    """Events of one publish() call, waiting for the batch that sends them"""
+
+    def __init__(self, events):
+        self.events = events
+        self.sent = threading.Event()
+        self.accepted = False
+
+class BufferedEventPublisher:
+    """
+    Coalesces events from concurrently processed jobs into SendMessageBatch calls
+    A batch is sent as soon as 10 events are buffered, or when the oldest
+    buffered event is max_delay_seconds old. publish() blocks until the batch
+    holding its events has been sent and reports whether SQS accepted all of
+    them, so callers can handle a failure before marking the job complete.
+    """
+
+    def __init__(self, max_delay_seconds=EVENT_PUBLISH_MAX_DELAY_SECONDS):
+        self._max_delay_seconds = max_delay_seconds
+        self._pending = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def publish(self, events):
+        """Buffer events and wait until they are sent; returns True if SQS accepted all of them"""
+        pending = _PendingPublish(list(events))
+        with self._lock:
+            self._pending.append(pending)
+            self._buffered += len(pending.events)
+            full = self._buffered >= SQS_MAX_BATCH_SIZE
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self._max_delay_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        if not pending.sent.wait(self._max_delay_seconds + EVENT_PUBLISH_WAIT_SECONDS):
+            logger.error(f"❌ Timed out waiting for {len(pending.events)} buffered events to be sent")
+            return False
+        return pending.accepted
+
+    def flush(self):
+        """Send every buffered event; returns True if all of them were accepted"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._buffered = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not pending:
+            return True
+
+        events = [event for publish in pending for event in publish.events]
+        try:
+            failed = send_events(events)
+        except Exception as e:
+            logger.error(f"❌ Failed to flush {len(events)} buffered events: {str(e)}")
+            failed = events
+
+        failed_ids = {id(event) for event in failed}
+        for publish in pending:
+            publish.accepted = not any(id(event) in failed_ids for event in publish.events)
+            publish.sent.set()
+
+        logger.info(f"✅ Flushed {len(events) - len(failed)} buffered events ({len(failed)} failed)")
+        return not failed
+
+buffered_publisher = BufferedEventPublisher()
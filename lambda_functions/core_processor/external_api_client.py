@@ -1,41 +1,210 @@
 import logging
+import os
+import random
 import requests
+import threading
+import time
 import uuid
 import json
-import boto3
+from contextlib import contextmanager
 from datetime import datetime
-from unittest.mock import patch, Mock
+from aws_clients import get_client
+from http_session import session, DEFAULT_TIMEOUT
 
 logger = logging.getLogger()
 
 # External API configuration
-EXTERNAL_API_BASE_URL = "http://external-api:8080"
+EXTERNAL_API_BASE_URL = os.environ.get('EXTERNAL_API_BASE_URL', "http://external-api:8080")
 
-# Initialize AWS Secrets Manager client
-secrets_client = boto3.client('secretsmanager', endpoint_url='http://localstack:4566', region_name='us-east-1')
+# The external API is mocked in-process unless EXTERNAL_API_MOCK=false,
+# e.g. when running against test_plan/external_api_stub.py
+EXTERNAL_API_MOCK = os.environ.get('EXTERNAL_API_MOCK', 'true').lower() == 'true'
 
-def get_api_key():
+# Maximum records per bulk data update request
+EXTERNAL_BULK_MAX_RECORDS = int(os.environ.get('EXTERNAL_BULK_MAX_RECORDS', 100))
+
+# Secrets Manager client, created on the first API key fetch. Assign a stand-in here to replace it.
+secrets_client = None
+
+def get_secrets_client():
+    return secrets_client if secrets_client is not None else get_client('secretsmanager')
+
+# API key cache configuration
+API_KEY_TTL_SECONDS = float(os.environ.get('API_KEY_TTL_SECONDS', 300))
+API_KEY_MAX_STALE_SECONDS = float(os.environ.get('API_KEY_MAX_STALE_SECONDS', 3600))
+
+class SecretCache:
+    """
+    In-process cache for a secret value with TTL-based refresh
+    - Fresh values are served from memory; once a value passes a jittered
+      refresh point (75-90% of the TTL) a single background refresh is started
+      while the cached value keeps being served.
+    - Expired values are refreshed synchronously. If that fails, the stale value
+      is served for up to max_stale seconds past expiry.
+    - force_refresh bypasses the cache, e.g. after the API answered 401.
+    """
+
+    def __init__(self, fetch, ttl, max_stale):
+        self._fetch = fetch
+        self._ttl = ttl
+        self._max_stale = max_stale
+        self._value = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        # Guards _refreshing only; _lock is held for a whole fetch, which hits must not wait on
+        self._refreshing_lock = threading.Lock()
+        self._refreshing = False
+        self.stats = {'hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_failures': 0, 'stale_served': 0}
+
+    def _store(self, value):
+        now = time.monotonic()
+        self._value = value
+        self._expires_at = now + self._ttl
+        self._refresh_at = now + self._ttl * random.uniform(0.75, 0.9)
+
+    def _refresh(self):
+        """Fetch a new value; returns True on success. Caller must hold the lock."""
+        self.stats['refreshes'] += 1
+        try:
+            value = self._fetch()
+        except Exception as e:
+            self.stats['refresh_failures'] += 1
+            logger.error(f"❌ Secret refresh failed: {str(e)}")
+            return False
+        self._store(value)
+        return True
+
+    def _start_background_refresh(self):
+        """Start a refresh thread unless one is already running"""
+        with self._refreshing_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        with self._lock:
+            try:
+                self._refresh()
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing = False
+
+    def get(self, force_refresh=False):
+        now = time.monotonic()
+        if self._value is not None and not force_refresh and now < self._expires_at:
+            self.stats['hits'] += 1
+            if now >= self._refresh_at:
+                self._start_background_refresh()
+            return self._value
+
+        self.stats['misses'] += 1
+        with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if not force_refresh and self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+            if self._refresh():
+                return self._value
+            if self._value is not None and time.monotonic() < self._expires_at + self._max_stale:
+                self.stats['stale_served'] += 1
+                logger.warning("⚠️ Serving stale secret after failed refresh")
+                return self._value
+            return None
+
+def fetch_api_key():
     """
     Retrieve API key from AWS Secrets Manager
+    Raises if the secret cannot be read or has no api_key.
+    """
+    logger.info("🔐 Retrieving API key from AWS Secrets Manager...")
+    
+    response = get_secrets_client().get_secret_value(SecretId='external-api-key')
+    secret_data = json.loads(response['SecretString'])
+    api_key = secret_data.get('api_key')
+    
+    if not api_key:
+        raise ValueError("API key not found in secret")
+    
+    logger.info(f"✅ API key retrieved successfully: {api_key[:8]}...")
+    return api_key
+
+api_key_cache = SecretCache(fetch_api_key, API_KEY_TTL_SECONDS, API_KEY_MAX_STALE_SECONDS)
+
+def get_api_key(force_refresh=False):
+    """
+    Return the external API key from the in-process cache
+    Returns None if no key could be retrieved from AWS Secrets Manager.
     """
     try:
-        logger.info("🔐 Retrieving API key from AWS Secrets Manager...")
-        
-        response = secrets_client.get_secret_value(SecretId='external-api-key')
-        secret_data = json.loads(response['SecretString'])
-        api_key = secret_data.get('api_key')
-        
-        if api_key:
-            logger.info(f"✅ API key retrieved successfully: {api_key[:8]}...")
-            return api_key
-        else:
-            logger.error("❌ API key not found in secret")
-            return None
-            
+        return api_key_cache.get(force_refresh)
     except Exception as e:
         logger.error(f"❌ Error retrieving API key from Secrets Manager: {str(e)}")
         return None
 
+def get_api_key_cache_stats():
+    """Return hit/miss/refresh counters for the API key cache"""
+    return dict(api_key_cache.stats)
+
+def post_with_api_key(url, payload, api_key):
+    """POST to the external API; on 401 force-refresh the cached API key and retry once"""
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+    response = _post(url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
+    
+    if response.status_code == 401:
+        logger.warning("🔐 External API rejected the API key, refreshing from Secrets Manager")
+        refreshed_key = get_api_key(force_refresh=True)
+        if refreshed_key and refreshed_key != api_key:
+            headers['Authorization'] = f'Bearer {refreshed_key}'
+            response = _post(url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
+    
+    return response
+
+class CannedResponse:
+    """The parts of requests.Response the API calls use, for mocked external API responses"""
+
+    def __init__(self, data, status_code):
+        self._data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error (mocked external API)")
+
+# Canned response for the current thread while inside mock_external_api. Kept per
+# thread (rather than patching session.post) so concurrent calls cannot leak mocks.
+_mock_state = threading.local()
+
+def _post(url, **kwargs):
+    """POST through the pooled session, or return this thread's mock response"""
+    mock_response = getattr(_mock_state, 'response', None)
+    if mock_response is not None:
+        return mock_response
+    return session.post(url, **kwargs)
+
+@contextmanager
+def mock_external_api(response_data, status_code=201):
+    """
+    Answer this thread's external API calls with a canned response inside the block
+    _post returns it instead of calling the pooled session. Does nothing when
+    EXTERNAL_API_MOCK is disabled, so the calls go to the real API.
+    """
+    if not EXTERNAL_API_MOCK:
+        yield
+        return
+    
+    _mock_state.response = CannedResponse(response_data, status_code)
+    try:
+        yield
+    finally:
+        _mock_state.response = None
+
 def call_external_upload_api(s3_url, job_id):
     """
     Call external upload API
@@ -56,29 +225,18 @@ def call_external_upload_api(s3_url, job_id):
             "job_id": job_id
         }
         
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
         logger.info(f"🌐 Calling external upload API: {url}")
         logger.info(f"📤 Upload payload: {payload}")
         logger.info(f"🔑 Using API key: {api_key[:8]}...")
         
-        # Mock the requests.post call
-        with patch('requests.post') as mock_post:
-            # Configure mock response
-            mock_response = Mock()
-            mock_response.status_code = 201
-            mock_response.json.return_value = {
-                'file_id': str(uuid.uuid4()),
-                'status': 'uploaded',
-                'timestamp': datetime.utcnow().isoformat() + 'Z'
-            }
-            mock_post.return_value = mock_response
-            
-            # Make the actual call (which will be mocked)
-            response = requests.post(url, json=payload, headers=headers, timeout=5)
+        # Canned response for this thread's call, unless EXTERNAL_API_MOCK=false
+        with mock_external_api({
+            'file_id': str(uuid.uuid4()),
+            'status': 'uploaded',
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }):
+            # Make the actual call (mocked unless EXTERNAL_API_MOCK=false)
+            response = post_with_api_key(url, payload, api_key)
             response.raise_for_status()
             
             response_data = response.json()
@@ -123,29 +281,18 @@ def call_external_data_update_api(w2_data, job_id):
             "job_id": job_id
         }
         
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
         logger.info(f"🌐 Calling external data update API: {url}")
         logger.info(f"📤 Data update payload: {payload}")
         logger.info(f"🔑 Using API key: {api_key[:8]}...")
         
-        # Mock the requests.post call
-        with patch('requests.post') as mock_post:
-            # Configure mock response
-            mock_response = Mock()
-            mock_response.status_code = 201
-            mock_response.json.return_value = {
-                'report_id': job_id,  # Use job_id as report_id
-                'file_id': str(uuid.uuid4()),
-                'timestamp': datetime.utcnow().isoformat() + 'Z'
-            }
-            mock_post.return_value = mock_response
-            
-            # Make the actual call (which will be mocked)
-            response = requests.post(url, json=payload, headers=headers, timeout=5)
+        # Canned response for this thread's call, unless EXTERNAL_API_MOCK=false
+        with mock_external_api({
+            'report_id': job_id,  # Use job_id as report_id
+            'file_id': str(uuid.uuid4()),
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }):
+            # Make the actual call (mocked unless EXTERNAL_API_MOCK=false)
+            response = post_with_api_key(url, payload, api_key)
             response.raise_for_status()
             
             response_data = response.json()
@@ -169,3 +316,78 @@ def call_external_data_update_api(w2_data, job_id):
             'success': False,
             'error': str(e)
         }
+
+def call_external_bulk_data_update_api(records):
+    """
+    Call external bulk data update API with many W2 records in one request
+    Mock API: POST http://external-api:8080/external/data-update/bulk
+    records is a list of {"job_id": ..., "w2_data": ...}. Returns per-job results
+    keyed by job_id; jobs missing from the API response are reported as failed.
+    """
+    try:
+        # Get API key from Secrets Manager
+        api_key = get_api_key()
+        if not api_key:
+            return {
+                'success': False,
+                'error': 'Failed to retrieve API key from Secrets Manager'
+            }
+        
+        url = f"{EXTERNAL_API_BASE_URL}/external/data-update/bulk"
+        payload = {
+            "records": records
+        }
+        
+        logger.info(f"🌐 Calling external bulk data update API: {url} ({len(records)} records)")
+        
+        # Canned response for this thread's call, unless EXTERNAL_API_MOCK=false
+        with mock_external_api({
+            'results': [
+                {
+                    'job_id': record['job_id'],
+                    'success': True,
+                    'report_id': record['job_id'],  # Use job_id as report_id
+                    'file_id': str(uuid.uuid4())
+                }
+                for record in records
+            ],
+            'timestamp': datetime.utcnow().isoformat() + 'Z'
+        }):
+            # Make the actual call (mocked unless EXTERNAL_API_MOCK=false)
+            response = post_with_api_key(url, payload, api_key)
+            response.raise_for_status()
+            
+            response_data = response.json()
+            logger.info(f"📥 Bulk data update API response for {len(response_data.get('results', []))} records")
+        
+        results = {}
+        for item in response_data.get('results', []):
+            results[item.get('job_id')] = {
+                'success': bool(item.get('success')),
+                'report_id': item.get('report_id'),
+                'file_id': item.get('file_id'),
+                'error': item.get('error')
+            }
+        for record in records:
+            results.setdefault(record['job_id'], {
+                'success': False,
+                'error': 'No result returned for record'
+            })
+        
+        return {
+            'success': True,
+            'results': results
+        }
+            
+    except requests.exceptions.RequestException as e:
+        logger.error(f"❌ Request error calling external bulk data update API: {str(e)}")
+        return {
+            'success': False,
+            'error': f"Request failed: {str(e)}"
+        }
+    except Exception as e:
+        logger.error(f"❌ Error calling external bulk data update API: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from aws_clients import get_client
+
+logger = logging.getLogger()
+
+# Cache of extraction results keyed by the SHA-256 of the PDF content, so
+# re-uploads of the same document skip parsing (and optionally the external upload)
+EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', 'false').lower() == 'true'
+EXTRACTION_CACHE_TTL_SECONDS = float(os.environ.get('EXTRACTION_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MEMORY_ENTRIES', 256))
+EXTRACTION_CACHE_BUCKET = os.environ.get('EXTRACTION_CACHE_BUCKET', 'w2-bucket')
+EXTRACTION_CACHE_PREFIX = os.environ.get('EXTRACTION_CACHE_PREFIX', 'extraction-cache/')
+# Entries hold the extracted SSN and EIN, so they are written with SSE-KMS, under
+# this key if set (else the account's aws/s3 key). setup-aws.sh adds a lifecycle
+# rule expiring the prefix after the TTL.
+EXTRACTION_CACHE_KMS_KEY_ID = os.environ.get('EXTRACTION_CACHE_KMS_KEY_ID')
+
+# Initialize S3 client
+s3 = None
+
+def s3_client():
+    return s3 if s3 is not None else get_client('s3')
+
+class ExtractionCache:
+    """
+    Two-level extraction cache
+    Entries live as JSON objects under EXTRACTION_CACHE_PREFIX in S3 (persistent,
+    shared by all containers) with a per-container LRU in front of them. Entries
+    older than the TTL are treated as misses; the LRU evicts beyond max_entries.
+    S3 entries are encrypted with SSE-KMS and deleted by the bucket's lifecycle
+    rule. Objects outside the uploads/ prefix do not trigger S3 events.
+    """
+
+    def __init__(self, bucket, prefix, ttl, max_entries, kms_key_id=None):
+        self._bucket = bucket
+        self._prefix = prefix
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._kms_key_id = kms_key_id
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'memory_hits': 0, 'misses': 0, 'expired': 0, 'puts': 0, 'errors': 0}
+
+    def _object_key(self, content_hash):
+        return f"{self._prefix}{content_hash}.json"
+
+    def _remember(self, content_hash, entry):
+        with self._lock:
+            self._memory[content_hash] = entry
+            self._memory.move_to_end(content_hash)
+            while len(self._memory) > self._max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, content_hash):
+        """Read an entry from S3; returns None if there is none"""
+        try:
+            response = s3_client().get_object(Bucket=self._bucket, Key=self._object_key(content_hash))
+        except Exception as e:
+            # botocore's ClientError, matched by its response so botocore is not imported up front
+            error_code = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+            if error_code in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(response['Body'].read())
+
+    def _is_fresh(self, entry):
+        return time.time() - entry.get('cached_at', 0) < self._ttl
+
+    def get(self, content_hash):
+        """Return the cached entry for this content hash, or None"""
+        with self._lock:
+            entry = self._memory.get(content_hash)
+            if entry is not None:
+                self._memory.move_to_end(content_hash)
+        if entry is not None and self._is_fresh(entry):
+            self.stats['hits'] += 1
+            self.stats['memory_hits'] += 1
+            return entry
+
+        try:
+            entry = self._load(content_hash)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Error reading extraction cache entry {content_hash}: {str(e)}")
+            entry = None
+
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        if not self._is_fresh(entry):
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        self._remember(content_hash, entry)
+        return entry
+
+    def put(self, content_hash, **fields):
+        """Store or merge fields into the entry for this content hash; failures are logged only"""
+        with self._lock:
+            current = self._memory.get(content_hash)
+
+        try:
+            if current is None:
+                current = self._load(content_hash)
+            entry = dict(current or {})
+            entry.update(fields)
+            entry.setdefault('cached_at', time.time())
+
+            encryption = {'ServerSideEncryption': 'aws:kms'}
+            if self._kms_key_id:
+                encryption['SSEKMSKeyId'] = self._kms_key_id
+            s3_client().put_object(
+                Bucket=self._bucket,
+                Key=self._object_key(content_hash),
+                Body=json.dumps(entry).encode(),
+                ContentType='application/json',
+                **encryption
+            )
+            self.stats['puts'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Error writing extraction cache entry {content_hash}: {str(e)}")
+            return False
+
+        self._remember(content_hash, entry)
+        return True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+extraction_cache = ExtractionCache(
+    EXTRACTION_CACHE_BUCKET,
+    EXTRACTION_CACHE_PREFIX,
+    EXTRACTION_CACHE_TTL_SECONDS,
+    EXTRACTION_CACHE_MEMORY_ENTRIES,
+    EXTRACTION_CACHE_KMS_KEY_ID
+)
@@ -1,27 +1,51 @@
+import contextvars
 import json
 import logging
 import os
-import requests
-import boto3
+import time
 from datetime import datetime
 from urllib.parse import unquote_plus
 from w2_extractor import extract_w2_data, validate_w2_data
-from external_api_client import call_external_upload_api, call_external_data_update_api
+from external_api_client import (
+    call_external_upload_api, call_external_data_update_api, call_external_bulk_data_update_api,
+    get_api_key_cache_stats, EXTERNAL_BULK_MAX_RECORDS
+)
+from http_session import session, DEFAULT_TIMEOUT, get_connection_stats
+from event_publisher import EVENT_PUBLISH_BUFFERED, buffered_publisher, send_events
+from extraction_cache import EXTRACTION_CACHE_ENABLED, extraction_cache
+from stage_metrics import emit_stage, stage_span
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Initialize SQS client
-sqs = boto3.client('sqs', endpoint_url='http://localstack:4566', region_name='us-east-1')
+# Send a lightweight progress PATCH before each processing phase. Off by default:
+# every job transition is otherwise committed with a single consolidated PATCH.
+JOB_PROGRESS_UPDATES = os.environ.get('JOB_PROGRESS_UPDATES', 'false').lower() == 'true'
+
+# Execution runtime for S3 uploads: 'sync' (default) or 'async'. The async runtime
+# calls the external APIs concurrently right after extraction instead of publishing
+# external_upload / external_data_update events to SQS.
+CORE_PROCESSOR_RUNTIME = os.environ.get('CORE_PROCESSOR_RUNTIME', 'sync').lower()
+
+# Skip the external upload of a re-uploaded document whose content was already
+# uploaded (known from the extraction cache); the data update is still sent
+DEDUP_SKIP_EXTERNAL_UPLOAD = os.environ.get('DEDUP_SKIP_EXTERNAL_UPLOAD', 'false').lower() == 'true'
+
+# Django backend base URL
+BACKEND_BASE_URL = os.environ.get('BACKEND_BASE_URL', 'http://backend:8000')
+
+def w2_data_status_updates(status, message=None):
+    """Build the job fields for a W2 data processing status"""
+    return {
+        "w2_data_status": status,
+        "w2_data_status_msg": message
+    }
 
 def update_w2_data_status(job_id, status, message=None):
     """Update W2 data processing status (simplified: success/failure only)"""
     try:
-        update_payload = {
-            "w2_data_status": status,
-            "w2_data_status_msg": message
-        }
+        update_payload = w2_data_status_updates(status, message)
         
         if update_job(job_id, update_payload):
             logger.info(f"Updated W2 data status for job {job_id}: {status} - {message}")
@@ -33,6 +57,10 @@ def update_w2_data_status(job_id, status, message=None):
         logger.error(f"Error updating W2 data status for job {job_id}: {str(e)}")
         return False
 
+def timestamp_now():
+    """Current UTC time in the ISO 8601 form used for job timestamps and events"""
+    return datetime.utcnow().isoformat() + 'Z'
+
 def extract_job_id(object_key):
     """Extract job_id from S3 object key"""
     # "uploads/job_id/w2.pdf" -> "job_id"
@@ -44,13 +72,18 @@ def extract_job_id(object_key):
     else:
         return "unknown"
 
-def process_w2_file(job_id, object_key):
-    """Process W2 file and extract data"""
+def process_w2_file(job_id, object_key, cache_info=None):
+    """
+    Process W2 file and extract data
+    Returns the JSON-serializable W2 data; persisting it is left to the caller
+    so that all job transitions can be committed in one write. cache_info is
+    passed through to extract_w2_data.
+    """
     logger.info(f"Processing W2 file for job {job_id} with file {object_key}")
     
     try:
         # Extract W2 data from the file
-        w2_data = extract_w2_data(object_key)
+        w2_data = extract_w2_data(object_key, cache_info)
         
         # Validate extracted data
         validate_w2_data(w2_data)
@@ -63,85 +96,177 @@ def process_w2_file(job_id, object_key):
             else:
                 w2_data_serializable[key] = value
         
-        # Update job with extracted W2 data
-        update_payload = {
-            "w2_data": w2_data_serializable
-        }
-        
-        if not update_job(job_id, update_payload):
-            raise Exception("Failed to update job with W2 data")
-        
-        # Update status to success
-        update_w2_data_status(job_id, 'success', 'W2 data extracted successfully')
-        
-        logger.info(f"✅ Successfully extracted and stored W2 data for job {job_id}")
+        logger.info(f"✅ Successfully extracted W2 data for job {job_id}")
         return w2_data_serializable
         
     except Exception as e:
-        error_msg = f"W2 extraction failed: {str(e)}"
-        logger.error(f"❌ Error processing W2 file for job {job_id}: {error_msg}")
-        
-        # Update status to failed
-        update_w2_data_status(job_id, 'failed', error_msg)
+        logger.error(f"❌ Error processing W2 file for job {job_id}: W2 extraction failed: {str(e)}")
         
         # Re-raise exception to trigger SQS retry
         raise e
 
 def update_job(job_id, updates):
     """Helper function to update job via API"""
-    django_url = f"http://backend:8000/jobs/{job_id}/"
-    response = requests.patch(django_url, json=updates)
-    
-    if response.status_code == 200:
-        logger.info(f"✅ Successfully updated job {job_id}")
-        return True
-    else:
-        logger.error(f"❌ Failed to update job {job_id}: {response.text}")
-        return False
+    django_url = f"{BACKEND_BASE_URL}/jobs/{job_id}/"
+    with stage_span('backend_patch', job_id) as span:
+        response = session.patch(django_url, json=updates, timeout=DEFAULT_TIMEOUT)
+        span["http_status"] = response.status_code
+        
+        if response.status_code == 200:
+            logger.info(f"✅ Successfully updated job {job_id}")
+            return True
+        else:
+            span["status"] = "error"
+            logger.error(f"❌ Failed to update job {job_id}: {response.text}")
+            return False
+
+def bulk_update_jobs(job_updates):
+    """
+    Helper function to update many jobs with one API call
+    job_updates is a list of PATCH payloads that each include a job_id.
+    Returns the per-job results from the backend, or None if the request failed.
+    """
+    django_url = f"{BACKEND_BASE_URL}/jobs/bulk_update/"
+    with stage_span('backend_bulk_update', records=len(job_updates)) as span:
+        response = session.post(django_url, json=job_updates, timeout=DEFAULT_TIMEOUT)
+        span["http_status"] = response.status_code
+        
+        if response.status_code == 200:
+            body = response.json()
+            logger.info(f"✅ Bulk updated {body.get('updated')} jobs ({body.get('failed')} failed)")
+            return body.get('results', [])
+        else:
+            span["status"] = "error"
+            logger.error(f"❌ Failed to bulk update {len(job_updates)} jobs: {response.text}")
+            return None
 
-def publish_external_events(job_id, object_key, w2_data):
-    """Publish external upload and data update events to SQS"""
+def report_progress(job_id, progress):
+    """Best-effort intermediate progress update, only sent when JOB_PROGRESS_UPDATES is enabled"""
+    if not JOB_PROGRESS_UPDATES:
+        return
     try:
-        # Get SQS queue URL
-        queue_url = sqs.get_queue_url(QueueName='w2-file-events-queue')['QueueUrl']
-        
-        # Prepare S3 URL
-        s3_url = f"s3://w2-bucket/{object_key}"
-        timestamp = datetime.utcnow().isoformat() + 'Z'
-        
-        # Event 1: external_upload
-        external_upload_event = {
-            "event_type": "external_upload",
-            "job_id": job_id,
-            "s3_url": s3_url,
-            "timestamp": timestamp
-        }
-        
-        # Event 2: external_data_update
-        external_data_update_event = {
-            "event_type": "external_data_update",
-            "job_id": job_id,
-            "w2_data": w2_data,
-            "timestamp": timestamp
-        }
-        
-        # Send both events to SQS
-        sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(external_upload_event)
-        )
-        
-        sqs.send_message(
-            QueueUrl=queue_url,
-            MessageBody=json.dumps(external_data_update_event)
-        )
-        
-        logger.info(f"✅ Published external events for job {job_id}")
-        return True
-        
+        update_job(job_id, {"progress": progress})
     except Exception as e:
-        logger.error(f"❌ Failed to publish external events for job {job_id}: {str(e)}")
-        return False
+        logger.warning(f"Could not report progress '{progress}' for job {job_id}: {str(e)}")
+
+def cached_upload_result(cache_info):
+    """Upload result to reuse for a duplicate document, or None if it must be uploaded"""
+    if DEDUP_SKIP_EXTERNAL_UPLOAD and cache_info.get('external_file_id'):
+        return {'success': True, 'file_id': cache_info['external_file_id']}
+    return None
+
+def upload_external_document(s3_url, job_id, content_hash=None):
+    """Call the external upload API and remember the returned file_id for this content"""
+    with stage_span('external_upload_api', job_id) as span:
+        api_result = call_external_upload_api(s3_url, job_id)
+        api_result['finished_at'] = timestamp_now()
+        if not api_result['success']:
+            span["status"] = "error"
+    if api_result['success'] and content_hash and EXTRACTION_CACHE_ENABLED:
+        extraction_cache.put(content_hash, external_file_id=api_result.get('file_id'))
+    return api_result
+
+def update_external_data(w2_data, job_id):
+    """Call the external data update API for one job"""
+    with stage_span('external_data_update_api', job_id) as span:
+        api_result = call_external_data_update_api(w2_data, job_id)
+        api_result['finished_at'] = timestamp_now()
+        if not api_result['success']:
+            span["status"] = "error"
+    return api_result
+
+# Whether publish_external_events buffers events into batches shared with other
+# jobs. Only jobs dispatched concurrently in one container (sqs_handler in-process
+# mode) share batches; lambda_handler runs one job per invocation, so it sends directly.
+buffer_events = contextvars.ContextVar('buffer_events', default=EVENT_PUBLISH_BUFFERED)
+
+def publish_external_events(job_id, object_key, w2_data, content_hash=None, include_upload=True,
+                            include_data_update=True):
+    """Publish external upload and data update events to SQS; returns True once SQS accepted all of them"""
+    with stage_span('publish_events', job_id) as span:
+        try:
+            # Prepare S3 URL
+            s3_url = f"s3://w2-bucket/{object_key}"
+            timestamp = timestamp_now()
+            
+            # Event 1: external_upload
+            external_upload_event = {
+                "event_type": "external_upload",
+                "job_id": job_id,
+                "s3_url": s3_url,
+                "timestamp": timestamp
+            }
+            if content_hash:
+                external_upload_event["content_hash"] = content_hash
+            
+            # Event 2: external_data_update
+            external_data_update_event = {
+                "event_type": "external_data_update",
+                "job_id": job_id,
+                "w2_data": w2_data,
+                "timestamp": timestamp
+            }
+            
+            events = []
+            if include_upload:
+                events.append(external_upload_event)
+            if include_data_update:
+                events.append(external_data_update_event)
+            
+            # Send in a batch shared with concurrent jobs, or in one SendMessageBatch call
+            if buffer_events.get():
+                failed = not buffered_publisher.publish(events)
+            else:
+                failed = bool(send_events(events))
+            if failed:
+                logger.error(f"❌ Some external events for job {job_id} were not published")
+                span["status"] = "error"
+                return False
+            
+            logger.info(f"✅ Published external events for job {job_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to publish external events for job {job_id}: {str(e)}")
+            span["status"] = "error"
+            return False
+
+def dispatch_event(event):
+    """
+    Route an event to its handler based on event_type
+    Also used by sqs_handler to run jobs in-process instead of via Lambda invoke.
+    Each event is timed as one stage named after its event_type; when the SQS
+    handler stamped dispatched_at (epoch ms), the hand-off is timed as invoke_wait.
+    """
+    event_type = event.get('event_type', 's3_upload')  # Default to s3_upload for backward compatibility
+    job_id = event.get('job_id') or (extract_job_id(event['object_key']) if event.get('object_key') else None)
+    
+    if event.get('dispatched_at'):
+        emit_stage('invoke_wait', time.time() * 1000 - event['dispatched_at'], job_id=job_id, event_type=event_type)
+    
+    with stage_span(event_type, job_id) as span:
+        result = route_event(event, event_type)
+        if (result or {}).get('statusCode', 200) >= 400:
+            span["status"] = "error"
+        return result
+
+def route_event(event, event_type):
+    """Call the handler for event_type"""
+    if event_type == 's3_upload':
+        if CORE_PROCESSOR_RUNTIME == 'async':
+            # asyncio is only loaded by containers running the async runtime
+            import asyncio
+            return asyncio.run(handle_s3_upload_async(event))
+        return handle_s3_upload(event)
+    elif event_type == 'external_upload':
+        return handle_external_upload(event)
+    elif event_type == 'external_data_update':
+        return handle_external_data_update(event)
+    elif event_type == 'external_data_update_batch':
+        return handle_external_data_update_batch(event)
+    else:
+        logger.warning(f"Unknown event type: {event_type}, defaulting to s3_upload")
+        return handle_s3_upload(event)
 
 def lambda_handler(event, context):
     """
@@ -150,18 +275,10 @@ def lambda_handler(event, context):
     """
     logger.info(f"Received event: {json.dumps(event)}")
     
+    # One job per invocation: there are no concurrent jobs to share event batches with
+    buffer_events_token = buffer_events.set(False)
     try:
-        event_type = event.get('event_type', 's3_upload')  # Default to s3_upload for backward compatibility
-        
-        if event_type == 's3_upload':
-            return handle_s3_upload(event)
-        elif event_type == 'external_upload':
-            return handle_external_upload(event)
-        elif event_type == 'external_data_update':
-            return handle_external_data_update(event)
-        else:
-            logger.warning(f"Unknown event type: {event_type}, defaulting to s3_upload")
-            return handle_s3_upload(event)
+        return dispatch_event(event)
         
     except Exception as e:
         logger.error(f"Error processing event: {str(e)}")
@@ -169,6 +286,12 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps(f'Error: {str(e)}')
         }
+    finally:
+        buffer_events.reset(buffer_events_token)
+        logger.info(f"HTTP connection stats: {get_connection_stats()}")
+        logger.info(f"API key cache stats: {get_api_key_cache_stats()}")
+        if EXTRACTION_CACHE_ENABLED:
+            logger.info(f"Extraction cache stats: {extraction_cache.get_stats()}")
 
 def handle_s3_upload(event):
     """Handle S3 upload events - original W2 processing logic"""
@@ -191,18 +314,43 @@ def handle_s3_upload(event):
         
         logger.info(f"Processing S3 upload for job: {job_id}")
         
-        # Phase 1: Mark file as uploaded
-        if not update_job(job_id, {"file_uploaded": True}):
-            return {"statusCode": 500, "body": "Failed to mark file as uploaded"}
+        # Phase 1: File is uploaded - accumulate transitions and commit them in one write
+        job_updates = {"file_uploaded": True}
+        if timestamp:
+            job_updates["upload_received_at"] = timestamp
+        report_progress(job_id, "extracting")
         
         # Phase 2: Process W2 file and extract data
-        w2_data = process_w2_file(job_id, object_key)
-        
-        # Phase 3: Publish external events
-        publish_external_events(job_id, object_key, w2_data)
-        
-        # Phase 4: Mark as completed
-        if not update_job(job_id, {"status": "Success"}):
+        cache_info = {}
+        job_updates["extraction_started_at"] = timestamp_now()
+        try:
+            w2_data = process_w2_file(job_id, object_key, cache_info)
+        except Exception as e:
+            job_updates.update(w2_data_status_updates('failed', f"W2 extraction failed: {str(e)}"))
+            job_updates["progress"] = "failed"
+            update_job(job_id, job_updates)
+            raise
+        job_updates["extraction_finished_at"] = timestamp_now()
+        
+        job_updates["w2_data"] = w2_data
+        reused_upload = cached_upload_result(cache_info)
+        if reused_upload:
+            job_updates["external_upload"] = True
+        
+        # Phase 3: Publish external events before the job reads as Success
+        if not publish_external_events(job_id, object_key, w2_data, cache_info.get('content_hash'),
+                                       include_upload=not reused_upload):
+            job_updates.update(w2_data_status_updates('failed', 'Failed to publish external events'))
+            job_updates["progress"] = "failed"
+            update_job(job_id, job_updates)
+            return {"statusCode": 500, "body": "Failed to publish external events"}
+        
+        # Phase 4: Commit extracted data and completion in a single PATCH
+        job_updates.update(w2_data_status_updates('success', 'W2 data extracted successfully'))
+        job_updates["status"] = "Success"
+        job_updates["progress"] = "completed"
+        job_updates["completed_at"] = timestamp_now()
+        if not update_job(job_id, job_updates):
             return {"statusCode": 500, "body": "Failed to mark job as completed"}
         
         # Log success
@@ -225,6 +373,120 @@ def handle_s3_upload(event):
             'body': json.dumps(f'Error: {str(e)}')
         }
 
+async def handle_s3_upload_async(event):
+    """
+    Handle S3 upload events on the asyncio runtime
+    Independent I/O runs concurrently: the progress write overlaps extraction, and
+    the external upload and data update calls run side by side, so latency after
+    extraction is that of the slowest call. All transitions, including the
+    external flags, are then committed with a single PATCH; a failed call is
+    then published as its external event, so the SQS path retries it. The
+    blocking HTTP and S3 clients run on the default executor via asyncio.to_thread.
+    """
+    import asyncio
+    try:
+        object_key = event.get('object_key')
+        
+        # Extract job_id from object key
+        job_id = extract_job_id(object_key)
+        
+        if job_id == "unknown":
+            logger.error(f"Could not extract job_id from object_key: {object_key}")
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Invalid object key format')
+            }
+        
+        logger.info(f"Processing S3 upload for job: {job_id} (async runtime)")
+        
+        # Phase 1: File is uploaded - report progress while extracting
+        job_updates = {"file_uploaded": True}
+        if event.get('timestamp'):
+            job_updates["upload_received_at"] = event['timestamp']
+        progress_task = asyncio.create_task(asyncio.to_thread(report_progress, job_id, "extracting"))
+        
+        # Phase 2: Process W2 file and extract data
+        cache_info = {}
+        job_updates["extraction_started_at"] = timestamp_now()
+        try:
+            w2_data = await asyncio.to_thread(process_w2_file, job_id, object_key, cache_info)
+        except Exception as e:
+            await progress_task
+            job_updates.update(w2_data_status_updates('failed', f"W2 extraction failed: {str(e)}"))
+            job_updates["progress"] = "failed"
+            await asyncio.to_thread(update_job, job_id, job_updates)
+            raise
+        job_updates["extraction_finished_at"] = timestamp_now()
+        await progress_task
+        
+        # Phase 3: External upload and data update concurrently
+        s3_url = f"s3://w2-bucket/{object_key}"
+        reused_upload = cached_upload_result(cache_info)
+        if reused_upload:
+            data_update_result = await asyncio.to_thread(update_external_data, w2_data, job_id)
+            upload_result = reused_upload
+        else:
+            upload_result, data_update_result = await asyncio.gather(
+                asyncio.to_thread(upload_external_document, s3_url, job_id, cache_info.get('content_hash')),
+                asyncio.to_thread(update_external_data, w2_data, job_id)
+            )
+        
+        # Phase 4: Commit extracted data, external results and completion in a single PATCH
+        job_updates["w2_data"] = w2_data
+        job_updates["external_upload"] = upload_result['success']
+        job_updates["external_data_update"] = data_update_result['success']
+        if upload_result['success'] and upload_result.get('finished_at'):
+            job_updates["external_upload_at"] = upload_result['finished_at']
+        if data_update_result['success']:
+            job_updates["data_update_at"] = data_update_result['finished_at']
+        errors = []
+        if not upload_result['success']:
+            errors.append(f"External upload API failed: {upload_result.get('error')}")
+        if not data_update_result['success']:
+            errors.append(f"External data update API failed: {data_update_result.get('error')}")
+        if errors:
+            job_updates.update(w2_data_status_updates('failed', '; '.join(errors)))
+        else:
+            job_updates.update(w2_data_status_updates('success', 'W2 data extracted and sent to external API successfully'))
+        job_updates["status"] = "Success"
+        job_updates["progress"] = "completed"
+        # Stamped once the external calls have returned, when the job is actually finished
+        job_updates["completed_at"] = timestamp_now()
+        
+        if not await asyncio.to_thread(update_job, job_id, job_updates):
+            return {"statusCode": 500, "body": "Failed to mark job as completed"}
+        
+        # Phase 5: Hand failed calls to the external event handlers, which retry them
+        if errors:
+            published = await asyncio.to_thread(
+                publish_external_events, job_id, object_key, w2_data, cache_info.get('content_hash'),
+                include_upload=not upload_result['success'],
+                include_data_update=not data_update_result['success']
+            )
+            if not published:
+                return {"statusCode": 500, "body": "Failed to publish retry events for external API calls"}
+        
+        logger.info(f"✅ Successfully processed S3 upload for job {job_id} (async runtime)")
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'S3 upload processed successfully',
+                'job_id': job_id,
+                'file_uploaded': True,
+                'status': 'Success',
+                'external_upload': upload_result['success'],
+                'external_data_update': data_update_result['success']
+            })
+        }
+        
+    except Exception as e:
+        logger.error(f"Error processing S3 upload: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error: {str(e)}')
+        }
+
 def handle_external_upload(event):
     """Handle external upload events"""
     try:
@@ -241,12 +503,13 @@ def handle_external_upload(event):
         logger.info(f"Processing external upload for job: {job_id}")
         
         # Call external upload API
-        api_result = call_external_upload_api(s3_url, job_id)
+        api_result = upload_external_document(s3_url, job_id, event.get('content_hash'))
         
         if api_result['success']:
             # Update database with success
-            if update_job(job_id, {"external_upload": True}):
-                update_w2_data_status(job_id, 'success', 'External upload completed successfully')
+            job_updates = {"external_upload": True, "external_upload_at": api_result['finished_at']}
+            job_updates.update(w2_data_status_updates('success', 'External upload completed successfully'))
+            if update_job(job_id, job_updates):
                 logger.info(f"✅ Successfully processed external upload for job {job_id}")
                 return {
                     'statusCode': 200,
@@ -296,12 +559,13 @@ def handle_external_data_update(event):
         logger.info(f"Processing external data update for job: {job_id}")
         
         # Call external data update API
-        api_result = call_external_data_update_api(w2_data, job_id)
+        api_result = update_external_data(w2_data, job_id)
         
         if api_result['success']:
             # Update database with success
-            if update_job(job_id, {"external_data_update": True}):
-                update_w2_data_status(job_id, 'success', 'External data update completed successfully')
+            job_updates = {"external_data_update": True, "data_update_at": api_result['finished_at']}
+            job_updates.update(w2_data_status_updates('success', 'External data update completed successfully'))
+            if update_job(job_id, job_updates):
                 logger.info(f"✅ Successfully processed external data update for job {job_id}")
                 return {
                     'statusCode': 200,
@@ -335,3 +599,78 @@ def handle_external_data_update(event):
             'statusCode': 500,
             'body': json.dumps(f'Error: {str(e)}')
         }
+
+def handle_external_data_update_batch(event):
+    """
+    Handle a batch of external data update events with the bulk external API
+    Event: {"event_type": "external_data_update_batch", "events": [<external_data_update event>, ...]}
+    Records are posted in chunks of EXTERNAL_BULK_MAX_RECORDS and the per-record
+    results are written back to each job with one bulk job update per chunk.
+    The response body lists failed_job_ids so the caller can retry just those.
+    """
+    try:
+        events = event.get('events', [])
+        failed_job_ids = []
+        records = []
+        
+        for data_update_event in events:
+            job_id = data_update_event.get('job_id')
+            w2_data = data_update_event.get('w2_data')
+            if not job_id or not w2_data:
+                logger.error(f"Missing required fields in external_data_update event: {data_update_event}")
+                if job_id:
+                    failed_job_ids.append(job_id)
+                continue
+            records.append({"job_id": job_id, "w2_data": w2_data})
+        
+        logger.info(f"Processing external data update batch: {len(records)} records")
+        
+        for start in range(0, len(records), EXTERNAL_BULK_MAX_RECORDS):
+            chunk = records[start:start + EXTERNAL_BULK_MAX_RECORDS]
+            with stage_span('external_bulk_api', records=len(chunk)) as span:
+                api_result = call_external_bulk_data_update_api(chunk)
+                finished_at = timestamp_now()
+                if not api_result['success']:
+                    span["status"] = "error"
+            
+            job_updates = []
+            for record in chunk:
+                job_id = record["job_id"]
+                if api_result['success']:
+                    record_result = api_result['results'][job_id]
+                else:
+                    record_result = {'success': False, 'error': api_result.get('error')}
+                
+                if record_result['success']:
+                    job_update = {"job_id": job_id, "external_data_update": True, "data_update_at": finished_at}
+                    job_update.update(w2_data_status_updates('success', 'External data update completed successfully'))
+                else:
+                    failed_job_ids.append(job_id)
+                    job_update = {"job_id": job_id}
+                    job_update.update(w2_data_status_updates('failed', f"External data update API failed: {record_result.get('error')}"))
+                job_updates.append(job_update)
+            
+            db_results = bulk_update_jobs(job_updates)
+            if db_results is None:
+                failed_job_ids.extend(record["job_id"] for record in chunk if record["job_id"] not in failed_job_ids)
+                continue
+            for db_result in db_results:
+                if not db_result.get('success') and db_result.get('job_id') not in failed_job_ids:
+                    failed_job_ids.append(db_result.get('job_id'))
+        
+        logger.info(f"✅ Processed external data update batch: {len(events) - len(failed_job_ids)} succeeded, {len(failed_job_ids)} failed")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'External data update batch processed',
+                'processed': len(events),
+                'failed_job_ids': failed_job_ids
+            })
+        }
+        
+    except Exception as e:
+        logger.error(f"Error processing external data update batch: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f'Error: {str(e)}')
+        }
@@ -0,0 +1,85 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger()
+
+# Per-stage timing spans, written to stdout as CloudWatch Embedded Metric Format
+# (EMF) lines: CloudWatch turns each line into a Duration metric per Service and
+# Stage, while job_id, span ids and any extra properties stay searchable in Logs.
+# On by default only inside Lambda, so local CLIs (batch, benchmarks) print clean output.
+STAGE_METRICS_ENABLED = os.environ.get(
+    'STAGE_METRICS_ENABLED', 'true' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else 'false'
+).lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'W2Pipeline')
+SERVICE_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+# The enclosing span: nested spans inherit its job_id and record it as parent.
+# Context variables follow asyncio tasks and asyncio.to_thread calls.
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+def emit_stage(stage, duration_ms, job_id=None, status='ok', **properties):
+    """Write one EMF line for a completed stage"""
+    if not STAGE_METRICS_ENABLED:
+        return
+    now_ms = time.time() * 1000
+    record = {
+        "_aws": {
+            "Timestamp": int(now_ms),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Service", "Stage"]],
+                "Metrics": [{"Name": "Duration", "Unit": "Milliseconds"}]
+            }]
+        },
+        "Service": SERVICE_NAME,
+        "Stage": stage,
+        "Duration": round(duration_ms, 3),
+        "start_ms": round(now_ms - duration_ms, 3),
+        "job_id": job_id,
+        "status": status,
+        **properties
+    }
+    try:
+        # EMF lines must be bare JSON, so they bypass the Lambda log formatter.
+        # One write per line keeps lines from concurrent threads whole.
+        sys.stdout.write(json.dumps(record, default=str) + '\n')
+        sys.stdout.flush()
+    except Exception as e:
+        logger.warning(f"Could not emit timing for stage {stage}: {str(e)}")
+
+@contextmanager
+def stage_span(stage, job_id=None, **properties):
+    """
+    Time a block as one pipeline stage and emit it when the block exits
+    Yields a dict of properties the block may extend; setting its "status" to
+    "error" marks a failure that did not raise. Exceptions mark the span as an
+    error and propagate.
+    """
+    parent = _current_span.get()
+    if job_id is None and parent is not None:
+        job_id = parent["job_id"]
+    span = {"job_id": job_id, "span_id": uuid.uuid4().hex[:16]}
+    token = _current_span.set(span)
+    properties["status"] = "ok"
+    started = time.perf_counter()
+    try:
+        yield properties
+    except BaseException:
+        properties["status"] = "error"
+        raise
+    finally:
+        _current_span.reset(token)
+        emit_stage(
+            stage,
+            (time.perf_counter() - started) * 1000,
+            job_id=job_id,
+            span_id=span["span_id"],
+            parent_span_id=parent["span_id"] if parent else None,
+            **properties
+        )
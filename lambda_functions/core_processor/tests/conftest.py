@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The core processor modules are flat files deployed side by side; import them the same way
+CORE_PROCESSOR_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if CORE_PROCESSOR_DIR not in sys.path:
+    sys.path.insert(0, CORE_PROCESSOR_DIR)
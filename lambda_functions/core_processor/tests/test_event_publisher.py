@@ -0,0 +1,125 @@
+import json
+import threading
+from unittest import mock
+
+import pytest
+
+import event_publisher
+import handler
+from event_publisher import BufferedEventPublisher, send_events
+
+
+class FakeSQS:
+    """Records SendMessageBatch calls and fails the entries of the given job_ids"""
+
+    def __init__(self, failing_job_ids=()):
+        self.failing_job_ids = set(failing_job_ids)
+        self.batches = []
+        self.queue_url_lookups = 0
+
+    def get_queue_url(self, QueueName):
+        self.queue_url_lookups += 1
+        return {'QueueUrl': f'http://sqs/{QueueName}'}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.batches.append(Entries)
+        return {'Failed': [
+            {'Id': entry['Id'], 'Message': 'throttled'}
+            for entry in Entries if json.loads(entry['MessageBody'])['job_id'] in self.failing_job_ids
+        ]}
+
+
+@pytest.fixture
+def sqs():
+    fake = FakeSQS()
+    with mock.patch.object(event_publisher, 'sqs', fake), mock.patch.object(event_publisher, '_queue_url', None):
+        yield fake
+
+
+def events_for(job_id, count=2):
+    return [{'event_type': 'external_data_update', 'job_id': job_id, 'n': n} for n in range(count)]
+
+
+def test_send_events_batches_by_ten_and_returns_failed_events(sqs):
+    sqs.failing_job_ids = {'job-bad'}
+    events = events_for('job-ok', 21) + events_for('job-bad', 2)
+    failed = send_events(events)
+    assert [len(batch) for batch in sqs.batches] == [10, 10, 3]
+    assert failed == events[21:]
+    assert sqs.queue_url_lookups == 1
+
+
+def test_buffered_publishers_share_a_batch(sqs):
+    publisher = BufferedEventPublisher(max_delay_seconds=5)
+    results = {}
+    threads = [
+        threading.Thread(target=lambda job_id=job_id: results.update({job_id: publisher.publish(events_for(job_id, 5))}))
+        for job_id in ('job-1', 'job-2')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    # The second publisher filled the batch and sent it without waiting for the timer
+    assert [len(batch) for batch in sqs.batches] == [10]
+    assert results == {'job-1': True, 'job-2': True}
+
+
+def test_buffered_publish_reports_only_its_own_failed_events(sqs):
+    sqs.failing_job_ids = {'job-2'}
+    publisher = BufferedEventPublisher(max_delay_seconds=5)
+    results = {}
+    threads = [
+        threading.Thread(target=lambda job_id=job_id: results.update({job_id: publisher.publish(events_for(job_id, 5))}))
+        for job_id in ('job-1', 'job-2')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == {'job-1': True, 'job-2': False}
+
+
+def test_buffered_publish_is_sent_after_max_delay(sqs):
+    publisher = BufferedEventPublisher(max_delay_seconds=0.01)
+    assert publisher.publish(events_for('job-1')) is True
+    assert [len(batch) for batch in sqs.batches] == [2]
+
+
+def test_buffered_publish_fails_when_the_send_raises(sqs):
+    publisher = BufferedEventPublisher(max_delay_seconds=0.01)
+    with mock.patch.object(event_publisher, 'send_events', side_effect=RuntimeError('SQS unavailable')):
+        assert publisher.publish(events_for('job-1')) is False
+
+
+def test_external_events_use_the_shared_batch_only_when_buffering(sqs):
+    with mock.patch.object(handler.buffered_publisher, 'publish', return_value=True) as publish:
+        token = handler.buffer_events.set(True)
+        try:
+            assert handler.publish_external_events('job-1', 'uploads/job-1/w2.pdf', {'ein': '1'})
+        finally:
+            handler.buffer_events.reset(token)
+        publish.assert_called_once()
+
+        assert handler.publish_external_events('job-2', 'uploads/job-2/w2.pdf', {'ein': '1'}, include_upload=False)
+        publish.assert_called_once()
+    assert [entry['Id'] for entry in sqs.batches[0]] == ['0']
+
+
+def test_lambda_handler_never_buffers():
+    seen = []
+    token = handler.buffer_events.set(True)
+    try:
+        with mock.patch.object(handler, 'route_event',
+                               side_effect=lambda event, event_type: seen.append(handler.buffer_events.get())):
+            handler.lambda_handler({'event_type': 'external_upload', 'job_id': 'job-1'}, None)
+        assert seen == [False]
+        assert handler.buffer_events.get() is True
+    finally:
+        handler.buffer_events.reset(token)
+
+
+def test_failed_publish_is_reported(sqs):
+    sqs.failing_job_ids = {'job-1'}
+    assert handler.publish_external_events('job-1', 'uploads/job-1/w2.pdf', {'ein': '1'}) is False
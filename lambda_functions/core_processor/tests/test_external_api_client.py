@@ -0,0 +1,149 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+import external_api_client
+from external_api_client import CannedResponse, SecretCache
+
+
+class Fetcher:
+    """Secret source returning key-1, key-2, ... and optionally failing or blocking"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.release = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('Secrets Manager unavailable')
+        return f'key-{self.calls}'
+
+
+@pytest.fixture
+def fetch():
+    return Fetcher()
+
+
+def wait_for_refresh(cache):
+    deadline = time.monotonic() + 5
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_fresh_value_is_served_from_memory(fetch):
+    cache = SecretCache(fetch, ttl=300, max_stale=3600)
+    assert [cache.get() for _ in range(3)] == ['key-1'] * 3
+    assert fetch.calls == 1
+    assert (cache.stats['misses'], cache.stats['hits']) == (1, 2)
+
+
+def test_refresh_point_is_jittered_before_expiry(fetch):
+    cache = SecretCache(fetch, ttl=100, max_stale=0)
+    cache.get()
+    remaining = cache._expires_at - time.monotonic()
+    until_refresh = cache._refresh_at - time.monotonic()
+    assert 74 < until_refresh <= 90 < remaining <= 100
+
+
+def test_past_refresh_point_serves_cached_value_while_one_background_refresh_runs(fetch):
+    cache = SecretCache(fetch, ttl=300, max_stale=3600)
+    cache.get()
+    cache._refresh_at = 0
+    fetch.release = threading.Event()
+
+    threads = [threading.Thread(target=cache.get) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every caller got the cached value without waiting on the blocked fetch
+    assert cache.stats['hits'] == 20
+    fetch.release.set()
+    wait_for_refresh(cache)
+
+    assert fetch.calls == 2
+    assert cache.get() == 'key-2'
+
+
+def test_expired_value_is_refreshed_synchronously(fetch):
+    cache = SecretCache(fetch, ttl=300, max_stale=3600)
+    cache.get()
+    cache._expires_at = time.monotonic() - 1
+    assert cache.get() == 'key-2'
+    assert cache.stats['misses'] == 2
+
+
+def test_stale_value_is_served_until_max_stale_after_failed_refresh(fetch):
+    cache = SecretCache(fetch, ttl=300, max_stale=60)
+    cache.get()
+    fetch.fail = True
+
+    cache._expires_at = time.monotonic() - 30
+    assert cache.get() == 'key-1'
+    assert cache.stats['stale_served'] == 1
+
+    cache._expires_at = time.monotonic() - 90
+    assert cache.get() is None
+    assert cache.stats['refresh_failures'] == 2
+
+
+def test_force_refresh_bypasses_the_cache(fetch):
+    cache = SecretCache(fetch, ttl=300, max_stale=3600)
+    cache.get()
+    assert cache.get(force_refresh=True) == 'key-2'
+
+
+def test_401_refreshes_the_api_key_and_retries_once():
+    responses = [CannedResponse({}, 401), CannedResponse({'file_id': 'f-1'}, 201)]
+    sent_keys = []
+
+    def post(url, headers, **kwargs):
+        sent_keys.append(headers['Authorization'])
+        return responses[len(sent_keys) - 1]
+
+    with mock.patch.object(external_api_client, '_post', side_effect=post), \
+            mock.patch.object(external_api_client, 'get_api_key', return_value='new-key') as get_api_key:
+        response = external_api_client.post_with_api_key('http://api/upload', {'job_id': 'j'}, 'old-key')
+
+    assert response.status_code == 201
+    get_api_key.assert_called_once_with(force_refresh=True)
+    assert sent_keys == ['Bearer old-key', 'Bearer new-key']
+
+
+def test_401_is_returned_when_the_refreshed_key_is_unchanged():
+    with mock.patch.object(external_api_client, '_post', return_value=CannedResponse({}, 401)) as post, \
+            mock.patch.object(external_api_client, 'get_api_key', return_value='old-key'):
+        response = external_api_client.post_with_api_key('http://api/upload', {}, 'old-key')
+    assert response.status_code == 401
+    assert post.call_count == 1
+
+
+def test_canned_response_is_local_to_the_thread():
+    seen = {}
+    with external_api_client.mock_external_api({'file_id': 'mocked'}):
+        worker = threading.Thread(target=lambda: seen.update(
+            response=getattr(external_api_client._mock_state, 'response', None)))
+        worker.start()
+        worker.join()
+        assert external_api_client._post('http://api').json() == {'file_id': 'mocked'}
+    assert seen['response'] is None
+    assert getattr(external_api_client._mock_state, 'response', None) is None
+
+
+def test_bulk_data_update_reports_records_missing_from_the_response():
+    response = CannedResponse({'results': [{'job_id': 'job-1', 'success': True, 'report_id': 'r-1'}]}, 200)
+    with mock.patch.object(external_api_client, 'EXTERNAL_API_MOCK', False), \
+            mock.patch.object(external_api_client, 'get_api_key', return_value='key'), \
+            mock.patch.object(external_api_client, '_post', return_value=response):
+        result = external_api_client.call_external_bulk_data_update_api([
+            {'job_id': 'job-1', 'w2_data': {}}, {'job_id': 'job-2', 'w2_data': {}}
+        ])
+    assert result['success']
+    assert result['results']['job-1']['report_id'] == 'r-1'
+    assert result['results']['job-2'] == {'success': False, 'error': 'No result returned for record'}
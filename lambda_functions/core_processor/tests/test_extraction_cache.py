@@ -0,0 +1,121 @@
+import io
+import json
+import time
+from unittest import mock
+
+import pytest
+
+import extraction_cache
+from extraction_cache import ExtractionCache
+
+
+class NoSuchKey(Exception):
+    response = {'Error': {'Code': 'NoSuchKey'}}
+
+
+class FakeS3:
+    """In-memory bucket recording every put_object call"""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = []
+        self.gets = 0
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.puts.append(dict(kwargs, Bucket=Bucket, Key=Key))
+        self.objects[(Bucket, Key)] = Body
+
+
+@pytest.fixture
+def s3():
+    fake = FakeS3()
+    with mock.patch.object(extraction_cache, 's3', fake):
+        yield fake
+
+
+def new_cache(ttl=60, max_entries=2, kms_key_id=None):
+    return ExtractionCache('bucket', 'cache/', ttl, max_entries, kms_key_id)
+
+
+def test_miss_then_memory_hit(s3):
+    cache = new_cache()
+    assert cache.get('abc') is None
+
+    assert cache.put('abc', w2_data={'employee_ssn': '123-45-6789'})
+    assert cache.get('abc')['w2_data'] == {'employee_ssn': '123-45-6789'}
+    assert s3.gets == 2  # the miss and the put's read; the hit came from memory
+    assert cache.get_stats()['memory_hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_hit_from_s3_in_a_new_container(s3):
+    new_cache().put('abc', w2_data={'wages': '100.00'})
+
+    cache = new_cache()
+    assert cache.get('abc')['w2_data'] == {'wages': '100.00'}
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['memory_hits'] == 0
+
+
+def test_expired_entries_are_misses(s3):
+    s3.objects[('bucket', 'cache/abc.json')] = json.dumps({'cached_at': time.time() - 120}).encode()
+
+    cache = new_cache(ttl=60)
+    assert cache.get('abc') is None
+    assert cache.get_stats()['expired'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_expired_memory_entries_are_reread(s3):
+    cache = new_cache(ttl=60)
+    cache.put('abc', w2_data={})
+    with mock.patch.object(extraction_cache.time, 'time', return_value=time.time() + 120):
+        assert cache.get('abc') is None
+    assert cache.get_stats()['expired'] == 1
+
+
+def test_lru_evicts_beyond_max_entries(s3):
+    cache = new_cache(max_entries=2)
+    for content_hash in ('a', 'b', 'c'):
+        cache.put(content_hash, w2_data={})
+
+    gets = s3.gets
+    cache.get('c')
+    cache.get('b')
+    assert s3.gets == gets
+    cache.get('a')
+    assert s3.gets == gets + 1
+
+
+def test_put_merges_fields_and_keeps_cached_at(s3):
+    cache = new_cache()
+    cache.put('abc', w2_data={'wages': '1'})
+    cached_at = cache.get('abc')['cached_at']
+    cache.put('abc', file_id='f-1')
+
+    stored = json.loads(s3.objects[('bucket', 'cache/abc.json')])
+    assert stored == {'w2_data': {'wages': '1'}, 'file_id': 'f-1', 'cached_at': cached_at}
+
+
+def test_entries_are_written_with_sse_kms(s3):
+    new_cache().put('a', w2_data={})
+    new_cache(kms_key_id='alias/w2-cache').put('b', w2_data={})
+
+    assert s3.puts[0]['ServerSideEncryption'] == 'aws:kms'
+    assert 'SSEKMSKeyId' not in s3.puts[0]
+    assert s3.puts[1]['ServerSideEncryption'] == 'aws:kms'
+    assert s3.puts[1]['SSEKMSKeyId'] == 'alias/w2-cache'
+
+
+def test_s3_errors_are_counted_not_raised(s3):
+    cache = new_cache()
+    with mock.patch.object(s3, 'get_object', side_effect=RuntimeError('timeout')):
+        assert cache.get('abc') is None
+        assert cache.put('abc', w2_data={}) is False
+    assert cache.get_stats()['errors'] == 2
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+
+import handler
+
+W2_DATA = {'ein': '12-3456789', 'ssn': '123-45-6789', 'wages_box1': '54000.00', 'federal_tax_withheld_box2': '6480.00'}
+S3_UPLOAD = {'event_type': 's3_upload', 'object_key': 'uploads/job-1/w2.pdf', 'timestamp': '2025-01-01T00:00:00Z'}
+
+
+@pytest.fixture
+def calls():
+    """Order of job PATCHes and event publishes made by the handler"""
+    calls = []
+    with mock.patch.object(handler, 'process_w2_file', return_value=dict(W2_DATA)), \
+            mock.patch.object(handler, 'update_job', side_effect=lambda job_id, updates: calls.append(('patch', dict(updates))) or True):
+        yield calls
+
+
+def test_s3_upload_publishes_events_before_marking_success(calls):
+    with mock.patch.object(handler, 'publish_external_events',
+                           side_effect=lambda *args, **kwargs: calls.append(('publish', args[0])) or True):
+        result = handler.handle_s3_upload(dict(S3_UPLOAD))
+
+    assert result['statusCode'] == 200
+    assert [kind for kind, _ in calls] == ['publish', 'patch']
+    final = calls[-1][1]
+    assert (final['status'], final['w2_data_status'], final['file_uploaded']) == ('Success', 'success', True)
+    assert final['w2_data'] == W2_DATA
+    assert final['completed_at'] >= final['extraction_finished_at']
+
+
+def test_s3_upload_is_not_marked_success_when_publishing_fails(calls):
+    with mock.patch.object(handler, 'publish_external_events', return_value=False):
+        result = handler.handle_s3_upload(dict(S3_UPLOAD))
+
+    assert result['statusCode'] == 500
+    [(kind, final)] = calls
+    assert 'status' not in final and 'completed_at' not in final
+    assert (final['w2_data_status'], final['progress']) == ('failed', 'failed')
+    assert final['w2_data'] == W2_DATA
+
+
+def test_async_s3_upload_completes_after_the_external_calls(calls):
+    def external_call(name):
+        def call(*args):
+            finished_at = handler.timestamp_now()
+            calls.append((name, finished_at))
+            return {'success': True, 'finished_at': finished_at}
+        return call
+
+    with mock.patch.object(handler, 'upload_external_document', side_effect=external_call('upload')), \
+            mock.patch.object(handler, 'update_external_data', side_effect=external_call('data_update')), \
+            mock.patch.object(handler, 'report_progress'), \
+            mock.patch.object(handler, 'publish_external_events') as publish:
+        result = asyncio.run(handler.handle_s3_upload_async(dict(S3_UPLOAD)))
+
+    assert result['statusCode'] == 200
+    publish.assert_not_called()
+    final = calls[-1][1]
+    assert (final['status'], final['external_upload'], final['external_data_update']) == ('Success', True, True)
+    assert final['completed_at'] >= max(final['external_upload_at'], final['data_update_at'])
+    assert final['external_upload_at'] >= final['extraction_finished_at']
+
+
+def test_s3_upload_rejects_keys_without_a_job_id(calls):
+    result = handler.handle_s3_upload({'event_type': 's3_upload', 'object_key': 'w2.pdf'})
+    assert result['statusCode'] == 400
+    assert calls == []
+
+
+def test_extraction_failure_is_recorded_and_retried(calls):
+    with mock.patch.object(handler, 'process_w2_file', side_effect=ValueError('corrupt PDF')):
+        result = handler.handle_s3_upload(dict(S3_UPLOAD))
+    assert result['statusCode'] == 500
+    assert calls[-1][1]['w2_data_status'] == 'failed'
+    assert 'corrupt PDF' in json.loads(result['body'])
+
+
+def data_update_event(job_id, w2_data=W2_DATA):
+    return {'event_type': 'external_data_update', 'job_id': job_id, 'w2_data': w2_data}
+
+
+def bulk_api(failing_job_ids=()):
+    """Stand-in for call_external_bulk_data_update_api that rejects the given jobs"""
+    chunks = []
+
+    def call(records):
+        chunks.append([record['job_id'] for record in records])
+        return {'success': True, 'results': {
+            record['job_id']: {'success': record['job_id'] not in failing_job_ids, 'error': 'rejected'}
+            for record in records
+        }}
+    return call, chunks
+
+
+def run_batch(events, api, db_results=None):
+    sent = []
+
+    def bulk_update_jobs(job_updates):
+        sent.extend(job_updates)
+        if db_results is not None:
+            return db_results(job_updates)
+        return [{'job_id': update['job_id'], 'success': True} for update in job_updates]
+
+    with mock.patch.object(handler, 'EXTERNAL_BULK_MAX_RECORDS', 2), \
+            mock.patch.object(handler, 'call_external_bulk_data_update_api', side_effect=api), \
+            mock.patch.object(handler, 'bulk_update_jobs', side_effect=bulk_update_jobs):
+        result = handler.handle_external_data_update_batch({'event_type': 'external_data_update_batch', 'events': events})
+    assert result['statusCode'] == 200
+    return json.loads(result['body'])['failed_job_ids'], {update['job_id']: update for update in sent}
+
+
+def test_data_update_batch_is_chunked_and_written_back_per_record():
+    api, chunks = bulk_api(failing_job_ids={'job-2'})
+    failed, updates = run_batch([data_update_event(f'job-{n}') for n in range(1, 6)], api)
+
+    assert chunks == [['job-1', 'job-2'], ['job-3', 'job-4'], ['job-5']]
+    assert failed == ['job-2']
+    assert updates['job-1']['external_data_update'] is True
+    assert updates['job-1']['w2_data_status'] == 'success'
+    assert 'external_data_update' not in updates['job-2']
+    assert updates['job-2']['w2_data_status'] == 'failed'
+
+
+def test_data_update_batch_fails_invalid_and_unwritten_records():
+    api, chunks = bulk_api()
+    events = [data_update_event('job-1'), data_update_event('job-2', w2_data=None),
+              data_update_event('job-3'), data_update_event('job-4')]
+
+    def db_results(job_updates):
+        # The backend rejects job-3, and the second chunk's request fails
+        if job_updates[0]['job_id'] == 'job-4':
+            return None
+        return [{'job_id': update['job_id'], 'success': update['job_id'] != 'job-3'} for update in job_updates]
+
+    failed, _ = run_batch(events, api, db_results)
+    assert chunks == [['job-1', 'job-3'], ['job-4']]
+    assert sorted(failed) == ['job-2', 'job-3', 'job-4']
+
+
+def test_data_update_batch_fails_every_record_of_a_failed_request():
+    failed, updates = run_batch([data_update_event('job-1'), data_update_event('job-2')],
+                                lambda records: {'success': False, 'error': 'timeout'})
+    assert failed == ['job-1', 'job-2']
+    assert all(update['w2_data_status'] == 'failed' for update in updates.values())
@@ -0,0 +1,37 @@
+import importlib
+import json
+
+import pytest
+
+import stage_metrics
+
+
+@pytest.fixture
+def reload_stage_metrics(monkeypatch):
+    """Re-import stage_metrics under the given environment, restoring it afterwards"""
+    def reload(**environ):
+        for name in ('AWS_LAMBDA_FUNCTION_NAME', 'STAGE_METRICS_ENABLED'):
+            monkeypatch.delenv(name, raising=False)
+        for name, value in environ.items():
+            monkeypatch.setenv(name, value)
+        return importlib.reload(stage_metrics)
+    yield reload
+    monkeypatch.undo()
+    importlib.reload(stage_metrics)
+
+
+@pytest.mark.parametrize('environ, enabled', [
+    ({}, False),
+    ({'AWS_LAMBDA_FUNCTION_NAME': 'core-processor'}, True),
+    ({'AWS_LAMBDA_FUNCTION_NAME': 'core-processor', 'STAGE_METRICS_ENABLED': 'false'}, False),
+    ({'STAGE_METRICS_ENABLED': 'true'}, True),
+])
+def test_metrics_default_to_lambda_only(reload_stage_metrics, capsys, environ, enabled):
+    metrics = reload_stage_metrics(**environ)
+    metrics.emit_stage('extract', 12.5, job_id='job-1')
+
+    output = capsys.readouterr().out
+    assert bool(output) == enabled
+    if enabled:
+        record = json.loads(output)
+        assert (record['Stage'], record['Duration'], record['job_id']) == ('extract', 12.5, 'job-1')
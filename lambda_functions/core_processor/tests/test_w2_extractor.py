@@ -0,0 +1,177 @@
+import hashlib
+import io
+import os
+import tempfile
+from unittest import mock
+
+import pytest
+
+import w2_extractor
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'test_plan', 'test-w2-document.pdf')
+
+
+def empty_w2_data():
+    return {"ein": None, "ssn": None, "wages_box1": None, "federal_tax_withheld_box2": None}
+
+
+def match_text(text):
+    w2_data = empty_w2_data()
+    w2_extractor._match_text(text, w2_data)
+    return w2_data
+
+
+def test_text_fields_are_matched_independently():
+    assert match_text("EIN 12-3456789 SSN 123-45-6789 1 54,000.00 2 6,480.00") == {
+        "ein": "12-3456789", "ssn": "123-45-6789",
+        "wages_box1": "54,000.00", "federal_tax_withheld_box2": "6,480.00",
+    }
+
+
+def test_field_overlapping_an_earlier_match_is_still_found():
+    # The wages pattern matches "1 123" inside the SSN
+    assert match_text("1 123-45-6789 ...")["ssn"] == "123-45-6789"
+
+
+def test_wages_may_follow_the_ein():
+    # The wages pattern matches the EIN's last digit followed by the amount
+    w2_data = match_text("Employer EIN 12-3456781 50,000.00 2 5,000.00")
+    assert w2_data["ein"] == "12-3456781"
+    assert w2_data["wages_box1"] == "50,000.00"
+    assert w2_data["federal_tax_withheld_box2"] == "5,000.00"
+
+
+def test_first_occurrence_wins_and_resolved_fields_are_kept():
+    w2_data = empty_w2_data()
+    w2_data["ein"] = "98-7654321"
+    w2_extractor._match_text("12-3456789 11-1111111 123-45-6789 999-99-9999", w2_data)
+    assert w2_data["ein"] == "98-7654321"
+    assert w2_data["ssn"] == "123-45-6789"
+
+
+def test_form_fields_last_value_wins():
+    w2_data = empty_w2_data()
+    w2_extractor._match_form_fields({
+        "Copy1[0].f2_01[0]": "11-1111111",
+        "Copy1[0].f2_09[0]": "100.00",
+        "Copy2[0].f2_01[0]": "22-2222222",
+        "Copy2[0].f2_02[0]": "None",
+        "Copy2[0].f2_10[0]": "",
+    }, w2_data)
+    assert w2_data == {"ein": "22-2222222", "ssn": None, "wages_box1": "100.00", "federal_tax_withheld_box2": None}
+
+
+def fake_reader(page_texts, form_fields=None):
+    reader = mock.Mock()
+    reader.get_form_text_fields.return_value = form_fields
+    reader.pages = [mock.Mock(**{"extract_text.return_value": text}) for text in page_texts]
+    return reader
+
+
+def test_text_fallback_stops_once_all_fields_are_found():
+    reader = fake_reader(["12-3456789 123-45-6789", "1 54,000.00 2 6,480.00", "11-1111111"])
+    timings = {}
+    with mock.patch("PyPDF2.PdfReader", return_value=reader):
+        w2_data = w2_extractor.extract_w2_data_from_pdf("w2.pdf", timings)
+    assert w2_data["ein"] == "12-3456789"
+    assert w2_data["federal_tax_withheld_box2"] == "6,480.00"
+    assert timings["pages_scanned"] == 2
+    reader.pages[2].extract_text.assert_not_called()
+
+
+def test_form_fields_skip_the_text_fallback():
+    reader = fake_reader(["1 54,000.00"], form_fields={"f2_01[0]": "12-3456789"})
+    with mock.patch("PyPDF2.PdfReader", return_value=reader):
+        w2_data = w2_extractor.extract_w2_data_from_pdf("w2.pdf")
+    assert w2_data == {"ein": "12-3456789", "ssn": None, "wages_box1": None, "federal_tax_withheld_box2": None}
+    reader.pages[0].extract_text.assert_not_called()
+
+
+def test_unreadable_pdf_yields_empty_fields():
+    with mock.patch("PyPDF2.PdfReader", side_effect=ValueError("not a PDF")):
+        assert w2_extractor.extract_w2_data_from_pdf("w2.pdf") == empty_w2_data()
+
+
+@pytest.mark.skipif(not os.path.exists(SAMPLE_PDF), reason="sample W-2 not present")
+def test_sample_acroform_w2():
+    assert w2_extractor.extract_w2_data_from_pdf(SAMPLE_PDF) == {
+        "ein": "54354354354", "ssn": "1324243243",
+        "wages_box1": "156000.00", "federal_tax_withheld_box2": "26958.50",
+    }
+
+
+class FakeBody:
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+        self.closed = False
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return self._stream.read(size)
+
+    def close(self):
+        self.closed = True
+
+
+def s3_returning(data, content_length):
+    body = FakeBody(data)
+    response = {'Body': body}
+    if content_length is not None:
+        response['ContentLength'] = content_length
+    s3 = mock.Mock(**{'get_object.return_value': response})
+    return s3, body
+
+
+@pytest.mark.parametrize('content_length, max_in_memory_bytes, spooled', [
+    (64, 128, False),
+    (64, 32, True),
+    (None, 128, True),
+])
+def test_download_pdf_spools_large_and_unknown_length_objects(content_length, max_in_memory_bytes, spooled):
+    data = b'%PDF-1.4 ' + b'x' * 55
+    s3, body = s3_returning(data, content_length)
+    digest = hashlib.sha256()
+    with mock.patch.object(w2_extractor, 's3', s3):
+        pdf_stream = w2_extractor.download_pdf('uploads/job/w2.pdf', max_in_memory_bytes=max_in_memory_bytes, digest=digest)
+    with pdf_stream:
+        assert pdf_stream.read() == data
+        assert isinstance(pdf_stream, tempfile.SpooledTemporaryFile) == spooled
+    # Spooled downloads read bounded chunks, never the whole body at once
+    assert (-1 in body.reads) != spooled
+    assert body.closed
+    assert digest.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def fake_downloads(sample_bytes):
+    def download(object_key):
+        if 'missing' in object_key:
+            raise RuntimeError(f'NoSuchKey: {object_key}')
+        return sample_bytes if 'w2' in object_key else b'not a pdf'
+    return download
+
+
+@pytest.mark.parametrize('use_process_pool', [False, True])
+def test_extract_many_keeps_input_order_and_reports_download_errors(use_process_pool):
+    with open(SAMPLE_PDF, 'rb') as f:
+        sample_bytes = f.read()
+    object_keys = ['uploads/a/w2.pdf', 'uploads/b/missing.pdf', 'uploads/c/other.pdf', 'uploads/d/w2.pdf']
+
+    with mock.patch.object(w2_extractor, '_download_pdf_bytes', fake_downloads(sample_bytes)), \
+            mock.patch.object(w2_extractor, 'get_process_pool', return_value=None) as get_process_pool:
+        if use_process_pool:
+            # A thread pool stands in for the process pool so the patched download is used
+            with w2_extractor.ThreadPoolExecutor(max_workers=2) as pool:
+                results = w2_extractor.extract_many(object_keys, pool=pool)
+            get_process_pool.assert_not_called()
+        else:
+            results = w2_extractor.extract_many(object_keys)
+            get_process_pool.assert_called_once()
+
+    assert [result['object_key'] for result in results] == object_keys
+    assert 'NoSuchKey' in results[1]['error']
+    assert 'w2_data' not in results[1]
+    for result in (results[0], results[3]):
+        assert result['w2_data']['ssn'] == '1324243243'
+        assert 'parse_ms' in result['timings']
+    assert results[2]['w2_data']['ssn'] is None
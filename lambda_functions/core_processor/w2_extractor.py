@@ -1,102 +1,314 @@
+import hashlib
+import io
 import logging
 import json
+import multiprocessing
 import re
-import boto3
+import shutil
 import tempfile
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from decimal import Decimal
-from PyPDF2 import PdfReader
+from aws_clients import get_client
+from extraction_cache import EXTRACTION_CACHE_ENABLED, extraction_cache
+from stage_metrics import stage_span
 
 logger = logging.getLogger()
 
-# Initialize S3 client
-s3 = boto3.client('s3', endpoint_url='http://localstack:4566', region_name='us-east-1')
+# S3 client, created on first download. Assign a stand-in here to replace it.
+s3 = None
 
-def extract_w2_data(object_key):
+def s3_client():
+    return s3 if s3 is not None else get_client('s3')
+
+W2_BUCKET = 'w2-bucket'
+
+# PDFs up to this size are parsed straight from memory; larger ones are spooled to /tmp
+MAX_IN_MEMORY_PDF_BYTES = int(os.environ.get('W2_MAX_IN_MEMORY_PDF_BYTES', 10 * 1024 * 1024))
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+def download_pdf(object_key, max_in_memory_bytes=None, digest=None):
+    """
+    Download a PDF from S3 into a seekable binary stream
+    Small objects are read into an in-memory buffer, larger ones, and those of
+    unknown length, are copied chunk by chunk into a spooled temporary file that
+    rolls over to disk.
+    If a hashlib object is passed as digest, it is fed the content as it streams.
+    The caller owns the returned stream and should close it.
+    """
+    if max_in_memory_bytes is None:
+        max_in_memory_bytes = MAX_IN_MEMORY_PDF_BYTES
+
+    response = s3_client().get_object(Bucket=W2_BUCKET, Key=object_key)
+    body = response['Body']
+    size = response.get('ContentLength')
+    in_memory = size is not None and size <= max_in_memory_bytes
+
+    try:
+        if in_memory:
+            data = body.read()
+            if digest is not None:
+                digest.update(data)
+            pdf_stream = io.BytesIO(data)
+        else:
+            pdf_stream = tempfile.SpooledTemporaryFile(max_size=max_in_memory_bytes, suffix='.pdf')
+            if digest is None:
+                shutil.copyfileobj(body, pdf_stream, DOWNLOAD_CHUNK_BYTES)
+            else:
+                for chunk in iter(lambda: body.read(DOWNLOAD_CHUNK_BYTES), b''):
+                    digest.update(chunk)
+                    pdf_stream.write(chunk)
+            pdf_stream.seek(0)
+    finally:
+        body.close()
+
+    logger.info(f"Downloaded {object_key} ({size} bytes, {'memory' if in_memory else 'spooled'})")
+    return pdf_stream
+
+def convert_monetary_fields(w2_data):
+    """Convert string values to Decimal for monetary fields, in place"""
+    if w2_data.get('wages_box1'):
+        w2_data['wages_box1'] = Decimal(str(w2_data['wages_box1']))
+    if w2_data.get('federal_tax_withheld_box2'):
+        w2_data['federal_tax_withheld_box2'] = Decimal(str(w2_data['federal_tax_withheld_box2']))
+    return w2_data
+
+def extract_w2_data(object_key, cache_info=None):
     """
     Extract W2 data from S3 object using PyPDF2
-    Downloads PDF from S3, extracts data, and returns structured results
+    Streams PDF from S3, extracts data, and returns structured results
+    The SHA-256 of the content is looked up in the extraction cache first when
+    EXTRACTION_CACHE_ENABLED is set. If a dict is passed as cache_info, it is
+    filled with content_hash, cache_hit and the cached external_file_id, if any.
     """
     logger.info(f"Extracting W2 data from {object_key}")
     
     w2_data = {"ein": None, "ssn": None, "wages_box1": None, "federal_tax_withheld_box2": None}
+    if cache_info is None:
+        cache_info = {}
     
     try:
-        # Download PDF from S3 to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            s3.download_file('w2-bucket', object_key, temp_file.name)
-            temp_pdf_path = temp_file.name
-        
-        try:
-            # Extract data from PDF
-            w2_data = extract_w2_data_from_pdf(temp_pdf_path)
-            
-            # Convert string values to Decimal for monetary fields
-            if w2_data.get('wages_box1'):
-                w2_data['wages_box1'] = Decimal(str(w2_data['wages_box1']))
-            if w2_data.get('federal_tax_withheld_box2'):
-                w2_data['federal_tax_withheld_box2'] = Decimal(str(w2_data['federal_tax_withheld_box2']))
+        digest = hashlib.sha256()
+        with stage_span('s3_download'):
+            pdf_stream = download_pdf(object_key, digest=digest)
+        with pdf_stream:
+            content_hash = digest.hexdigest()
+            cache_info.update({"content_hash": content_hash, "cache_hit": False, "external_file_id": None})
             
-            logger.info(f"Successfully extracted W2 data: {w2_data}")
-            return w2_data
+            cached = extraction_cache.get(content_hash) if EXTRACTION_CACHE_ENABLED else None
+            if cached and cached.get('w2_data'):
+                w2_data = dict(cached['w2_data'])
+                cache_info["cache_hit"] = True
+                cache_info["external_file_id"] = cached.get('external_file_id')
+                logger.info(f"♻️ Extraction cache hit for {object_key} ({content_hash[:12]})")
+            else:
+                # Extract data from PDF
+                timings = {}
+                with stage_span('pdf_extract') as span:
+                    w2_data = extract_w2_data_from_pdf(pdf_stream, timings)
+                    span["pages_scanned"] = timings["pages_scanned"]
+                    if not all(w2_data.values()):
+                        span["status"] = "error"
+                logger.info(f"⏱️ PDF extraction timings for {object_key}: {timings}")
+                
+                # Only complete results are cached; parse errors yield empty fields
+                if EXTRACTION_CACHE_ENABLED and all(w2_data.values()):
+                    extraction_cache.put(content_hash, w2_data=dict(w2_data), cached_at=time.time())
             
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_pdf_path)
+        # Convert string values to Decimal for monetary fields
+        convert_monetary_fields(w2_data)
+        
+        logger.info(f"Successfully extracted W2 data: {w2_data}")
+        return w2_data
             
     except Exception as e:
         logger.error(f"Error extracting W2 data from {object_key}: {str(e)}")
         # Re-raise exception to trigger SQS retry mechanism
         raise e
 
-def extract_w2_data_from_pdf(pdf_path: str) -> dict:
-    """Extract W-2 data from PDF using AcroForm fields or text parsing"""
+# AcroForm field name fragments -> W2 fields
+FORM_FIELD_MAP = {
+    "f2_01": "ein",                         # EIN
+    "f2_02": "ssn",                         # SSN
+    "f2_09": "wages_box1",                  # Wages Box 1
+    "f2_10": "federal_tax_withheld_box2",   # Federal Tax Withheld Box 2
+}
+
+# Text fallback patterns, compiled once per container. Each field is searched on
+# its own, so a field is found even where its text overlaps another field's match.
+W2_TEXT_PATTERNS = {
+    field: re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+    for field, pattern in {
+        "ein": r"(\d{2}-\d{7})",
+        "ssn": r"(\d{3}-\d{2}-\d{4})",
+        "wages_box1": r"1\s+(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)",
+        "federal_tax_withheld_box2": r"2\s+(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)",
+    }.items()
+}
+
+def _match_form_fields(form_fields, w2_data):
+    """
+    Fill unresolved W2 fields from AcroForm values, stopping once all are found
+    Fields are walked last to first, so when a field repeats (one per copy of a
+    multi-copy form) its last value wins.
+    """
+    for field_name, field_value in reversed(form_fields.items()):
+        if not field_value or field_value == "None":
+            continue
+        for fragment, field in FORM_FIELD_MAP.items():
+            if fragment in field_name:
+                if w2_data[field] is None:
+                    w2_data[field] = field_value
+                break
+        if all(w2_data.values()):
+            break
+
+def _match_text(text, w2_data):
+    """Fill unresolved W2 fields from text with the first match of each field's pattern"""
+    for field, pattern in W2_TEXT_PATTERNS.items():
+        if w2_data[field] is None:
+            match = pattern.search(text)
+            if match:
+                w2_data[field] = match.group(1)
+
+def extract_w2_data_from_pdf(pdf_source, timings=None) -> dict:
+    """
+    Extract W-2 data from PDF using AcroForm fields or text parsing
+
+    pdf_source may be a file path or a binary stream. The document is parsed
+    once; page text is extracted lazily and scanning stops as soon as all four
+    fields are resolved. If a dict is passed as timings, it is filled with the
+    per-phase durations in milliseconds and the number of pages scanned.
+    """
     w2_data = {"ein": None, "ssn": None, "wages_box1": None, "federal_tax_withheld_box2": None}
-    
+    if timings is None:
+        timings = {}
+    timings.update({"parse_ms": 0.0, "form_fields_ms": 0.0, "text_extract_ms": 0.0,
+                    "regex_ms": 0.0, "pages_scanned": 0})
+    started = time.perf_counter()
+
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PdfReader(file)
-            
-            # Try AcroForm fields first
-            if hasattr(pdf_reader, 'get_form_text_fields'):
-                form_fields = pdf_reader.get_form_text_fields()
-                for field_name, field_value in form_fields.items():
-                    if field_value and field_value != "None":
-                        if "f2_01" in field_name:  # EIN
-                            w2_data["ein"] = field_value
-                        elif "f2_02" in field_name:  # SSN
-                            w2_data["ssn"] = field_value
-                        elif "f2_09" in field_name:  # Wages Box 1
-                            w2_data["wages_box1"] = field_value
-                        elif "f2_10" in field_name:  # Federal Tax Withheld Box 2
-                            w2_data["federal_tax_withheld_box2"] = field_value
-                
-                # If we found data, return it
-                if any(w2_data.values()):
-                    return w2_data
-            
-            # Fallback to text parsing
-            text_content = ""
+        # Imported on first use: external events never parse PDFs
+        from PyPDF2 import PdfReader
+        phase_start = time.perf_counter()
+        pdf_reader = PdfReader(pdf_source)
+        timings["parse_ms"] = (time.perf_counter() - phase_start) * 1000
+
+        # Try AcroForm fields first
+        phase_start = time.perf_counter()
+        form_fields = pdf_reader.get_form_text_fields() or {}
+        _match_form_fields(form_fields, w2_data)
+        timings["form_fields_ms"] = (time.perf_counter() - phase_start) * 1000
+
+        # Fallback to text parsing, one page at a time, only if no form data was found
+        if not any(w2_data.values()):
             for page in pdf_reader.pages:
-                text_content += page.extract_text() + "\n"
-            
-            patterns = {
-                "ein": r"(\d{2}-\d{7})",
-                "ssn": r"(\d{3}-\d{2}-\d{4})",
-                "wages_box1": r"1\s+(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)",
-                "federal_tax_withheld_box2": r"2\s+(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)"
-            }
-            
-            for field, pattern in patterns.items():
-                match = re.search(pattern, text_content, re.IGNORECASE | re.MULTILINE)
-                if match:
-                    w2_data[field] = match.group(1)
-                    
+                phase_start = time.perf_counter()
+                page_text = page.extract_text() or ""
+                timings["text_extract_ms"] += (time.perf_counter() - phase_start) * 1000
+                timings["pages_scanned"] += 1
+
+                phase_start = time.perf_counter()
+                _match_text(page_text, w2_data)
+                timings["regex_ms"] += (time.perf_counter() - phase_start) * 1000
+
+                if all(w2_data.values()):
+                    break
+
     except Exception as e:
         logger.error(f"Error processing PDF: {e}")
-        
+
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
     return w2_data
 
+# Pooled extraction: S3 downloads overlap in threads while parsing, which is
+# pure-Python CPU work holding the GIL, is fanned out to worker processes.
+EXTRACT_DOWNLOAD_THREADS = int(os.environ.get('EXTRACT_DOWNLOAD_THREADS', 8))
+
+_process_pool = None
+
+def available_cpus():
+    """Number of vCPUs this process may run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+def get_process_pool():
+    """
+    Return the persistent extraction process pool, sized to the available vCPUs
+    Workers start from a forkserver rather than by forking this process: the pool
+    grows while download threads are running, and a forked child would inherit
+    locks those threads hold (logging, boto3, urllib3) in a locked state.
+    Returns None where worker processes cannot be started (e.g. AWS Lambda has no
+    /dev/shm for multiprocessing); callers then parse in threads instead.
+    """
+    global _process_pool
+    if _process_pool is None:
+        try:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=int(os.environ.get('EXTRACT_PROCESSES', available_cpus())),
+                mp_context=multiprocessing.get_context('forkserver')
+            )
+        except (OSError, NotImplementedError, ValueError) as e:
+            logger.warning(f"Process pool unavailable, parsing in threads: {str(e)}")
+            return None
+    return _process_pool
+
+def parse_pdf_bytes(data):
+    """Parse a PDF held in memory; runs in a worker process and returns (w2_data, timings)"""
+    timings = {}
+    w2_data = extract_w2_data_from_pdf(io.BytesIO(data), timings)
+    return w2_data, timings
+
+def _download_pdf_bytes(object_key):
+    with download_pdf(object_key) as pdf_stream:
+        return pdf_stream.read()
+
+def extract_many(object_keys, pool=None):
+    """
+    Extract W2 data from many S3 objects
+    Downloads run on a thread pool and each finished download is handed to the
+    process pool for parsing, so I/O and CPU work overlap. Returns one result per
+    key, in input order: {"object_key", "w2_data", "timings"} or {"object_key", "error"}.
+    """
+    if pool is None:
+        pool = get_process_pool()
+    results = [None] * len(object_keys)
+    
+    with ThreadPoolExecutor(max_workers=EXTRACT_DOWNLOAD_THREADS) as downloader:
+        download_futures = {
+            downloader.submit(_download_pdf_bytes, object_key): index
+            for index, object_key in enumerate(object_keys)
+        }
+        parse_futures = {}
+        for future in as_completed(download_futures):
+            index = download_futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                logger.error(f"Error downloading {object_keys[index]}: {str(e)}")
+                results[index] = {"object_key": object_keys[index], "error": str(e)}
+                continue
+            executor = pool if pool is not None else downloader
+            parse_futures[executor.submit(parse_pdf_bytes, data)] = index
+        
+        for future in as_completed(parse_futures):
+            index = parse_futures[future]
+            try:
+                w2_data, timings = future.result()
+            except Exception as e:
+                logger.error(f"Error extracting W2 data from {object_keys[index]}: {str(e)}")
+                results[index] = {"object_key": object_keys[index], "error": str(e)}
+                continue
+            results[index] = {
+                "object_key": object_keys[index],
+                "w2_data": convert_monetary_fields(w2_data),
+                "timings": timings
+            }
+    
+    return results
+
 def validate_w2_data(w2_data):
     """
     Validate extracted W2 data
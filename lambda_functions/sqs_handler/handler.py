@@ -1,98 +1,278 @@
 import json
 import boto3
+import importlib.util
 import logging
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from urllib.parse import unquote_plus
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Number of SQS records dispatched concurrently within one batch
+SQS_MAX_WORKERS = int(os.environ.get('SQS_MAX_WORKERS', 10))
+
+# How records reach the core processor:
+#   invoke    - one asynchronous core-processor Lambda invoke per event (default)
+#   inprocess - run the core processor's dispatch directly on the worker pool
+#   auto      - inprocess for batches up to SQS_INPROCESS_MAX_BATCH records, invoke above that
+SQS_DISPATCH_MODE = os.environ.get('SQS_DISPATCH_MODE', 'invoke').lower()
+SQS_INPROCESS_MAX_BATCH = int(os.environ.get('SQS_INPROCESS_MAX_BATCH', 10))
+
+# Group the external_data_update records of a batch into bulk external API calls,
+# at most SQS_BULK_MAX_RECORDS records per core processor event
+SQS_BULK_DATA_UPDATE = os.environ.get('SQS_BULK_DATA_UPDATE', 'false').lower() == 'true'
+SQS_BULK_MAX_RECORDS = int(os.environ.get('SQS_BULK_MAX_RECORDS', 100))
+
+def _default_core_processor_path():
+    """Core processor sources packaged next to this handler, or the sibling directory in the repo"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    packaged = os.path.join(here, 'core_processor')
+    return packaged if os.path.isdir(packaged) else os.path.join(here, '..', 'core_processor')
+
+CORE_PROCESSOR_PATH = os.environ.get('CORE_PROCESSOR_PATH', _default_core_processor_path())
+
+# Stage timing (stage_metrics) is shared with the core processor sources
+if os.path.abspath(CORE_PROCESSOR_PATH) not in sys.path:
+    sys.path.append(os.path.abspath(CORE_PROCESSOR_PATH))
+
+from stage_metrics import emit_stage, stage_span
+
+_core_processor = None
+_core_processor_lock = threading.Lock()
+
 # Initialize AWS clients
 lambda_client = boto3.client(
     'lambda',
     endpoint_url=os.environ.get('AWS_ENDPOINT_URL'),
     aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
     aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-    region_name=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1')
+    region_name=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'),
+    config=Config(max_pool_connections=SQS_MAX_WORKERS)
 )
 
-def lambda_handler(event, context):
+def build_core_processor_events(message_body):
+    """Turn one SQS message body into the core processor events it describes"""
+    # Check if this is an S3 event (has eventSource: aws:s3)
+    if 'Records' in message_body and len(message_body['Records']) > 0:
+        first_record = message_body['Records'][0]
+        if first_record.get('eventSource') == 'aws:s3':
+            # This is an S3 event - one core processor event per object
+            events = []
+            for s3_record in message_body.get('Records', []):
+                events.append({
+                    'event_type': 's3_upload',  # Add event_type for consistency
+                    'bucket_name': s3_record['s3']['bucket']['name'],
+                    'object_key': s3_record['s3']['object']['key'],
+                    'event_name': s3_record['eventName'],
+                    'timestamp': s3_record['eventTime']
+                })
+            return events
+
+    # This is an external event (wrapped or direct) - pass it directly to core processor
+    return [message_body]
+
+def event_job_id(core_processor_event):
+    """job_id of a core processor event, taken from "uploads/<job_id>/w2.pdf" for S3 events"""
+    if core_processor_event.get('job_id'):
+        return core_processor_event['job_id']
+    path_parts = unquote_plus(core_processor_event.get('object_key') or '').split('/')
+    return path_parts[1] if len(path_parts) >= 3 and path_parts[0] == 'uploads' else None
+
+def emit_queue_wait(record, job_id=None):
+    """Time a message spent in SQS, from its SentTimestamp attribute"""
+    attributes = record.get('attributes') or {}
+    if attributes.get('SentTimestamp'):
+        emit_stage(
+            'sqs_wait',
+            time.time() * 1000 - int(attributes['SentTimestamp']),
+            job_id=job_id,
+            receive_count=int(attributes.get('ApproximateReceiveCount', 1))
+        )
+
+def load_core_processor():
     """
-    SQS Handler Lambda function
-    Processes both S3 events and external events from SQS queue
+    Import the core processor handler once per container
+    Its module is also named handler, so it is loaded from CORE_PROCESSOR_PATH
+    under a distinct name; the directory is put on sys.path for its own imports.
     """
-    logger.info(f"Received event: {json.dumps(event)}")
-    
+    global _core_processor
+    if _core_processor is None:
+        with _core_processor_lock:
+            if _core_processor is None:
+                core_path = os.path.abspath(CORE_PROCESSOR_PATH)
+                if core_path not in sys.path:
+                    sys.path.append(core_path)
+                spec = importlib.util.spec_from_file_location('core_processor_handler', os.path.join(core_path, 'handler.py'))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _core_processor = module
+                logger.info(f"Loaded core processor from {core_path} for in-process dispatch")
+    return _core_processor
+
+def resolve_dispatch_mode(batch_size):
+    """Pick invoke or inprocess dispatch for a batch of the given size"""
+    if SQS_DISPATCH_MODE == 'auto':
+        return 'inprocess' if batch_size <= SQS_INPROCESS_MAX_BATCH else 'invoke'
+    if SQS_DISPATCH_MODE not in ('invoke', 'inprocess'):
+        logger.warning(f"Unknown SQS_DISPATCH_MODE: {SQS_DISPATCH_MODE}, defaulting to invoke")
+        return 'invoke'
+    return SQS_DISPATCH_MODE
+
+def run_core_processor(core_processor_event):
+    """
+    Run the core processor dispatch in this process
+    Server-side failures (5xx) raise, so the record is reported and SQS retries it.
+    Rejected events (4xx, e.g. an object key without a job_id or an event missing
+    fields) would fail the same way on every retry, so they are logged and the
+    message is deleted, as happens in invoke mode where results are never seen.
+    """
+    result = load_core_processor().dispatch_event(core_processor_event) or {}
+    status_code = result.get('statusCode', 200)
+
+    if status_code >= 500:
+        raise RuntimeError(f"core processor failed: {result.get('body')}")
+    if status_code >= 400:
+        logger.warning(
+            f"⚠️ Dropping {core_processor_event.get('event_type')} event rejected by the core processor "
+            f"({status_code}): {result.get('body')}; event: {json.dumps(core_processor_event)}"
+        )
+
+def invoke_core_processor(core_processor_event):
+    """Invoke core processor Lambda asynchronously"""
+    response = lambda_client.invoke(
+        FunctionName='core-processor',
+        InvocationType='Event',  # Asynchronous invocation
+        Payload=json.dumps(core_processor_event)
+    )
+
+    if response.get('StatusCode') != 202:
+        raise RuntimeError(f"core-processor invoke returned status {response.get('StatusCode')}")
+
+def process_record(record, dispatch_mode='invoke'):
+    """Dispatch every core processor event carried by one SQS record"""
+    message_body = json.loads(record['body'])
+
+    for core_processor_event in build_core_processor_events(message_body):
+        if core_processor_event.get('event_type') == 's3_upload':
+            logger.info(f"Processing S3 event: {core_processor_event['event_name']} for {core_processor_event['bucket_name']}/{core_processor_event['object_key']}")
+        else:
+            logger.info(f"Processing external event: {core_processor_event.get('event_type')} for job {core_processor_event.get('job_id')}")
+
+        job_id = event_job_id(core_processor_event)
+        emit_queue_wait(record, job_id)
+        with stage_span('sqs_dispatch', job_id, mode=dispatch_mode, event_type=core_processor_event.get('event_type')):
+            # Lets the core processor time the hand-off (invoke_wait)
+            core_processor_event['dispatched_at'] = int(time.time() * 1000)
+            if dispatch_mode == 'inprocess':
+                run_core_processor(core_processor_event)
+                logger.info(f"Processed {core_processor_event.get('event_type')} event in-process")
+            else:
+                invoke_core_processor(core_processor_event)
+                logger.info(f"Triggered core processor for {core_processor_event.get('event_type')} event")
+
+def process_record_safely(record, dispatch_mode='invoke'):
+    """Process one record and return its messageId if it failed, else None"""
     try:
-        # Process each record in the SQS event
-        for record in event.get('Records', []):
+        process_record(record, dispatch_mode)
+        return None
+    except Exception as e:
+        logger.error(f"Error processing SQS message {record.get('messageId')}: {str(e)}")
+        return record.get('messageId')
+
+def split_data_update_records(records):
+    """Separate external_data_update records (for bulk dispatch) from all other records"""
+    data_updates, other_records = [], []
+    for record in records:
+        try:
             message_body = json.loads(record['body'])
-            
-            # Check if this is an S3 event (has eventSource: aws:s3)
-            if 'Records' in message_body and len(message_body['Records']) > 0:
-                first_record = message_body['Records'][0]
-                if first_record.get('eventSource') == 'aws:s3':
-                    # This is an S3 event - process as before
-                    logger.info("Processing S3 event from AWS")
-                    
-                    # Extract S3 event records
-                    for s3_record in message_body.get('Records', []):
-                        bucket_name = s3_record['s3']['bucket']['name']
-                        object_key = s3_record['s3']['object']['key']
-                        event_name = s3_record['eventName']
-                        
-                        logger.info(f"Processing S3 event: {event_name} for {bucket_name}/{object_key}")
-                        
-                        # Create event for core processor
-                        core_processor_event = {
-                            'event_type': 's3_upload',  # Add event_type for consistency
-                            'bucket_name': bucket_name,
-                            'object_key': object_key,
-                            'event_name': event_name,
-                            'timestamp': s3_record['eventTime']
-                        }
-                        
-                        # Invoke core processor Lambda asynchronously
-                        response = lambda_client.invoke(
-                            FunctionName='core-processor',
-                            InvocationType='Event',  # Asynchronous invocation
-                            Payload=json.dumps(core_processor_event)
-                        )
-                        
-                        logger.info(f"Triggered core processor for S3 event: {object_key}")
-                else:
-                    # This is an external event - pass it directly to core processor
-                    logger.info(f"Processing external event: {message_body.get('event_type')} for job {message_body.get('job_id')}")
-                    
-                    # Invoke core processor Lambda asynchronously
-                    response = lambda_client.invoke(
-                        FunctionName='core-processor',
-                        InvocationType='Event',  # Asynchronous invocation
-                        Payload=json.dumps(message_body)
-                    )
-                    
-                    logger.info(f"Triggered core processor for external event: {message_body.get('event_type')}")
-            else:
-                # This is a direct external event (no Records wrapper)
-                logger.info(f"Processing direct external event: {message_body.get('event_type')} for job {message_body.get('job_id')}")
-                
-                # Invoke core processor Lambda asynchronously
-                response = lambda_client.invoke(
-                    FunctionName='core-processor',
-                    InvocationType='Event',  # Asynchronous invocation
-                    Payload=json.dumps(message_body)
-                )
-                
-                logger.info(f"Triggered core processor for direct external event: {message_body.get('event_type')}")
-                
-        return {
-            'statusCode': 200,
-            'body': json.dumps('SQS events processed successfully')
-        }
-        
+        except (KeyError, TypeError, ValueError):
+            # Left to the regular path, which reports it as a failed record
+            other_records.append(record)
+            continue
+
+        if isinstance(message_body, dict) and message_body.get('event_type') == 'external_data_update' and message_body.get('job_id'):
+            data_updates.append((record, message_body))
+        else:
+            other_records.append(record)
+    return data_updates, other_records
+
+def process_data_update_batch(data_updates, dispatch_mode='invoke'):
+    """Dispatch external_data_update records as one batch event and return the failed messageIds"""
+    batch_event = {
+        'event_type': 'external_data_update_batch',
+        'events': [message_body for _, message_body in data_updates]
+    }
+    all_message_ids = [record.get('messageId') for record, _ in data_updates]
+    for record, message_body in data_updates:
+        emit_queue_wait(record, message_body['job_id'])
+
+    try:
+        with stage_span('sqs_dispatch', mode=dispatch_mode, event_type='external_data_update_batch', records=len(data_updates)):
+            batch_event['dispatched_at'] = int(time.time() * 1000)
+            if dispatch_mode != 'inprocess':
+                invoke_core_processor(batch_event)
+                logger.info(f"Triggered core processor for external_data_update_batch of {len(data_updates)} records")
+                return []
+
+            result = load_core_processor().dispatch_event(batch_event) or {}
+            if result.get('statusCode', 200) >= 500:
+                raise RuntimeError(f"core processor failed: {result.get('body')}")
+
+        failed_job_ids = set(json.loads(result.get('body') or '{}').get('failed_job_ids', []))
+        logger.info(f"Processed external_data_update_batch of {len(data_updates)} records in-process, {len(failed_job_ids)} failed")
+        return [
+            record.get('messageId')
+            for record, message_body in data_updates
+            if message_body['job_id'] in failed_job_ids
+        ]
     except Exception as e:
-        logger.error(f"Error processing SQS event: {str(e)}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps(f'Error: {str(e)}')
-        }
+        logger.error(f"Error processing external_data_update_batch: {str(e)}")
+        return all_message_ids
+
+def lambda_handler(event, context):
+    """
+    SQS Handler Lambda function
+    Processes both S3 events and external events from SQS queue.
+    Records are dispatched concurrently, either by invoking the core processor
+    Lambda or by running it in-process (see SQS_DISPATCH_MODE); only the records that failed are
+    reported back in batchItemFailures so SQS redelivers just those.
+    """
+    logger.info(f"Received event: {json.dumps(event)}")
+
+    records = event.get('Records', [])
+    if not records:
+        return {'batchItemFailures': []}
+
+    dispatch_mode = resolve_dispatch_mode(len(records))
+
+    if SQS_BULK_DATA_UPDATE:
+        data_updates, other_records = split_data_update_records(records)
+    else:
+        data_updates, other_records = [], records
+
+    with ThreadPoolExecutor(max_workers=min(SQS_MAX_WORKERS, len(records))) as executor:
+        bulk_futures = [
+            executor.submit(process_data_update_batch, data_updates[start:start + SQS_BULK_MAX_RECORDS], dispatch_mode)
+            for start in range(0, len(data_updates), SQS_BULK_MAX_RECORDS)
+        ]
+        failed_message_ids = [
+            message_id
+            for message_id in executor.map(lambda record: process_record_safely(record, dispatch_mode), other_records)
+            if message_id is not None
+        ]
+        for future in bulk_futures:
+            failed_message_ids.extend(future.result())
+
+    logger.info(f"Processed {len(records)} SQS records ({dispatch_mode}), {len(failed_message_ids)} failed")
+
+    return {
+        'batchItemFailures': [
+            {'itemIdentifier': message_id} for message_id in failed_message_ids
+        ]
+    }
@@ -0,0 +1,19 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SQS_HANDLER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture(scope='session')
+def sqs_handler():
+    """The SQS handler module, loaded under its own name (the core processor's is also handler)"""
+    if 'sqs_handler' not in sys.modules:
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        spec = importlib.util.spec_from_file_location('sqs_handler', os.path.join(SQS_HANDLER_DIR, 'handler.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules['sqs_handler'] = module
+    return sys.modules['sqs_handler']
@@ -0,0 +1,146 @@
+import json
+from unittest import mock
+
+import pytest
+
+
+def sqs_record(message_id, body):
+    return {'messageId': message_id, 'body': body if isinstance(body, str) else json.dumps(body)}
+
+
+def s3_message(*job_ids):
+    return {'Records': [{
+        'eventSource': 'aws:s3',
+        'eventName': 'ObjectCreated:Put',
+        'eventTime': '2025-01-01T00:00:00Z',
+        's3': {'bucket': {'name': 'w2-bucket'}, 'object': {'key': f'uploads/{job_id}/w2.pdf'}},
+    } for job_id in job_ids]}
+
+
+def invoked_events(invoke):
+    return [json.loads(call.kwargs['Payload']) for call in invoke.call_args_list]
+
+
+@pytest.fixture
+def invoke(sqs_handler):
+    with mock.patch.object(sqs_handler, 'SQS_DISPATCH_MODE', 'invoke'), \
+            mock.patch.object(sqs_handler, 'SQS_BULK_DATA_UPDATE', False), \
+            mock.patch.object(sqs_handler.lambda_client, 'invoke', return_value={'StatusCode': 202}) as invoke:
+        yield invoke
+
+
+def test_empty_batch(sqs_handler, invoke):
+    assert sqs_handler.lambda_handler({'Records': []}, None) == {'batchItemFailures': []}
+
+
+def test_each_s3_object_is_one_core_processor_event(sqs_handler, invoke):
+    result = sqs_handler.lambda_handler({'Records': [sqs_record('m1', s3_message('job-1', 'job-2'))]}, None)
+    assert result == {'batchItemFailures': []}
+    events = invoked_events(invoke)
+    assert [event['object_key'] for event in events] == ['uploads/job-1/w2.pdf', 'uploads/job-2/w2.pdf']
+    assert all(event['event_type'] == 's3_upload' and event['dispatched_at'] for event in events)
+
+
+def test_only_failed_records_are_reported(sqs_handler, invoke):
+    def respond(FunctionName, InvocationType, Payload):
+        return {'StatusCode': 500 if json.loads(Payload).get('job_id') == 'job-bad' else 202}
+    invoke.side_effect = respond
+
+    result = sqs_handler.lambda_handler({'Records': [
+        sqs_record('m1', {'event_type': 'external_upload', 'job_id': 'job-1', 's3_url': 's3://w2-bucket/a'}),
+        sqs_record('m2', {'event_type': 'external_upload', 'job_id': 'job-bad', 's3_url': 's3://w2-bucket/b'}),
+        sqs_record('m3', 'not json'),
+        sqs_record('m4', s3_message('job-4')),
+    ]}, None)
+
+    assert sorted(item['itemIdentifier'] for item in result['batchItemFailures']) == ['m2', 'm3']
+    assert invoke.call_count == 3
+
+
+def test_invoke_errors_are_reported(sqs_handler, invoke):
+    invoke.side_effect = RuntimeError('throttled')
+    result = sqs_handler.lambda_handler({'Records': [sqs_record('m1', s3_message('job-1'))]}, None)
+    assert result == {'batchItemFailures': [{'itemIdentifier': 'm1'}]}
+
+
+def test_event_job_id(sqs_handler):
+    assert sqs_handler.event_job_id({'job_id': 'job-1'}) == 'job-1'
+    assert sqs_handler.event_job_id({'object_key': 'uploads/job%2D2/w2.pdf'}) == 'job-2'
+    assert sqs_handler.event_job_id({'object_key': 'other/w2.pdf'}) is None
+
+
+@pytest.fixture
+def core_processor(sqs_handler):
+    """In-process dispatch against a stand-in core processor"""
+    core = mock.Mock()
+    core.dispatch_event.return_value = {'statusCode': 200}
+    with mock.patch.object(sqs_handler, 'SQS_DISPATCH_MODE', 'inprocess'), \
+            mock.patch.object(sqs_handler, 'SQS_BULK_DATA_UPDATE', False), \
+            mock.patch.object(sqs_handler, 'load_core_processor', return_value=core):
+        yield core
+
+
+def external_upload_record(message_id, job_id):
+    return sqs_record(message_id, {'event_type': 'external_upload', 'job_id': job_id, 's3_url': 's3://w2-bucket/x'})
+
+
+def test_inprocess_results_map_to_failures(sqs_handler, core_processor, caplog):
+    status_codes = {'job-ok': 200, 'job-rejected': 400, 'job-error': 500}
+    core_processor.dispatch_event.side_effect = lambda event: {
+        'statusCode': status_codes[event['job_id']], 'body': '"details"'
+    }
+
+    result = sqs_handler.lambda_handler({'Records': [
+        external_upload_record(f'm-{job_id}', job_id) for job_id in status_codes
+    ]}, None)
+
+    # 5xx is retried; 4xx cannot succeed on retry, so it is logged and deleted
+    assert result == {'batchItemFailures': [{'itemIdentifier': 'm-job-error'}]}
+    assert any('Dropping external_upload event' in r.message and 'job-rejected' in r.message
+               for r in caplog.records)
+
+
+def test_inprocess_exceptions_are_reported(sqs_handler, core_processor):
+    core_processor.dispatch_event.side_effect = RuntimeError('boom')
+    result = sqs_handler.lambda_handler({'Records': [external_upload_record('m1', 'job-1')]}, None)
+    assert result == {'batchItemFailures': [{'itemIdentifier': 'm1'}]}
+
+
+def data_update_record(message_id, job_id):
+    return sqs_record(message_id, {'event_type': 'external_data_update', 'job_id': job_id, 'w2_data': {'ein': '1'}})
+
+
+def test_bulk_data_updates_report_only_failed_jobs(sqs_handler, core_processor):
+    core_processor.dispatch_event.side_effect = lambda event: (
+        {'statusCode': 200, 'body': json.dumps({'failed_job_ids': ['job-2']})}
+        if event['event_type'] == 'external_data_update_batch' else {'statusCode': 200}
+    )
+    records = [data_update_record(f'm{n}', f'job-{n}') for n in range(1, 4)]
+    records.append(external_upload_record('m4', 'job-4'))
+
+    with mock.patch.object(sqs_handler, 'SQS_BULK_DATA_UPDATE', True), \
+            mock.patch.object(sqs_handler, 'SQS_BULK_MAX_RECORDS', 2):
+        result = sqs_handler.lambda_handler({'Records': records}, None)
+
+    assert result == {'batchItemFailures': [{'itemIdentifier': 'm2'}]}
+    batches = [call.args[0] for call in core_processor.dispatch_event.call_args_list
+               if call.args[0]['event_type'] == 'external_data_update_batch']
+    assert sorted(len(batch['events']) for batch in batches) == [1, 2]
+
+
+def test_failed_bulk_dispatch_fails_all_its_records(sqs_handler, core_processor):
+    core_processor.dispatch_event.return_value = {'statusCode': 500, 'body': '"bulk API down"'}
+    with mock.patch.object(sqs_handler, 'SQS_BULK_DATA_UPDATE', True):
+        result = sqs_handler.lambda_handler({'Records': [
+            data_update_record('m1', 'job-1'), data_update_record('m2', 'job-2')
+        ]}, None)
+    assert sorted(item['itemIdentifier'] for item in result['batchItemFailures']) == ['m1', 'm2']
+
+
+def test_split_data_update_records(sqs_handler):
+    update = data_update_record('m1', 'job-1')
+    other = [external_upload_record('m2', 'job-2'), sqs_record('m3', 'not json'),
+             sqs_record('m4', {'event_type': 'external_data_update'})]
+    data_updates, other_records = sqs_handler.split_data_update_records([update] + other)
+    assert [record for record, _ in data_updates] == [update]
+    assert other_records == other
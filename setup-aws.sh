@@ -239,6 +239,32 @@ configure_s3_events() {
     return 1
 }
 
+# Expire extraction cache entries (extracted W-2 data, see Design.md) after their TTL
+configure_extraction_cache_lifecycle() {
+    local ttl_seconds=${EXTRACTION_CACHE_TTL_SECONDS:-2592000}
+    local ttl_days=$(( (${ttl_seconds%.*} + 86399) / 86400 ))
+    
+    log_info "Expiring s3://w2-bucket/extraction-cache/ after $ttl_days days"
+    if aws s3api put-bucket-lifecycle-configuration \
+        --bucket w2-bucket \
+        --lifecycle-configuration "{
+            \"Rules\": [
+                {
+                    \"ID\": \"expire-extraction-cache\",
+                    \"Filter\": {\"Prefix\": \"extraction-cache/\"},
+                    \"Status\": \"Enabled\",
+                    \"Expiration\": {\"Days\": $ttl_days}
+                }
+            ]
+        }" > /dev/null 2>&1; then
+        log_success "Extraction cache lifecycle rule configured"
+        return 0
+    fi
+    
+    log_error "Failed to configure the extraction cache lifecycle rule"
+    return 1
+}
+
 # Verify all services are working
 verify_services() {
     log_info "Verifying all services..."
@@ -278,6 +304,7 @@ main() {
     create_s3_bucket
     create_secret
     configure_s3_events
+    configure_extraction_cache_lifecycle
     
     echo "=================================================="
     verify_services
@@ -288,6 +315,7 @@ main() {
     echo "  ✅ SQS Queue: w2-file-events-queue"
     echo "  ✅ S3 Bucket: w2-bucket"
     echo "  ✅ S3 Events: Configured"
+    echo "  ✅ S3 Lifecycle: extraction-cache/ expires after the cache TTL"
     echo "  ✅ Secrets Manager: external-api-key"
     echo "  ✅ All services verified and ready"
 }
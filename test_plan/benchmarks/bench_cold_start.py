@@ -0,0 +1,153 @@
+"""
+Cold start profile and budget check for the core processor Lambda
+
+Each round starts a fresh interpreter in lambda_functions/core_processor, imports
+handler under `python -X importtime` and then loads what the first event of each
+type pulls in lazily: PyPDF2 and the S3/SQS clients for s3_upload, the Secrets
+Manager client for the external events. Creating boto3 clients makes no network
+calls, so no LocalStack is needed.
+
+The report shows the median handler import time, the modules handler imports
+directly ranked by cumulative import time, and the lazy cost per event type. The
+check fails (exit status 1) if the median import exceeds --budget-ms, or if boto3,
+botocore, PyPDF2 or unittest.mock are loaded by the import alone.
+
+Deployment packages ship without .pyc files, so a real cold start also compiles
+every module: --compile points each round at an empty bytecode cache to include
+that cost.
+
+Usage:
+    python test_plan/benchmarks/bench_cold_start.py [--rounds 7] [--budget-ms 250]
+        [--compile] [--top 12]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CORE_PROCESSOR_DIR = os.path.join(REPO_ROOT, 'lambda_functions', 'core_processor')
+
+# Only needed once an event of the matching type arrives
+DEFERRED_MODULES = ('boto3', 'botocore', 'PyPDF2', 'unittest.mock')
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+# Runs in the fresh interpreter; prints one JSON line on stdout
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import handler
+import_ms = (time.perf_counter() - started) * 1000
+loaded = [name for name in %r if name in sys.modules]
+
+import aws_clients
+lazy = {}
+def timed(name, load):
+    started = time.perf_counter()
+    load()
+    lazy[name] = (time.perf_counter() - started) * 1000
+
+timed('boto3', lambda: __import__('boto3'))
+timed('secretsmanager_client', lambda: aws_clients.get_client('secretsmanager'))
+timed('s3_client', lambda: aws_clients.get_client('s3'))
+timed('sqs_client', lambda: aws_clients.get_client('sqs'))
+timed('pypdf2', lambda: __import__('PyPDF2'))
+print(json.dumps({'import_ms': import_ms, 'loaded_at_import': loaded, 'lazy_ms': lazy}))
+""" % (DEFERRED_MODULES,)
+
+# Lazy loads triggered by the first event of each type
+EVENT_LOADS = {
+    's3_upload (sync)': ['boto3', 's3_client', 'pypdf2', 'sqs_client'],
+    'external_upload / external_data_update': ['boto3', 'secretsmanager_client'],
+}
+
+
+def parse_import_times(stderr):
+    """(self_us, cumulative_us, depth, module) for each -X importtime line"""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+    return rows
+
+
+def direct_imports(rows, module='handler'):
+    """Cumulative import time of each module imported directly by a top-level module"""
+    end = next(index for index, row in enumerate(rows) if row[2] == 0 and row[3] == module)
+    start = end
+    while start > 0 and rows[start - 1][2] > 0:
+        start -= 1
+    return {name: cumulative_us for _, cumulative_us, depth, name in rows[start:end] if depth == 1}
+
+
+def run_round(compile_modules):
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        if compile_modules:
+            env['PYTHONPYCACHEPREFIX'] = cache_dir
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE],
+            cwd=CORE_PROCESSOR_DIR, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start probe failed:\n{result.stderr[-2000:]}")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    probe['direct_imports_us'] = direct_imports(parse_import_times(result.stderr))
+    return probe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=7, help='Fresh interpreters to start (default: 7)')
+    parser.add_argument('--budget-ms', type=float, default=250.0,
+                        help='Maximum median handler import time in ms (default: 250)')
+    parser.add_argument('--compile', action='store_true', help='Start every round with an empty bytecode cache')
+    parser.add_argument('--top', type=int, default=12, help='Direct imports to list (default: 12)')
+    args = parser.parse_args()
+
+    if not args.compile:
+        # Warm the bytecode cache so the first round does not pay for compilation
+        run_round(False)
+    rounds = [run_round(args.compile) for _ in range(args.rounds)]
+
+    import_ms = statistics.median(probe['import_ms'] for probe in rounds)
+    print(f"handler import: median {import_ms:.1f} ms over {args.rounds} rounds"
+          f" (min {min(p['import_ms'] for p in rounds):.1f}, max {max(p['import_ms'] for p in rounds):.1f})"
+          + (", compiling from source" if args.compile else ""))
+
+    print(f"\n{'direct import of handler':<32}{'median ms':>10}")
+    modules = {name for probe in rounds for name in probe['direct_imports_us']}
+    medians = {name: statistics.median(probe['direct_imports_us'].get(name, 0) for probe in rounds) / 1000
+               for name in modules}
+    for name in sorted(medians, key=medians.get, reverse=True)[:args.top]:
+        print(f"{name:<32}{medians[name]:>10.1f}")
+
+    print(f"\n{'lazy load on first event':<40}{'median ms':>10}")
+    lazy_ms = {name: statistics.median(probe['lazy_ms'][name] for probe in rounds) for name in rounds[0]['lazy_ms']}
+    for event_type, loads in EVENT_LOADS.items():
+        print(f"{event_type:<40}{sum(lazy_ms[name] for name in loads):>10.1f}  ({', '.join(loads)})")
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"median handler import {import_ms:.1f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    loaded = sorted({name for probe in rounds for name in probe['loaded_at_import']})
+    if loaded:
+        failures.append(f"loaded by the handler import alone: {', '.join(loaded)}")
+
+    if failures:
+        print("\n❌ Cold start budget check failed:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(f"\n✅ Within the {args.budget_ms:.0f} ms budget; {', '.join(DEFERRED_MODULES)} stay deferred")
+
+
+if __name__ == '__main__':
+    main()
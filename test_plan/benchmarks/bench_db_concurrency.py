@@ -0,0 +1,214 @@
+"""
+Write concurrency benchmark: PATCH /jobs/{job_id}/ from many workers at once
+
+Each worker is a separate process (like separate gunicorn workers or Lambda
+containers talking to one backend) running the backend through the DRF test client.
+All workers start together and send --requests PATCHes each, shaped like the core
+processor's completion PATCH (status, progress and W-2 data), spread over --jobs
+jobs. The run is repeated for every worker count in --workers.
+
+Reported per run: throughput, request latency percentiles, errors (e.g. "database
+is locked") and lock wait. Lock wait is the time spent in BEGIN and in
+INSERT/UPDATE/DELETE statements: SQLite waits for its single write lock when the
+transaction begins (BEGIN IMMEDIATE), PostgreSQL waits for row locks inside the
+writes. With one worker it is close to the bare cost of those statements.
+
+Backends use the settings' database profiles (doc_processor_backend/settings.py):
+    sqlite      a fresh SQLite file; --sqlite-journal delete compares the old
+                rollback journal with WAL
+    postgres    DB_ENGINE=postgres with the POSTGRES_* and DB_POOL* variables from
+                the environment. Creates bench_* jobs and deletes them afterwards.
+
+Usage:
+    python test_plan/benchmarks/bench_db_concurrency.py --backend sqlite --workers 1,4,8,16
+    POSTGRES_HOST=localhost python test_plan/benchmarks/bench_db_concurrency.py \\
+        --backend sqlite --backend postgres --requests 100
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+BACKEND_DIR = os.path.join(REPO_ROOT, 'doc_processor_backend')
+
+JOB_PREFIX = 'bench_concurrency_'
+WRITE_STATEMENTS = ('BEGIN', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def setup_django():
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'doc_processor_backend.settings')
+    import django
+    django.setup()
+
+
+def configure_backend(backend, journal_mode, database_dir):
+    """Select the settings profile through the environment, which spawned workers inherit"""
+    os.environ['DB_ENGINE'] = backend
+    if backend == 'sqlite':
+        os.environ['SQLITE_PATH'] = os.path.join(database_dir, f'bench-{journal_mode}.sqlite3')
+        os.environ['SQLITE_JOURNAL_MODE'] = journal_mode
+
+
+def prepare_jobs(count):
+    """Migrate and create the jobs the workers update; returns their ids"""
+    from django.core.management import call_command
+    from django.db import connections
+    from w2_job_app.models import W2Job
+
+    call_command('migrate', verbosity=0, interactive=False)
+    W2Job.objects.filter(job_id__startswith=JOB_PREFIX).delete()
+    job_ids = [f"{JOB_PREFIX}{index}" for index in range(count)]
+    W2Job.objects.bulk_create(W2Job(job_id=job_id, filename='w2.pdf', status='started') for job_id in job_ids)
+    connections.close_all()
+    return job_ids
+
+
+def delete_jobs():
+    from django.db import connections
+    from w2_job_app.models import W2Job
+
+    W2Job.objects.filter(job_id__startswith=JOB_PREFIX).delete()
+    connections.close_all()
+
+
+def patch_payload(sequence):
+    return {
+        'status': 'Success',
+        'progress': 'completed',
+        'w2_data_status': 'success',
+        'w2_data_status_msg': f'Benchmark update {sequence}',
+        'w2_data': {
+            'ein': '12-3456789',
+            'ssn': '123-45-6789',
+            'wages_box1': f'{50000 + sequence % 1000}.00',
+            'federal_tax_withheld_box2': '6480.00',
+        },
+    }
+
+
+def worker(worker_index, job_ids, requests_per_worker, start_barrier, results):
+    """Send PATCHes once all workers are ready; puts one result dict on the queue"""
+    setup_django()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+
+    setup_test_environment()
+    client = APIClient()
+    lock_wait = [0.0]
+
+    def time_writes(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+                lock_wait[0] += (time.perf_counter() - started) * 1000
+
+    latencies, lock_waits, errors = [], [], {}
+    with connection.execute_wrapper(time_writes):
+        # Open the connection and load the view code before the clock starts
+        client.get(f'/jobs/{job_ids[worker_index % len(job_ids)]}/')
+        start_barrier.wait()
+        started = time.perf_counter()
+        for sequence in range(requests_per_worker):
+            job_id = job_ids[(worker_index * requests_per_worker + sequence) % len(job_ids)]
+            lock_wait[0] = 0.0
+            request_start = time.perf_counter()
+            response = client.patch(f'/jobs/{job_id}/', patch_payload(sequence), format='json')
+            latencies.append((time.perf_counter() - request_start) * 1000)
+            lock_waits.append(lock_wait[0])
+            if response.status_code != 200:
+                error = str(response.json().get('error', response.status_code))[:80]
+                errors[error] = errors.get(error, 0) + 1
+        finished = time.perf_counter()
+    connection.close()
+    results.put({'started': started, 'finished': finished, 'latencies': latencies,
+                 'lock_waits': lock_waits, 'errors': errors})
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def run(job_ids, workers, requests_per_worker):
+    """Run one worker count; returns the merged results"""
+    context = multiprocessing.get_context('spawn')
+    start_barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(index, job_ids, requests_per_worker, start_barrier, results))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = [value for outcome in outcomes for value in outcome['latencies']]
+    lock_waits = [value for outcome in outcomes for value in outcome['lock_waits']]
+    errors = {}
+    for outcome in outcomes:
+        for error, count in outcome['errors'].items():
+            errors[error] = errors.get(error, 0) + count
+    elapsed = max(o['finished'] for o in outcomes) - min(o['started'] for o in outcomes)
+    return {
+        'workers': workers,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': (len(latencies) - sum(errors.values())) / elapsed,
+        'latency': {pct: percentile(latencies, pct) for pct in (50, 95, 99)},
+        'lock_wait': {pct: percentile(lock_waits, pct) for pct in (50, 95, 99)},
+        'lock_wait_share': sum(lock_waits) / sum(latencies),
+    }
+
+
+def print_results(label, rows):
+    print(f"\n{label}")
+    print(f"{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'lock p50':>10}{'lock p95':>10}{'lock p99':>10}{'lock %':>8}")
+    for row in rows:
+        print(f"{row['workers']:>8}{row['requests']:>10}{sum(row['errors'].values()):>8}{row['throughput']:>9.1f}"
+              + "".join(f"{row['latency'][pct]:>9.1f}" for pct in (50, 95, 99))
+              + "".join(f"{row['lock_wait'][pct]:>10.1f}" for pct in (50, 95, 99))
+              + f"{row['lock_wait_share'] * 100:>7.0f}%")
+    for row in rows:
+        for error, count in row['errors'].items():
+            print(f"  {row['workers']} workers: {count} x {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', action='append', choices=['sqlite', 'postgres'],
+                        help='Database profile to benchmark; repeat for several (default: sqlite)')
+    parser.add_argument('--workers', default='1,4,8,16', help='Comma separated worker counts (default: 1,4,8,16)')
+    parser.add_argument('--requests', type=int, default=50, help='PATCHes per worker (default: 50)')
+    parser.add_argument('--jobs', type=int, default=200, help='Jobs the PATCHes are spread over (default: 200)')
+    parser.add_argument('--sqlite-journal', default='wal', help='SQLite journal mode (default: wal)')
+    args = parser.parse_args()
+
+    worker_counts = [int(count) for count in args.workers.split(',')]
+    database_dir = tempfile.mkdtemp(prefix='w2-bench-db-')
+    for backend in args.backend or ['sqlite']:
+        configure_backend(backend, args.sqlite_journal, database_dir)
+        # Each backend is prepared in a fresh process: settings are read once per process
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(1, initializer=setup_django) as pool:
+            job_ids = pool.apply(prepare_jobs, (args.jobs,))
+        try:
+            rows = [run(job_ids, workers, args.requests) for workers in worker_counts]
+        finally:
+            with context.Pool(1, initializer=setup_django) as pool:
+                pool.apply(delete_jobs)
+        label = f"sqlite (journal_mode={args.sqlite_journal})" if backend == 'sqlite' else 'postgres'
+        print_results(label, rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: pooled W-2 extraction throughput vs worker processes
+
+Runs w2_extractor.extract_many over N copies of a sample PDF with process
+pools of increasing size and reports documents/sec, next to the sequential
+extract_w2_data loop. S3 is replaced by the local client from
+bench_pdf_download, so downloads cost only a local file read.
+
+Usage:
+    python test_plan/benchmarks/bench_extract_many.py [--documents 200] [--workers 1,2,4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pdf_download import REPO_ROOT, LocalS3Client  # noqa: E402
+import w2_extractor  # noqa: E402
+
+DEFAULT_PDF = os.path.join(REPO_ROOT, 'test_plan', 'test-w2-document.pdf')
+
+
+def default_worker_counts():
+    counts, workers = [], 1
+    while workers < w2_extractor.available_cpus():
+        counts.append(workers)
+        workers *= 2
+    counts.append(w2_extractor.available_cpus())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--pdf', default=DEFAULT_PDF)
+    parser.add_argument('--workers', default=None, help='Comma-separated process counts (default: powers of two up to vCPUs)')
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(',')] if args.workers else default_worker_counts()
+    object_keys = [f'uploads/bench-{i}/w2.pdf' for i in range(args.documents)]
+
+    original_client = w2_extractor.s3
+    w2_extractor.s3 = LocalS3Client(args.pdf)
+    try:
+        print(f"{args.documents} x {os.path.relpath(args.pdf, REPO_ROOT)}, {w2_extractor.available_cpus()} vCPUs available")
+        print(f"{'mode':<24}{'seconds':>10}{'docs/sec':>12}")
+
+        start = time.perf_counter()
+        for object_key in object_keys:
+            w2_extractor.extract_w2_data(object_key)
+        elapsed = time.perf_counter() - start
+        print(f"{'sequential':<24}{elapsed:>10.2f}{args.documents / elapsed:>12.1f}")
+
+        for workers in worker_counts:
+            # Start workers like get_process_pool does
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+                # Warm the workers so process start-up is not measured
+                list(pool.map(int, range(workers)))
+                start = time.perf_counter()
+                results = w2_extractor.extract_many(object_keys, pool=pool)
+                elapsed = time.perf_counter() - start
+            errors = sum(1 for result in results if 'error' in result)
+            label = f"extract_many x{workers}" + (f" ({errors} errors)" if errors else "")
+            print(f"{label:<24}{elapsed:>10.2f}{args.documents / elapsed:>12.1f}")
+    finally:
+        w2_extractor.s3 = original_client
+
+
+if __name__ == '__main__':
+    main()
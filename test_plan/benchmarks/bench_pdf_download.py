@@ -0,0 +1,98 @@
+"""
+Benchmark: S3 PDF download paths for the core processor
+
+Compares the legacy NamedTemporaryFile round-trip with the in-memory and
+spooled download paths of w2_extractor.extract_w2_data. S3 is replaced by a
+local client that serves the sample PDFs from disk, so only the local
+buffering, parsing and cleanup costs are measured.
+
+Usage:
+    python test_plan/benchmarks/bench_pdf_download.py [--iterations 200]
+"""
+import argparse
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda_functions', 'core_processor'))
+
+import w2_extractor  # noqa: E402
+
+SAMPLE_PDFS = [
+    os.path.join(REPO_ROOT, 'demo-w2.pdf'),
+    os.path.join(REPO_ROOT, 'test_plan', 'test-w2-document.pdf'),
+]
+
+
+class LocalS3Client:
+    """Minimal stand-in for the boto3 S3 client that serves files from disk"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_object(self, Bucket, Key):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+    def download_file(self, Bucket, Key, Filename):
+        shutil.copyfile(self.path, Filename)
+
+
+def legacy_tempfile_path(object_key):
+    """The original download_file -> NamedTemporaryFile -> unlink flow"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+        w2_extractor.s3_client().download_file(w2_extractor.W2_BUCKET, object_key, temp_file.name)
+        temp_pdf_path = temp_file.name
+    try:
+        return w2_extractor.extract_w2_data_from_pdf(temp_pdf_path)
+    finally:
+        os.unlink(temp_pdf_path)
+
+
+def stream_path(object_key, max_in_memory_bytes):
+    with w2_extractor.download_pdf(object_key, max_in_memory_bytes) as pdf_stream:
+        return w2_extractor.extract_w2_data_from_pdf(pdf_stream)
+
+
+def measure(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), statistics.mean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    original_client = w2_extractor.s3
+    object_key = 'uploads/bench/w2.pdf'
+    paths = {
+        'tempfile (legacy)': lambda: legacy_tempfile_path(object_key),
+        'in-memory': lambda: stream_path(object_key, w2_extractor.MAX_IN_MEMORY_PDF_BYTES),
+        'spooled': lambda: stream_path(object_key, 0),
+    }
+
+    try:
+        for pdf_path in SAMPLE_PDFS:
+            w2_extractor.s3 = LocalS3Client(pdf_path)
+            print(f"\n{os.path.relpath(pdf_path, REPO_ROOT)} ({os.path.getsize(pdf_path)} bytes, {args.iterations} iterations)")
+            print(f"{'path':<20}{'median ms':>12}{'mean ms':>12}")
+            for name, fn in paths.items():
+                median, mean = measure(fn, args.iterations)
+                print(f"{name:<20}{median:>12.3f}{mean:>12.3f}")
+    finally:
+        w2_extractor.s3 = original_client
+
+
+if __name__ == '__main__':
+    main()
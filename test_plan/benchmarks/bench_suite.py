@@ -0,0 +1,346 @@
+"""
+Benchmark suite: W-2 extraction and the job API, with a baseline regression report
+
+Cases:
+    extract_*       w2_extractor.extract_w2_data_from_pdf on the sample PDFs (AcroForm
+                    path), a broken upload (demo-w2.pdf), and synthetic packets that
+                    exercise the text fallback and multi-page documents
+    serializer_*    W2JobSerializer.update with and without nested W-2 data
+    api_*           POST /jobs/, PATCH /jobs/{job_id}/, GET /jobs/{job_id}/ and an
+                    unchanged poll of GET /jobs/{job_id}/status/ (304) through the DRF
+                    test client against an on-disk SQLite database (S3 presigning is stubbed)
+
+Each case is timed over several rounds with the garbage collector paused (as timeit
+does). The fastest round's time per operation, which is far less noisy than the mean
+on a shared machine, is compared with the stored baseline and any case slower by more
+than --threshold is reported as a regression (exit status 1). Baselines are machine specific: refresh them with
+--save-baseline on the machine that runs the comparison.
+
+Usage:
+    python test_plan/benchmarks/bench_suite.py [--only extract] [--rounds 7]
+        [--baseline test_plan/benchmarks/baselines.json] [--threshold 0.25]
+        [--save-baseline] [--output results.json]
+"""
+import argparse
+import gc
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pdf_download import REPO_ROOT  # noqa: E402
+import w2_extractor  # noqa: E402
+sys.path.insert(0, os.path.join(REPO_ROOT, 'test_plan'))
+from synthetic_w2 import text_pdf, w2_text_lines  # noqa: E402
+from PyPDF2 import PdfReader, PdfWriter  # noqa: E402
+from PyPDF2.generic import NameObject  # noqa: E402
+
+BACKEND_DIR = os.path.join(REPO_ROOT, 'doc_processor_backend')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+ACROFORM_PDF = os.path.join(REPO_ROOT, 'w2_form-gautaman.pdf')
+BROKEN_PDF = os.path.join(REPO_ROOT, 'demo-w2.pdf')
+
+W2_TEXT_LINES = w2_text_lines({
+    "ein": "12-3456789",
+    "ssn": "123-45-6789",
+    "wages_box1": "54000.00",
+    "federal_tax_withheld_box2": "6480.00",
+}, amount_style='grouped')
+FILLER_LINES = ["Continuation page - intentionally left without W-2 values"] * 40
+
+BENCHMARKS = {}
+
+
+def benchmark(name, iterations):
+    """Register a case: the decorated setup function returns the operation to time"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, iterations)
+        return setup
+    return register
+
+
+def acroform_packet(extra_pages):
+    """The sample AcroForm W-2 followed by blank pages, keeping its form fields"""
+    reader = PdfReader(ACROFORM_PDF)
+    writer = PdfWriter()
+    writer.add_page(reader.pages[0])
+    for _ in range(extra_pages):
+        writer.add_blank_page()
+    writer._root_object[NameObject('/AcroForm')] = reader.trailer['/Root']['/AcroForm'].clone(writer)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def extraction_case(data):
+    def run():
+        w2_extractor.extract_w2_data_from_pdf(io.BytesIO(data))
+    return run
+
+
+@benchmark('extract_acroform_gautaman', iterations=20)
+def bench_extract_acroform():
+    with open(ACROFORM_PDF, 'rb') as f:
+        return extraction_case(f.read())
+
+
+@benchmark('extract_broken_demo_w2', iterations=200)
+def bench_extract_broken():
+    with open(BROKEN_PDF, 'rb') as f:
+        return extraction_case(f.read())
+
+
+@benchmark('extract_text_fallback_1_page', iterations=50)
+def bench_extract_text_fallback():
+    return extraction_case(text_pdf([W2_TEXT_LINES]))
+
+
+@benchmark('extract_text_fallback_10_pages', iterations=10)
+def bench_extract_text_multipage():
+    # Values on the last page: the fallback has to scan the whole packet
+    return extraction_case(text_pdf([FILLER_LINES] * 9 + [W2_TEXT_LINES]))
+
+
+@benchmark('extract_acroform_10_pages', iterations=20)
+def bench_extract_acroform_multipage():
+    return extraction_case(acroform_packet(extra_pages=9))
+
+
+class StubS3Service:
+    """Presigns locally so POST /jobs/ does not reach S3"""
+
+    def generate_presigned_url(self, object_key, expiration=3600):
+        return f"http://localhost:4566/w2-bucket/{object_key}?X-Amz-Expires={expiration}"
+
+
+_django_ready = False
+
+
+def setup_django():
+    """Configure the backend against a fresh on-disk SQLite database (once)"""
+    global _django_ready
+    if _django_ready:
+        return
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'doc_processor_backend.settings')
+
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    database_dir = tempfile.mkdtemp(prefix='w2-bench-')
+    settings.DATABASES['default']['NAME'] = os.path.join(database_dir, 'bench.sqlite3')
+    django.setup()
+    setup_test_environment()
+    call_command('migrate', verbosity=0, interactive=False)
+
+    from w2_job_app import views
+    views.S3Service = StubS3Service
+    _django_ready = True
+
+
+def create_job():
+    from w2_job_app.models import W2Job
+
+    job_id = f"bench_{time.perf_counter_ns()}"
+    return W2Job.objects.create(job_id=job_id, filename='w2.pdf', status='started')
+
+
+W2_PATCH = {
+    'status': 'Success',
+    'w2_data_status': 'success',
+    'w2_data': {
+        'ein': '12-3456789',
+        'ssn': '123-45-6789',
+        'wages_box1': '54000.00',
+        'federal_tax_withheld_box2': '6480.00',
+    },
+}
+
+
+@benchmark('serializer_update_status', iterations=100)
+def bench_serializer_update_status():
+    setup_django()
+    from w2_job_app.serializers import W2JobSerializer
+
+    job = create_job()
+
+    def run():
+        serializer = W2JobSerializer(job, data={'status': 'processing', 'progress': 'extracting'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+    return run
+
+
+@benchmark('serializer_update_with_w2_data', iterations=100)
+def bench_serializer_update_w2_data():
+    setup_django()
+    from w2_job_app.serializers import W2JobSerializer
+
+    job = create_job()
+
+    def run():
+        serializer = W2JobSerializer(job, data=W2_PATCH, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+    return run
+
+
+@benchmark('api_post_jobs', iterations=100)
+def bench_api_post_jobs():
+    setup_django()
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+
+    def run():
+        response = client.post('/jobs/', format='json')
+        assert response.status_code == 201, response.content
+    return run
+
+
+@benchmark('api_patch_job', iterations=100)
+def bench_api_patch_job():
+    setup_django()
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    job = create_job()
+
+    def run():
+        response = client.patch(f'/jobs/{job.job_id}/', W2_PATCH, format='json')
+        assert response.status_code == 200, response.content
+    return run
+
+
+def polled_job():
+    """A completed job with W2 data, as seen by a client polling for the result"""
+    from rest_framework.test import APIClient
+
+    job = create_job()
+    APIClient().patch(f'/jobs/{job.job_id}/', W2_PATCH, format='json')
+    return job
+
+
+@benchmark('api_get_job', iterations=200)
+def bench_api_get_job():
+    setup_django()
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    job = polled_job()
+
+    def run():
+        response = client.get(f'/jobs/{job.job_id}/')
+        assert response.status_code == 200, response.content
+    return run
+
+
+@benchmark('api_poll_status_not_modified', iterations=200)
+def bench_api_poll_status_not_modified():
+    setup_django()
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    job = polled_job()
+    etag = client.get(f'/jobs/{job.job_id}/status/')['ETag']
+
+    def run():
+        response = client.get(f'/jobs/{job.job_id}/status/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304, response.content
+    return run
+
+
+def run_case(name, rounds):
+    setup, iterations = BENCHMARKS[name]
+    operation = setup()
+    operation()  # warm-up
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                operation()
+            samples.append((time.perf_counter() - start) * 1000 / iterations)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    median_ms = statistics.median(samples)
+    return {
+        'median_ms': round(median_ms, 4),
+        'min_ms': round(min(samples), 4),
+        'ops_per_sec': round(1000 / median_ms, 1) if median_ms else None,
+        'rounds': rounds,
+        'iterations': iterations,
+    }
+
+
+def report(results, baseline, threshold):
+    """Print results next to the baseline and return the names of regressed cases"""
+    regressions = []
+    print(f"{'case':<34}{'best ms':>10}{'median ms':>12}{'ops/sec':>10}{'baseline ms':>13}{'change':>9}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base:
+            change = result['min_ms'] / base['min_ms'] - 1
+            flag = ''
+            if change > threshold:
+                regressions.append(name)
+                flag = '  REGRESSION'
+            print(f"{name:<34}{result['min_ms']:>10.3f}{result['median_ms']:>12.3f}{result['ops_per_sec']:>10}"
+                  f"{base['min_ms']:>13.3f}{change:>+9.1%}{flag}")
+        else:
+            print(f"{name:<34}{result['min_ms']:>10.3f}{result['median_ms']:>12.3f}{result['ops_per_sec']:>10}{'-':>13}{'new':>9}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', default=None, help='Run only cases whose name contains this substring')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown vs baseline (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--output', default=None, help='Also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    # The broken sample logs one error per parse
+    logging.disable(logging.CRITICAL)
+
+    names = [name for name in BENCHMARKS if not args.only or args.only in name]
+    results = {name: run_case(name, args.rounds) for name in names}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {os.path.relpath(args.baseline, REPO_ROOT)}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
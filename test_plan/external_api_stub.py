@@ -0,0 +1,93 @@
+"""
+Local stub for the external partner API (http://external-api:8080)
+
+Implements the endpoints called by core_processor/external_api_client.py so
+the real HTTP path can be exercised without the partner service:
+
+    POST /external/file-upload
+    POST /external/data-update
+    POST /external/data-update/bulk
+
+Requests must carry "Authorization: Bearer <key>"; with --api-key only that key
+is accepted (others get 401). Records whose job_id starts with --fail-prefix are
+reported as failed by the bulk endpoint.
+
+Usage:
+    python test_plan/external_api_stub.py --port 8080
+    EXTERNAL_API_MOCK=false EXTERNAL_API_BASE_URL=http://localhost:8080 ...
+"""
+import argparse
+import json
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ExternalApiStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    api_key = None
+    fail_prefix = 'fail'
+
+    def _send_json(self, status_code, body):
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        auth = self.headers.get('Authorization', '')
+        if not auth.startswith('Bearer ') or not auth[len('Bearer '):]:
+            return False
+        return self.api_key is None or auth[len('Bearer '):] == self.api_key
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json(400, {'error': 'Invalid JSON'})
+
+        if not self._authorized():
+            return self._send_json(401, {'error': 'Invalid API key'})
+
+        timestamp = datetime.utcnow().isoformat() + 'Z'
+
+        if self.path == '/external/file-upload':
+            return self._send_json(201, {'file_id': str(uuid.uuid4()), 'status': 'uploaded', 'timestamp': timestamp})
+
+        if self.path == '/external/data-update':
+            return self._send_json(201, {'report_id': payload.get('job_id'), 'file_id': str(uuid.uuid4()), 'timestamp': timestamp})
+
+        if self.path == '/external/data-update/bulk':
+            results = []
+            for record in payload.get('records', []):
+                job_id = record.get('job_id')
+                if not job_id or not record.get('w2_data') or str(job_id).startswith(self.fail_prefix):
+                    results.append({'job_id': job_id, 'success': False, 'error': 'Record rejected'})
+                else:
+                    results.append({'job_id': job_id, 'success': True, 'report_id': job_id, 'file_id': str(uuid.uuid4())})
+            return self._send_json(201, {'results': results, 'timestamp': timestamp})
+
+        return self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--api-key', default=None, help='Only accept this bearer token')
+    parser.add_argument('--fail-prefix', default='fail', help='Reject bulk records whose job_id starts with this')
+    args = parser.parse_args()
+
+    ExternalApiStubHandler.api_key = args.api_key
+    ExternalApiStubHandler.fail_prefix = args.fail_prefix
+
+    server = ThreadingHTTPServer((args.host, args.port), ExternalApiStubHandler)
+    print(f"External API stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
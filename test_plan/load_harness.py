@@ -0,0 +1,416 @@
+"""
+End-to-end load harness: POST /jobs/ -> presigned PUT -> processing -> Success
+
+Virtual users run jobs concurrently. Each job creates a W2Job through
+POST /jobs/ (W2JobViewSet.create), PUTs a synthetic W-2 to the returned
+presigned URL and polls GET /jobs/{job_id}/status/ until status == "Success". The
+report gives p50/p95/p99 latency, error rate and throughput per stage:
+
+    create        POST /jobs/
+    upload        PUT to the presigned URL
+    processing    upload finished -> Success observed by polling
+    end_to_end    POST started -> Success observed
+    queue_wait    message enqueued -> picked up by a poller      (local stack only)
+    sqs_batch     sqs_handler.lambda_handler per polled batch    (local stack only)
+
+By default the whole stack runs in this process with local stand-ins:
+    - the Django backend on a threaded WSGI server with a fresh SQLite database
+    - an S3 stand-in HTTP server receiving the presigned PUTs; each PUT enqueues
+      the S3 event notification S3 would send to SQS
+    - an SQS stand-in queue drained by --pollers threads that call the real
+      sqs_handler.lambda_handler in-process (SQS_DISPATCH_MODE=inprocess) in
+      batches of up to --batch-size; messages reported in batchItemFailures are
+      redelivered up to --max-receives times. Events published by the core
+      processor (external_upload, external_data_update) go to the same queue.
+With --backend-url, only the HTTP side is driven against a running stack
+(docker-compose with LocalStack), which does the processing itself.
+
+Usage:
+    python test_plan/load_harness.py [--jobs 200] [--concurrency 20] [--pollers 2]
+        [--batch-size 10] [--backend-url http://localhost:8000] [--output report.json]
+"""
+import argparse
+import importlib.util
+import io
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BACKEND_DIR = os.path.join(REPO_ROOT, 'doc_processor_backend')
+SQS_HANDLER_PATH = os.path.join(REPO_ROOT, 'lambda_functions', 'sqs_handler', 'handler.py')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_w2 import acroform_w2_pdf, random_w2_values  # noqa: E402
+
+STAGES = ['create', 'upload', 'processing', 'end_to_end', 'queue_wait', 'sqs_batch']
+
+
+class StageMetrics:
+    """Thread-safe latency samples and error counts per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds * 1000)
+
+    def error(self, stage):
+        with self._lock:
+            self.errors[stage] += 1
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class LocalSqsQueue:
+    """In-memory stand-in for the SQS queue, also exposing the boto3 calls event_publisher uses"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def enqueue(self, body, receive_count=0):
+        self._queue.put({
+            'messageId': str(uuid.uuid4()),
+            'body': body,
+            'enqueued_at': time.perf_counter(),
+            'sent_timestamp': int(time.time() * 1000),
+            'receive_count': receive_count,
+        })
+
+    def receive(self, max_messages, batching_window, timeout=0.2):
+        """Block for the first message, then gather more for up to batching_window seconds"""
+        try:
+            messages = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + batching_window
+        while len(messages) < max_messages:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                messages.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return messages
+
+    def get_queue_url(self, QueueName):
+        return {'QueueUrl': f'local://{QueueName}'}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        for entry in Entries:
+            self.enqueue(entry['MessageBody'])
+        return {'Successful': [{'Id': entry['Id']} for entry in Entries], 'Failed': []}
+
+
+class LocalObjectStore:
+    """Objects PUT through the S3 stand-in, readable through a boto3-like get_object"""
+
+    def __init__(self, events_queue):
+        self._objects = {}
+        self._lock = threading.Lock()
+        self._events_queue = events_queue
+
+    def put(self, bucket, key, data):
+        with self._lock:
+            self._objects[(bucket, key)] = data
+        self._events_queue.enqueue(json.dumps({'Records': [{
+            'eventSource': 'aws:s3',
+            'eventName': 'ObjectCreated:Put',
+            'eventTime': datetime.now(timezone.utc).isoformat(),
+            's3': {'bucket': {'name': bucket}, 'object': {'key': key, 'size': len(data)}},
+        }]}))
+
+    def get_object(self, Bucket, Key):
+        with self._lock:
+            data = self._objects[(Bucket, Key)]
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+
+class S3StandInHandler(BaseHTTPRequestHandler):
+    """Path-style S3 endpoint: HEAD bucket, PUT object (presigned) and GET object"""
+    protocol_version = 'HTTP/1.1'
+    store = None
+
+    def _split_path(self):
+        parts = unquote(urlsplit(self.path).path).lstrip('/').split('/', 1)
+        return parts[0], (parts[1] if len(parts) > 1 else '')
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply(200)
+
+    def do_PUT(self):
+        bucket, key = self._split_path()
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if key:
+            self.store.put(bucket, key, data)
+        self._reply(200, headers={'ETag': f'"{uuid.uuid4().hex}"'})
+
+    def do_GET(self):
+        bucket, key = self._split_path()
+        try:
+            self._reply(200, self.store.get_object(bucket, key)['Body'].read())
+        except KeyError:
+            self._reply(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalSecretsClient:
+    def get_secret_value(self, SecretId):
+        return {'SecretString': json.dumps({'api_key': 'local-load-test-key'})}
+
+
+def serve_in_thread(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_backend(s3_endpoint):
+    """Run the Django backend on a threaded WSGI server against a fresh SQLite file"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'doc_processor_backend.settings')
+
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    settings.DATABASES['default']['NAME'] = os.path.join(tempfile.mkdtemp(prefix='w2-load-'), 'load.sqlite3')
+    settings.AWS_S3_ENDPOINT_URL = s3_endpoint
+    django.setup()
+    call_command('migrate', verbosity=0, interactive=False)
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+    server.set_app(get_wsgi_application())
+    # Set after get_wsgi_application(), which reapplies the LOGGING setting
+    logging.getLogger('shared_services').setLevel(logging.WARNING)
+    return serve_in_thread(server)
+
+
+def load_sqs_handler(backend_url, events_queue, store):
+    """Import the SQS handler (and through it the core processor) wired to the local stand-ins"""
+    os.environ['BACKEND_BASE_URL'] = backend_url
+    os.environ['SQS_DISPATCH_MODE'] = 'inprocess'
+    spec = importlib.util.spec_from_file_location('sqs_handler_handler', SQS_HANDLER_PATH)
+    sqs_handler = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sqs_handler)
+    sqs_handler.load_core_processor()
+
+    # The core processor's boto3 clients point at LocalStack; swap in the stand-ins
+    sys.modules['w2_extractor'].s3 = store
+    sys.modules['event_publisher'].sqs = events_queue
+    sys.modules['external_api_client'].secrets_client = LocalSecretsClient()
+    logging.getLogger().setLevel(logging.WARNING)
+    return sqs_handler
+
+
+def run_poller(sqs_handler, events_queue, metrics, stop, batch_size, batching_window, max_receives):
+    """Event source mapping stand-in: poll batches and invoke the SQS handler"""
+    while not stop.is_set():
+        messages = events_queue.receive(batch_size, batching_window)
+        if not messages:
+            continue
+        received_at = time.perf_counter()
+        for message in messages:
+            metrics.record('queue_wait', received_at - message['enqueued_at'])
+
+        event = {'Records': [
+            {
+                'messageId': message['messageId'],
+                'body': message['body'],
+                'eventSource': 'aws:sqs',
+                'attributes': {
+                    'SentTimestamp': str(message['sent_timestamp']),
+                    'ApproximateReceiveCount': str(message['receive_count'] + 1),
+                },
+            }
+            for message in messages
+        ]}
+        try:
+            failed_ids = {
+                failure['itemIdentifier']
+                for failure in sqs_handler.lambda_handler(event, None)['batchItemFailures']
+            }
+        except Exception:
+            failed_ids = {message['messageId'] for message in messages}
+        metrics.record('sqs_batch', time.perf_counter() - received_at)
+
+        for message in messages:
+            if message['messageId'] not in failed_ids:
+                continue
+            metrics.error('sqs_batch')
+            if message['receive_count'] + 1 < max_receives:
+                events_queue.enqueue(message['body'], message['receive_count'] + 1)
+
+
+def run_job(backend_url, metrics, poll_interval, timeout, rng_seed):
+    """Drive one job through create, upload and polling; returns True on Success"""
+    session = requests.Session()
+    started = time.perf_counter()
+
+    try:
+        response = session.post(f"{backend_url}/jobs/", timeout=30)
+        response.raise_for_status()
+        job = response.json()
+    except Exception:
+        metrics.error('create')
+        return False
+    metrics.record('create', time.perf_counter() - started)
+
+    upload_started = time.perf_counter()
+    try:
+        pdf = acroform_w2_pdf(random_w2_values(random.Random(rng_seed)))
+        response = session.put(job['signed_url'], data=pdf, headers={'Content-Type': 'application/pdf'}, timeout=30)
+        response.raise_for_status()
+    except Exception:
+        metrics.error('upload')
+        return False
+    uploaded = time.perf_counter()
+    metrics.record('upload', uploaded - upload_started)
+
+    deadline = uploaded + timeout
+    state, etag = {}, None
+    while time.perf_counter() < deadline:
+        try:
+            headers = {'If-None-Match': etag} if etag else {}
+            response = session.get(f"{backend_url}/jobs/{job['job_id']}/status/", headers=headers, timeout=30)
+            if response.status_code != 304:
+                state = response.json() if response.ok else {}
+                etag = response.headers.get('ETag')
+        except Exception:
+            state = {}
+        if state.get('status') == 'Success':
+            finished = time.perf_counter()
+            metrics.record('processing', finished - uploaded)
+            metrics.record('end_to_end', finished - started)
+            return True
+        if state.get('progress') == 'failed':
+            break
+        time.sleep(poll_interval)
+
+    metrics.error('processing')
+    return False
+
+
+def build_report(metrics, jobs, completed, elapsed):
+    stages = {}
+    for stage in STAGES:
+        samples = metrics.samples.get(stage, [])
+        errors = metrics.errors.get(stage, 0)
+        if not samples and not errors:
+            continue
+        attempts = len(samples) + errors if stage != 'sqs_batch' else len(samples)
+        stages[stage] = {
+            'count': len(samples),
+            'errors': errors,
+            'error_rate': round(errors / attempts, 4) if attempts else 0.0,
+            **{f'p{pct}_ms': round(percentile(samples, pct), 2) if samples else None for pct in (50, 95, 99)},
+        }
+    return {
+        'jobs': jobs,
+        'completed': completed,
+        'seconds': round(elapsed, 2),
+        'throughput_jobs_per_sec': round(completed / elapsed, 2) if elapsed else 0.0,
+        'stages': stages,
+    }
+
+
+def print_report(report):
+    print(f"{'stage':<14}{'count':>7}{'errors':>8}{'err %':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in report['stages'].items():
+        latencies = "".join(f"{s[key]:>10.1f}" if s[key] is not None else f"{'-':>10}" for key in ('p50_ms', 'p95_ms', 'p99_ms'))
+        print(f"{stage:<14}{s['count']:>7}{s['errors']:>8}{s['error_rate']:>8.1%}{latencies}")
+    print(f"{report['completed']}/{report['jobs']} jobs completed in {report['seconds']}s "
+          f"({report['throughput_jobs_per_sec']} jobs/sec)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20, help='Virtual users running jobs concurrently')
+    parser.add_argument('--backend-url', default=None, help='Drive a running stack instead of the local stand-ins')
+    parser.add_argument('--pollers', type=int, default=2, help='Concurrent SQS handler invocations (local stack)')
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--batching-window', type=float, default=0.1, help='Seconds to fill a batch (local stack)')
+    parser.add_argument('--max-receives', type=int, default=3, help='Deliveries before a message is dropped (local stack)')
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for a job after its upload')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', default=None, help='Also write the report as JSON to this file')
+    args = parser.parse_args()
+
+    metrics = StageMetrics()
+    stop = threading.Event()
+    backend_url = args.backend_url
+
+    if backend_url is None:
+        events_queue = LocalSqsQueue()
+        store = LocalObjectStore(events_queue)
+        S3StandInHandler.store = store
+        s3_endpoint = serve_in_thread(ThreadingHTTPServer(('127.0.0.1', 0), S3StandInHandler))
+        backend_url = start_backend(s3_endpoint)
+        sqs_handler = load_sqs_handler(backend_url, events_queue, store)
+        for _ in range(args.pollers):
+            threading.Thread(
+                target=run_poller,
+                args=(sqs_handler, events_queue, metrics, stop, args.batch_size, args.batching_window, args.max_receives),
+                daemon=True
+            ).start()
+        print(f"Local stack: backend {backend_url}, S3 stand-in {s3_endpoint}, {args.pollers} SQS pollers")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(
+            lambda index: run_job(backend_url, metrics, args.poll_interval, args.timeout, args.seed + index),
+            range(args.jobs)
+        ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    report = build_report(metrics, args.jobs, sum(outcomes), elapsed)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
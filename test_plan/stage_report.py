@@ -0,0 +1,128 @@
+"""
+Per-stage latency report from the pipeline's stage timing log lines
+
+The SQS handler and core processor write one EMF JSON line per timed stage
+(see lambda_functions/core_processor/stage_metrics.py). This report reads
+those lines from log files or stdin, e.g. CloudWatch Logs exports, `awslocal logs
+tail` output or a load harness run, and prints count, error count, p50/p95/p99
+and a latency histogram for each stage. Other log lines are skipped.
+
+Stages: sqs_wait, sqs_dispatch, invoke_wait, s3_upload / external_upload /
+external_data_update / external_data_update_batch (whole event), s3_download,
+pdf_extract, backend_patch, backend_bulk_update, publish_events,
+external_upload_api, external_data_update_api, external_bulk_api
+
+Usage:
+    python test_plan/stage_report.py core-processor.log sqs-handler.log
+    python test_plan/load_harness.py --jobs 100 | python test_plan/stage_report.py
+    python test_plan/stage_report.py core-processor.log --job 1700000000_ab12cd34
+"""
+import argparse
+import fileinput
+import json
+from collections import defaultdict
+
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+BAR_WIDTH = 40
+
+
+def read_stage_records(lines):
+    """Yield the stage timing records found in log lines"""
+    for line in lines:
+        start = line.find('{')
+        if start < 0 or '"Stage"' not in line:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and '_aws' in record and 'Stage' in record:
+            yield record
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def histogram(durations):
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for duration in durations:
+        bucket = next((i for i, bound in enumerate(HISTOGRAM_BOUNDS_MS) if duration <= bound), len(HISTOGRAM_BOUNDS_MS))
+        counts[bucket] += 1
+    return counts
+
+
+def print_summary(records):
+    by_stage = defaultdict(list)
+    errors = defaultdict(int)
+    for record in records:
+        by_stage[record['Stage']].append(record['Duration'])
+        if record.get('status') == 'error':
+            errors[record['Stage']] += 1
+
+    if not by_stage:
+        print("No stage timing records found")
+        return
+
+    print(f"{'stage':<28}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage in sorted(by_stage, key=lambda name: -percentile(by_stage[name], 50)):
+        durations = by_stage[stage]
+        print(f"{stage:<28}{len(durations):>7}{errors[stage]:>8}"
+              + "".join(f"{percentile(durations, pct):>10.1f}" for pct in (50, 95, 99))
+              + f"{max(durations):>10.1f}")
+
+    for stage in sorted(by_stage):
+        counts = histogram(by_stage[stage])
+        peak = max(counts)
+        print(f"\n{stage} ({len(by_stage[stage])} spans)")
+        labels = [f"<= {bound} ms" for bound in HISTOGRAM_BOUNDS_MS] + [f"> {HISTOGRAM_BOUNDS_MS[-1]} ms"]
+        first = next(i for i, count in enumerate(counts) if count)
+        last = max(i for i, count in enumerate(counts) if count)
+        for label, count in list(zip(labels, counts))[first:last + 1]:
+            print(f"  {label:>12} {'#' * max(1 if count else 0, round(count / peak * BAR_WIDTH)):<{BAR_WIDTH}} {count}")
+
+
+def print_job_timeline(records, job_id):
+    """Spans of one job in start order, indented under their parent span"""
+    spans = [record for record in records if record.get('job_id') == job_id]
+    if not spans:
+        print(f"No stage timing records for job {job_id}")
+        return
+
+    for span in spans:
+        # The EMF Timestamp (whole milliseconds) is taken when a span ends
+        span['started_ms'] = span.get('start_ms', span['_aws']['Timestamp'] - span['Duration'])
+    spans.sort(key=lambda span: (span['started_ms'], -span['Duration']))
+    by_id = {span['span_id']: span for span in spans if span.get('span_id')}
+
+    def depth(span):
+        parent = by_id.get(span.get('parent_span_id'))
+        return depth(parent) + 1 if parent else 0
+
+    origin = spans[0]['started_ms']
+    print(f"{'offset ms':>10}{'duration ms':>13}  stage")
+    for span in spans:
+        level = depth(span)
+        flag = '  (error)' if span.get('status') == 'error' else ''
+        print(f"{span['started_ms'] - origin:>10.0f}{span['Duration']:>13.1f}  {'  ' * level}{span['Stage']} [{span.get('Service')}]{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('logs', nargs='*', help='Log files (default: stdin)')
+    parser.add_argument('--job', default=None, help='Print the span timeline of one job_id instead')
+    args = parser.parse_args()
+
+    with fileinput.input(files=args.logs or ('-',)) as lines:
+        records = list(read_stage_records(lines))
+
+    if args.job:
+        print_job_timeline(records, args.job)
+    else:
+        print_summary(records)
+
+
+if __name__ == '__main__':
+    main()
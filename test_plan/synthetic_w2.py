@@ -0,0 +1,308 @@
+"""
+Synthetic W-2 corpus generator for load, scaling and accuracy tests
+
+Writes N synthetic W-2 PDFs with known values, so w2_extractor can be measured
+without real taxpayer documents. Each document is one of:
+
+    acroform    fillable form; the EIN, SSN, box 1 and box 2 values sit in text
+                fields named after w2_extractor.FORM_FIELD_MAP (f2_01, f2_02, f2_09,
+                f2_10), grouped per copy like the IRS form (Copy1[0].f2_01[0], ...)
+    flattened   text only, no form fields; values are printed next to the box
+                labels, so extraction goes through the text fallback. Amounts are
+                printed either plain (54000.00) or grouped (54,000.00), as both
+                occur in payroll output; the ground truth is always plain
+
+and has one page per copy (single copy, or 2-4 copies for multi-copy packets).
+PDFs are assembled from byte templates without a PDF library, so a million
+documents take minutes rather than hours. They are sharded into directories of
+--shard-size files next to a manifest.jsonl holding the ground truth; the
+manifest doubles as input for the batch CLI (python -m core_processor.batch).
+
+Usage:
+    python test_plan/synthetic_w2.py generate OUTPUT_DIR --count 10000 [--seed 7]
+        [--acroform-ratio 0.5] [--multi-copy-ratio 0.25] [--shard-size 1000]
+    python test_plan/synthetic_w2.py score OUTPUT_DIR/manifest.jsonl results.jsonl
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'lambda_functions', 'core_processor'))
+
+from w2_extractor import FORM_FIELD_MAP  # noqa: E402
+
+W2_FIELDS = ["ein", "ssn", "wages_box1", "federal_tax_withheld_box2"]
+MONETARY_FIELDS = {"wages_box1", "federal_tax_withheld_box2"}
+COPY_NAMES = ["B", "C", "2", "D"]
+EMPLOYERS = ["Acme Widgets Inc", "Globex Corporation", "Initech LLC", "Umbrella Logistics", "Stark Fabrication"]
+
+# Widget rectangles for the four fields on a letter-size page
+FIELD_RECTS = {
+    "ein": "72 640 300 660",
+    "ssn": "72 700 300 720",
+    "wages_box1": "320 700 540 720",
+    "federal_tax_withheld_box2": "320 640 540 660",
+}
+FIELD_FRAGMENTS = {field: fragment for fragment, field in FORM_FIELD_MAP.items()}
+
+
+def random_w2_values(rng):
+    """Plausible ground-truth values, formatted as the extractor returns them"""
+    wages = Decimal(rng.randint(1_500_000, 25_000_000)) / 100
+    withheld = (wages * Decimal(rng.randint(5, 30)) / 100).quantize(Decimal('0.01'))
+    return {
+        "ein": f"{rng.randint(10, 99)}-{rng.randint(1000000, 9999999)}",
+        "ssn": f"{rng.randint(100, 899)}-{rng.randint(1, 99):02d}-{rng.randint(1, 9999):04d}",
+        "wages_box1": f"{wages:.2f}",
+        "federal_tax_withheld_box2": f"{withheld:.2f}",
+    }
+
+
+def _pdf_string(value):
+    return "(" + value.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ")"
+
+
+def _text_stream(lines):
+    return ("BT /F1 10 Tf 14 TL 72 740 Td " + " ".join(f"{_pdf_string(line)} Tj T*" for line in lines) + " ET").encode('latin-1')
+
+
+def _stream_object(data):
+    return b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+
+
+def _write_pdf(objects):
+    """Serialize objects (numbered from 1, object 1 being the catalog) with an xref table"""
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return out.getvalue()
+
+
+def text_pdf(pages):
+    """Build a flattened (text only) PDF with one list of text lines per page"""
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % pid for pid in page_ids) + b"] /Count %d >>" % len(pages),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, lines in zip(page_ids, pages):
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1))
+        objects.append(_stream_object(_text_stream(lines)))
+    return _write_pdf(objects)
+
+
+def format_amount(amount, amount_style='plain'):
+    return f"{Decimal(amount):,.2f}" if amount_style == 'grouped' else amount
+
+
+def w2_text_lines(values, copy_name="B", employer="Acme Widgets Inc", amount_style='plain'):
+    """
+    Printed lines of one W-2 copy; values follow their box labels like on the paper form
+    With values=None only the labels are printed (the AcroForm variant).
+    """
+    lines = [
+        (f"Form W-2 Wage and Tax Statement - Copy {copy_name}", None),
+        ("a Employee's social security number", "ssn"),
+        ("b Employer identification number (EIN)", "ein"),
+        ("c Employer's name, address, and ZIP code", None),
+        (employer, None),
+        ("Wages, tips, other compensation", "wages_box1"),
+        ("Federal income tax withheld", "federal_tax_withheld_box2"),
+    ]
+    box_numbers = {"wages_box1": "1 ", "federal_tax_withheld_box2": "2 "}
+    printed = []
+    for label, field in lines:
+        printed.append(label)
+        if field in box_numbers and values:
+            printed.append(box_numbers[field] + format_amount(values[field], amount_style))
+        elif field and values:
+            printed.append(values[field])
+    return printed
+
+
+def flattened_w2_pdf(values, copies=1, employer="Acme Widgets Inc", amount_style='plain'):
+    """Text-only W-2 with one page per copy"""
+    return text_pdf([
+        w2_text_lines(values, COPY_NAMES[i % len(COPY_NAMES)], employer, amount_style)
+        for i in range(copies)
+    ])
+
+
+def acroform_w2_pdf(values, copies=1, employer="Acme Widgets Inc"):
+    """Fillable W-2 with one page per copy; values are only in the form fields"""
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids, parent_ids = [], []
+    for copy_index in range(copies):
+        page_id = len(objects) + 1
+        content_id = page_id + 1
+        parent_id = page_id + 2
+        widget_ids = [parent_id + 1 + i for i in range(len(W2_FIELDS))]
+
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R /Annots [%s] >>"
+                       % (content_id, b" ".join(b"%d 0 R" % wid for wid in widget_ids)))
+        objects.append(_stream_object(_text_stream(w2_text_lines(None, COPY_NAMES[copy_index % len(COPY_NAMES)], employer))))
+        objects.append(b"<< /T (Copy%d[0]) /Kids [%s] >>"
+                       % (copy_index + 1, b" ".join(b"%d 0 R" % wid for wid in widget_ids)))
+        for field in W2_FIELDS:
+            objects.append((
+                f"<< /Type /Annot /Subtype /Widget /FT /Tx /T ({FIELD_FRAGMENTS[field]}[0]) "
+                f"/V {_pdf_string(values[field])} /Rect [{FIELD_RECTS[field]}] /P {page_id} 0 R "
+                f"/Parent {parent_id} 0 R /DA (/F1 10 Tf 0 g) >>"
+            ).encode('latin-1'))
+        page_ids.append(page_id)
+        parent_ids.append(parent_id)
+
+    objects[0] = (b"<< /Type /Catalog /Pages 2 0 R /AcroForm << /Fields [%s] "
+                  b"/DR << /Font << /F1 3 0 R >> >> /DA (/F1 10 Tf 0 g) >> >>"
+                  % b" ".join(b"%d 0 R" % pid for pid in parent_ids))
+    objects[1] = (b"<< /Type /Pages /Kids [%s] /Count %d >>"
+                  % (b" ".join(b"%d 0 R" % pid for pid in page_ids), len(page_ids)))
+    return _write_pdf(objects)
+
+
+def generate_corpus(output_dir, count, seed=7, acroform_ratio=0.5, multi_copy_ratio=0.25, shard_size=1000):
+    """Write count PDFs plus manifest.jsonl under output_dir and return the manifest path"""
+    rng = random.Random(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+
+    with open(manifest_path, 'w') as manifest:
+        for index in range(count):
+            values = random_w2_values(rng)
+            variant = 'acroform' if rng.random() < acroform_ratio else 'flattened'
+            copies = rng.randint(2, 4) if rng.random() < multi_copy_ratio else 1
+            employer = rng.choice(EMPLOYERS)
+
+            shard = f"shard-{index // shard_size:04d}"
+            if index % shard_size == 0:
+                os.makedirs(os.path.join(output_dir, shard), exist_ok=True)
+            document_id = f"w2-{index:07d}"
+            path = f"{shard}/{document_id}.pdf"
+            entry = {"id": document_id, "path": path, "variant": variant, "copies": copies}
+            if variant == 'acroform':
+                data = acroform_w2_pdf(values, copies, employer)
+            else:
+                entry["amount_style"] = rng.choice(['plain', 'grouped'])
+                data = flattened_w2_pdf(values, copies, employer, entry["amount_style"])
+            with open(os.path.join(output_dir, path), 'wb') as f:
+                f.write(data)
+
+            entry["expected"] = values
+            manifest.write(json.dumps(entry) + '\n')
+    return manifest_path
+
+
+def _normalize(field, value):
+    if value is None:
+        return None
+    if field in MONETARY_FIELDS:
+        try:
+            return Decimal(str(value))
+        except InvalidOperation:
+            return value
+    return str(value)
+
+
+def score(manifest_path, results_path):
+    """
+    Compare extraction results (batch CLI JSONL) with the manifest's ground truth
+    Values are compared as the pipeline would store them: a row the batch CLI
+    marked invalid (e.g. amounts that convert_monetary_fields rejects) scores no
+    fields, and amounts only match if they parse as plain decimals.
+    """
+    results = {}
+    with open(results_path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                results[row["id"]] = row
+
+    totals = defaultdict(lambda: {"documents": 0, "missing": 0, "valid": 0, "exact": 0, **{field: 0 for field in W2_FIELDS}})
+    with open(manifest_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            group = "/".join(filter(None, [
+                entry['variant'], 'multi' if entry['copies'] > 1 else 'single', entry.get('amount_style')
+            ]))
+            for key in (group, 'all'):
+                totals[key]["documents"] += 1
+            row = results.get(entry["id"])
+            if row is None:
+                for key in (group, 'all'):
+                    totals[key]["missing"] += 1
+                continue
+            valid = bool(row.get("valid", True)) and not row.get("error")
+            correct = [
+                field for field in W2_FIELDS
+                if _normalize(field, row.get(field)) == _normalize(field, entry["expected"][field])
+            ] if valid else []
+            for key in (group, 'all'):
+                totals[key]["valid"] += valid
+                for field in correct:
+                    totals[key][field] += 1
+                if len(correct) == len(W2_FIELDS):
+                    totals[key]["exact"] += 1
+    return dict(totals)
+
+
+def print_score(totals):
+    print(f"{'group':<26}{'docs':>8}{'missing':>9}{'valid':>9}{'exact':>9}" + "".join(f"{field[:12]:>14}" for field in W2_FIELDS))
+    for group in sorted(totals, key=lambda g: (g == 'all', g)):
+        t = totals[group]
+        scored = t["documents"] - t["missing"]
+
+        def pct(n):
+            return f"{n / scored:.2%}" if scored else "-"
+        print(f"{group:<26}{t['documents']:>8}{t['missing']:>9}{pct(t['valid']):>9}{pct(t['exact']):>9}"
+              + "".join(f"{pct(t[field]):>14}" for field in W2_FIELDS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write a synthetic corpus and its manifest')
+    generate.add_argument('output_dir')
+    generate.add_argument('--count', type=int, default=1000)
+    generate.add_argument('--seed', type=int, default=7)
+    generate.add_argument('--acroform-ratio', type=float, default=0.5)
+    generate.add_argument('--multi-copy-ratio', type=float, default=0.25)
+    generate.add_argument('--shard-size', type=int, default=1000)
+
+    score_parser = commands.add_parser('score', help='Accuracy of extraction results against the manifest')
+    score_parser.add_argument('manifest')
+    score_parser.add_argument('results', help='JSONL output of python -m core_processor.batch')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        start = time.perf_counter()
+        manifest_path = generate_corpus(args.output_dir, args.count, args.seed, args.acroform_ratio,
+                                        args.multi_copy_ratio, args.shard_size)
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {args.count} documents in {elapsed:.1f}s ({args.count / elapsed:.0f} docs/sec), manifest: {manifest_path}")
+    else:
+        print_score(score(args.manifest, args.results))
+
+
+if __name__ == '__main__':
+    main()